@@ -55,6 +55,7 @@ ${BOLD}Serviços Disponíveis:${NC}
     tts-service
     memory-service
     orchestrator
+    cron-service
     prometheus
     grafana
 
@@ -133,6 +134,7 @@ check_health() {
         "http://localhost:8004/health:TTS Service"
         "http://localhost:8005/health:Memory Service"
         "http://localhost:8010/health:Orchestrator"
+        "http://localhost:8006/health:Cron Service"
     )
     
     healthy=0
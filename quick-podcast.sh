@@ -6,6 +6,8 @@
 ################################################################################
 
 # Cores
+RED='\033[0;31m'
+YELLOW='\033[1;33m'
 CYAN='\033[0;36m'
 GREEN='\033[0;32m'
 NC='\033[0m'
@@ -147,49 +149,55 @@ if [ "$STATUS" = "pending" ]; then
         echo -e "${CYAN}[↳]${NC} Aguardando conclusão..."
         echo ""
         
-        # Monitor status
-        COMPLETED=false
+        # Acompanhar progresso via Server-Sent Events (sem polling)
         MAX_WAIT=600  # 10 minutos
-        ELAPSED=0
+        FINAL_STATUS=""
         
-        while [ "$COMPLETED" = false ]; do
-            STATUS_RESPONSE=$(curl -s http://localhost:8010/api/podcast/status/$PODCAST_ID)
-            CURRENT_STATUS=$(echo "$STATUS_RESPONSE" | jq -r '.status // "unknown"' 2>/dev/null)
-            PROGRESS=$(echo "$STATUS_RESPONSE" | jq -r '.progress // 0' 2>/dev/null)
-            
-            echo -ne "\r${CYAN}[⏳]${NC} Status: ${BOLD}$CURRENT_STATUS${NC} (${PROGRESS}%)  "
+        while IFS= read -r LINE; do
+            case "$LINE" in
+                data:*)
+                    EVENT="${LINE#data: }"
+                    EVENT_TYPE=$(echo "$EVENT" | jq -r '.event' 2>/dev/null)
+                    EVENT_STATUS=$(echo "$EVENT" | jq -r '.status // empty' 2>/dev/null)
+                    
+                    if [ "$EVENT_TYPE" = "stage" ]; then
+                        STAGE=$(echo "$EVENT" | jq -r '.stage' 2>/dev/null)
+                        TOOK=$(echo "$EVENT" | jq -r '.duration_seconds // empty' 2>/dev/null)
+                        echo -e "${CYAN}[⏳]${NC} ${BOLD}$STAGE${NC}: $EVENT_STATUS ${TOOK:+(${TOOK}s)}"
+                    else
+                        case "$EVENT_STATUS" in
+                            completed|failed|cancelled)
+                                FINAL_STATUS="$EVENT_STATUS"
+                                break
+                                ;;
+                        esac
+                    fi
+                    ;;
+            esac
+        done < <(curl -sN --max-time $MAX_WAIT http://localhost:8010/api/podcast/events/$PODCAST_ID)
+        
+        STATUS_RESPONSE=$(curl -s http://localhost:8010/api/podcast/status/$PODCAST_ID)
+        echo ""
+        
+        if [ "$FINAL_STATUS" = "completed" ]; then
+            echo -e "${GREEN}[✓]${NC} Podcast concluído!"
             
-            if [ "$CURRENT_STATUS" = "completed" ]; then
-                echo ""
-                echo ""
-                echo -e "${GREEN}[✓]${NC} Podcast concluído!"
-                
-                # Extract audio URL
-                AUDIO_URL=$(echo "$STATUS_RESPONSE" | jq -r '.result.audio_url // ""' 2>/dev/null)
-                if [ ! -z "$AUDIO_URL" ]; then
-                    echo ""
-                    echo -e "${GREEN}🎙️  Áudio gravado:${NC}"
-                    echo "  $AUDIO_URL"
-                fi
-                COMPLETED=true
-            elif [ "$CURRENT_STATUS" = "failed" ]; then
+            # Extract audio path
+            AUDIO_PATH=$(echo "$STATUS_RESPONSE" | jq -r '.result.audio_path // ""' 2>/dev/null)
+            if [ ! -z "$AUDIO_PATH" ]; then
                 echo ""
-                echo -e "${RED}[✗]${NC} Podcast falhou"
-                ERROR=$(echo "$STATUS_RESPONSE" | jq -r '.error // "Erro desconhecido"' 2>/dev/null)
-                echo "Erro: $ERROR"
-                COMPLETED=true
-            else
-                ELAPSED=$((ELAPSED + 2))
-                if [ $ELAPSED -gt $MAX_WAIT ]; then
-                    echo ""
-                    echo -e "${YELLOW}[⚠]${NC} Timeout aguardando (>10 min)"
-                    echo "Continuar monitorando com:"
-                    echo "  curl http://localhost:8010/api/podcast/status/$PODCAST_ID"
-                    COMPLETED=true
-                fi
-                sleep 2
+                echo -e "${GREEN}🎙️  Áudio gravado:${NC}"
+                echo "  $AUDIO_PATH"
             fi
-        done
+        elif [ "$FINAL_STATUS" = "failed" ] || [ "$FINAL_STATUS" = "cancelled" ]; then
+            echo -e "${RED}[✗]${NC} Podcast não concluído ($FINAL_STATUS)"
+            ERROR=$(echo "$STATUS_RESPONSE" | jq -r '.error // "Erro desconhecido"' 2>/dev/null)
+            echo "Erro: $ERROR"
+        else
+            echo -e "${YELLOW}[⚠]${NC} Timeout aguardando (>10 min)"
+            echo "Continuar monitorando com:"
+            echo "  curl -N http://localhost:8010/api/podcast/events/$PODCAST_ID"
+        fi
     else
         echo -e "${CYAN}[↳]${NC} Monitorar com:"
         echo "  ${BOLD}./quick-podcast.sh --wait${NC}"
@@ -0,0 +1,110 @@
+"""
+Cron - Interpretação de expressões cron (5 campos)
+minuto hora dia-do-mês mês dia-da-semana, com *, listas, intervalos e passos
+"""
+from datetime import datetime, timedelta
+from typing import Set
+
+
+class CronError(ValueError):
+    """Expressão cron inválida"""
+
+
+# (mínimo, máximo) de cada campo
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# Atalhos comuns
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+
+
+def _parse_field(text: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"Passo inválido: {step_text}")
+            step = int(step_text)
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise CronError(f"Intervalo inválido: {part}")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise CronError(f"Valor inválido: {part}")
+
+        if start < low or end > high or start > end:
+            raise CronError(f"Valor fora do intervalo {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """
+    Expressão cron padrão
+    Como no cron tradicional, se dia-do-mês e dia-da-semana forem ambos
+    restritos, basta um dos dois coincidir
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise CronError(f"Esperados 5 campos, recebidos {len(fields)}: '{expression}'")
+
+        parsed = [_parse_field(text, low, high) for text, (low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 0 e 7 representam domingo
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        self._days_restricted = fields[2] != "*"
+        self._weekdays_restricted = fields[4] != "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # datetime.weekday(): segunda = 0; cron: domingo = 0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._days_restricted and self._weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Próximo instante (estritamente depois de `moment`) que satisfaz a expressão"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Limite de busca: ciclo completo de calendário (inclui 29/02)
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate <= limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise CronError(f"Expressão nunca ocorre: '{self.expression}'")
+
+    def __repr__(self) -> str:
+        return f"CronExpression('{self.expression}')"
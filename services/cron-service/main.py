@@ -0,0 +1,315 @@
+"""
+Cron Service - Executa Agent.schedule e pré-gera os podcasts
+Os inícios são espalhados (jitter determinístico) numa janela antes do
+horário de publicação, suavizando o pico de carga em LLM e TTS
+"""
+from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+import sys
+import os
+
+# Adicionar shared ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from shared.models import Agent, AgentType
+from shared.config import (
+    SERVICE_URLS, CRON_AGENTS_FILE, CRON_TIMEZONE, CRON_PREGENERATE_MINUTES,
+    CRON_JITTER_WINDOW_MINUTES, CRON_TICK_SECONDS, CRON_JOB_PRIORITY
+)
+from shared.utils import get_logger, instrument_app, ServiceClient, cache, circuit_breaker_stats, tracer
+from cron import CronExpression, CronError
+
+# ==================== SETUP ====================
+logger = get_logger(__name__)
+
+orchestrator_client = ServiceClient(SERVICE_URLS["orchestrator"])
+
+timezone = ZoneInfo(CRON_TIMEZONE)
+
+# Nova tentativa após falha ao enfileirar (ex.: orchestrator fora ou fila cheia)
+RETRY_DELAY = timedelta(minutes=1)
+
+
+@dataclass
+class ScheduledRun:
+    """Próxima execução planejada de um agente"""
+    agent: Agent
+    cron: CronExpression
+    publish_at: datetime
+    start_at: datetime
+    last_job_id: Optional[str] = None
+    last_error: Optional[str] = None
+
+
+# Execuções planejadas por ID de agente
+runs: Dict[str, ScheduledRun] = {}
+
+# Sinaliza o loop quando o plano muda (reload/trigger)
+wakeup = asyncio.Event()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Carrega os agentes e inicia o loop de agendamento"""
+    load_runs()
+    loop_task = asyncio.create_task(scheduler_loop())
+    yield
+    loop_task.cancel()
+    await asyncio.gather(loop_task, return_exceptions=True)
+    await orchestrator_client.close()
+    await cache.close()
+    await tracer.close()
+
+
+app = FastAPI(
+    title="JARVIS Cron Service",
+    description="Agendamento e pré-geração de podcasts dos agentes",
+    version="1.0.0",
+    lifespan=lifespan
+)
+instrument_app(app, "cron-service")
+
+
+# ==================== AGENTES ====================
+def agent_from_dict(data: dict) -> Agent:
+    """Cria um Agent a partir da definição em JSON"""
+    fields = {k: v for k, v in data.items() if k in Agent.__dataclass_fields__}
+    fields.pop("created_at", None)
+    fields.pop("updated_at", None)
+    if "type" in fields:
+        fields["type"] = AgentType(fields["type"])
+    return Agent(**fields)
+
+
+def load_agents(path: str = CRON_AGENTS_FILE) -> List[Agent]:
+    """Lê as definições de agentes; entradas inválidas são ignoradas"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"⚠️  Arquivo de agentes não encontrado: {path}")
+        return []
+
+    agents = []
+    for entry in entries:
+        try:
+            agents.append(agent_from_dict(entry))
+        except Exception as e:
+            logger.error(f"❌ Agente inválido ignorado ({entry.get('name', '?')}): {e}")
+    return agents
+
+
+# ==================== PLANEJAMENTO ====================
+def now_local() -> datetime:
+    return datetime.now(timezone)
+
+
+def jitter_offset(agent_id: str, publish_at: datetime) -> timedelta:
+    """
+    Deslocamento determinístico dentro da janela de jitter
+    Estável entre reinícios, mas diferente para cada agente e publicação
+    """
+    window = CRON_JITTER_WINDOW_MINUTES * 60
+    if window <= 0:
+        return timedelta()
+    digest = hashlib.sha256(f"{agent_id}:{publish_at.isoformat()}".encode()).digest()
+    fraction = int.from_bytes(digest[:8], "big") / 2 ** 64
+    return timedelta(seconds=int(fraction * window))
+
+
+def plan_run(agent: Agent, cron: CronExpression, after: datetime) -> ScheduledRun:
+    """Planeja a próxima publicação do agente e o início da pré-geração"""
+    publish_at = cron.next_after(after)
+    start_at = (
+        publish_at
+        - timedelta(minutes=CRON_PREGENERATE_MINUTES)
+        - jitter_offset(agent.id, publish_at)
+    )
+    return ScheduledRun(agent=agent, cron=cron, publish_at=publish_at, start_at=start_at)
+
+
+def load_runs() -> int:
+    """(Re)carrega os agentes e replaneja as execuções"""
+    runs.clear()
+    now = now_local()
+    for agent in load_agents():
+        if not agent.enabled or not agent.schedule:
+            continue
+        try:
+            cron = CronExpression(agent.schedule)
+        except CronError as e:
+            logger.error(f"❌ Agendamento inválido para {agent.name}: {e}")
+            continue
+        runs[agent.id] = plan_run(agent, cron, now)
+
+    logger.info(f"🗓️  {len(runs)} agentes agendados")
+    wakeup.set()
+    return len(runs)
+
+
+def job_id_for(run: ScheduledRun) -> str:
+    """ID estável do job de uma publicação (evita pré-gerar duas vezes)"""
+    return f"cron-{run.agent.id}-{run.publish_at.strftime('%Y%m%d%H%M')}"
+
+
+def build_podcast_payload(run: ScheduledRun) -> dict:
+    """Requisição de podcast a partir da configuração do agente"""
+    config = run.agent.configuration
+    payload = {
+        "id": job_id_for(run),
+        "agent_type": run.agent.type.value,
+        "agent_name": config.get("agent_name", run.agent.name),
+        "user_id": run.agent.user_id,
+        "priority": config.get("priority", CRON_JOB_PRIORITY),
+        "metadata": {
+            "source": "cron",
+            "agent_id": run.agent.id,
+            "publish_at": run.publish_at.isoformat(),
+        },
+    }
+    for key in ("news_count", "language", "voice"):
+        if key in config:
+            payload[key] = config[key]
+    return payload
+
+
+# ==================== EXECUÇÃO ====================
+async def trigger_run(run: ScheduledRun) -> bool:
+    """Enfileira a pré-geração no orchestrator"""
+    job_id = job_id_for(run)
+    marker = f"cron:triggered:{job_id}"
+    if await cache.get(marker):
+        logger.info(f"⏭️  Pré-geração já enfileirada: {job_id}")
+        return True
+
+    response = await orchestrator_client.post("/api/podcast/generate", data=build_podcast_payload(run))
+    if not response:
+        run.last_error = "Orchestrator indisponível ou fila cheia"
+        return False
+
+    await cache.set(marker, True, expire_seconds=2 * 86400)
+    run.last_job_id = job_id
+    run.last_error = None
+    logger.info(
+        f"📻 Pré-geração enfileirada: {run.agent.name} "
+        f"(publicação {run.publish_at:%d/%m %H:%M}, job {job_id})"
+    )
+    return True
+
+
+def advance_run(run: ScheduledRun):
+    """Substitui a execução pela da publicação seguinte"""
+    next_run = plan_run(run.agent, run.cron, run.publish_at)
+    next_run.last_job_id = run.last_job_id
+    next_run.last_error = run.last_error
+    runs[run.agent.id] = next_run
+
+
+async def process_due_runs():
+    """Dispara as execuções cujo início já chegou e replaneja"""
+    now = now_local()
+    for run in list(runs.values()):
+        if run.start_at > now:
+            continue
+        if await trigger_run(run):
+            advance_run(run)
+        elif now + RETRY_DELAY >= run.publish_at:
+            logger.error(f"❌ Pré-geração perdida para {run.agent.name}: {run.last_error}")
+            advance_run(run)
+        else:
+            run.start_at = now + RETRY_DELAY
+
+
+async def scheduler_loop():
+    """Dorme até o próximo início (no máximo CRON_TICK_SECONDS) e dispara"""
+    while True:
+        try:
+            await process_due_runs()
+        except Exception as e:
+            logger.error(f"❌ Erro no loop de agendamento: {e}", exc_info=True)
+
+        wakeup.clear()
+        delay = CRON_TICK_SECONDS
+        if runs:
+            next_start = min(run.start_at for run in runs.values())
+            delay = min(max((next_start - now_local()).total_seconds(), 0), CRON_TICK_SECONDS)
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+def run_view(run: ScheduledRun) -> dict:
+    return {
+        "agent_id": run.agent.id,
+        "agent_name": run.agent.name,
+        "schedule": run.cron.expression,
+        "publish_at": run.publish_at.isoformat(),
+        "start_at": run.start_at.isoformat(),
+        "last_job_id": run.last_job_id,
+        "last_error": run.last_error,
+    }
+
+
+# ==================== HEALTH CHECK ====================
+@app.get("/health")
+async def health_check():
+    """Verifica saúde do serviço"""
+    return {
+        "status": "healthy",
+        "service": "cron-service",
+        "timestamp": datetime.utcnow().isoformat(),
+        "timezone": CRON_TIMEZONE,
+        "scheduled_agents": len(runs),
+        "circuits": circuit_breaker_stats()
+    }
+
+
+# ==================== ENDPOINTS ====================
+@app.get("/api/cron/agents")
+async def list_scheduled_agents():
+    """Próximas execuções planejadas, em ordem de início"""
+    ordered = sorted(runs.values(), key=lambda run: run.start_at)
+    return {
+        "pregenerate_minutes": CRON_PREGENERATE_MINUTES,
+        "jitter_window_minutes": CRON_JITTER_WINDOW_MINUTES,
+        "agents": [run_view(run) for run in ordered]
+    }
+
+
+@app.post("/api/cron/reload")
+async def reload_agents():
+    """Relê o arquivo de agentes e replaneja"""
+    count = load_runs()
+    return {"status": "reloaded", "scheduled_agents": count}
+
+
+@app.post("/api/cron/trigger/{agent_id}")
+async def trigger_agent(agent_id: str):
+    """Antecipa a pré-geração da próxima publicação do agente"""
+    run = runs.get(agent_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Agente não agendado")
+
+    if not await trigger_run(run):
+        raise HTTPException(status_code=503, detail=run.last_error)
+    advance_run(run)
+    wakeup.set()
+    return run_view(run)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8006,
+        log_level="info"
+    )
@@ -2,9 +2,13 @@
 LLM Service - Microserviço para integração com LLMs
 Suporta: Groq (recomendado), Ollama (local)
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import httpx
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import sys
 import os
 import time
@@ -19,26 +23,68 @@ from shared.config import (
     OLLAMA_URL, OLLAMA_MODEL, 
     LLM_TIMEOUT
 )
-from shared.utils import get_logger, cache
+from shared.utils import (
+    get_logger, instrument_app, JobCancellation, JobCancelledError, cache, cache_key, ServiceClient,
+    propagate_deadline, within_deadline, deadline_timeout, check_deadline, DeadlineExceededError, span, tracer,
+    Dependency
+)
 
 # ==================== SETUP ====================
+logger = get_logger(__name__)
+
+# Conexões persistentes com o Ollama (verificação de disponibilidade e gerações)
+ollama = ServiceClient(OLLAMA_URL, timeout=LLM_TIMEOUT)
+
+
+async def connect_groq():
+    """
+    Cliente Groq assíncrono: cancelar a geração fecha a requisição ao Groq
+    (o import do SDK é pesado: roda fora do event loop)
+    """
+    def build():
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=GROQ_API_KEY)
+    return await asyncio.to_thread(build)
+
+
+# Inicializado em background no lifespan, quando o Groq está configurado
+groq = Dependency(f"Groq ({GROQ_MODEL})", connect_groq) if LLM_PROVIDER == "groq" and GROQ_API_KEY else None
+
+
+def groq_client():
+    """Cliente Groq, se configurado e já inicializado"""
+    return groq.client if groq is not None else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa o cliente Groq em background e libera os pools no encerramento"""
+    if groq is not None:
+        groq.start()
+    yield
+    if groq is not None:
+        client = groq_client()
+        await groq.close()
+        if client is not None:
+            await client.close()
+    await ollama.close()
+    await cache.close()
+    await tracer.close()
+
+
 app = FastAPI(
     title="JARVIS LLM Service",
     description="Serviço de geração de texto via Groq/Ollama",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
+propagate_deadline(app)
+instrument_app(app, "llm-service")
 
-logger = get_logger(__name__)
-
-# Inicializar cliente Groq se disponível
-groq_client = None
-if LLM_PROVIDER == "groq" and GROQ_API_KEY:
-    try:
-        from groq import Groq
-        groq_client = Groq(api_key=GROQ_API_KEY)
-        logger.info(f"✅ Groq configurado com modelo {GROQ_MODEL}")
-    except ImportError:
-        logger.warning("⚠️ Biblioteca groq não instalada, usando Ollama")
+SYSTEM_PROMPT = (
+    "Você é um assistente especializado em criar conteúdo para podcasts em português brasileiro. "
+    "Seja criativo, envolvente e informativo."
+)
 
 
 # ==================== MODELS ====================
@@ -51,6 +97,20 @@ class GenerateRequest(BaseModel):
     user_id: str = ""
 
 
+def generation_cache_key(request: GenerateRequest, provider: str, model: str) -> str:
+    """Chave da geração: todos os parâmetros que alteram o texto produzido"""
+    return cache_key(
+        "llm",
+        provider=provider,
+        model=model,
+        system_prompt=SYSTEM_PROMPT,
+        prompt=request.prompt,
+        context=request.context,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens
+    )
+
+
 class GenerateResponse(BaseModel):
     """Resposta da geração"""
     text: str
@@ -68,7 +128,7 @@ async def health_check():
     available = False
     model = ""
     
-    if provider == "groq" and groq_client:
+    if provider == "groq" and groq_client():
         available = bool(GROQ_API_KEY)
         model = GROQ_MODEL
     else:
@@ -90,35 +150,37 @@ async def health_check():
 async def check_ollama_available() -> bool:
     """Verifica se Ollama está disponível"""
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get("http://ollama:11435/api/tags")
-            return response.status_code == 200
+        response = await ollama.client.get("http://ollama:11435/api/tags", timeout=5)
+        return response.status_code == 200
     except:
         return False
 
 
+def build_groq_messages(prompt: str) -> list:
+    """Mensagens de chat enviadas ao Groq"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
 async def generate_with_groq(prompt: str, temperature: float, max_tokens: int) -> dict:
     """Gera texto usando Groq API (rápido e gratuito)"""
-    if not groq_client:
+    client = groq_client()
+    if not client:
         raise HTTPException(status_code=503, detail="Groq não configurado. Defina GROQ_API_KEY")
     
     start_time = time.time()
+    # Timeout da chamada limitado pelo prazo restante do job
+    timeout = deadline_timeout(LLM_TIMEOUT)
     
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um assistente especializado em criar conteúdo para podcasts em português brasileiro. Seja criativo, envolvente e informativo."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+        chat_completion = await client.chat.completions.create(
+            messages=build_groq_messages(prompt),
             model=GROQ_MODEL,
             temperature=temperature,
             max_tokens=max_tokens,
+            timeout=timeout,
         )
         
         text = chat_completion.choices[0].message.content
@@ -143,16 +205,16 @@ async def generate_with_ollama(prompt: str, temperature: float, max_tokens: int)
     
     start_time = time.time()
     
-    async with httpx.AsyncClient(timeout=LLM_TIMEOUT) as client:
-        response = await client.post(
-            OLLAMA_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "temperature": temperature
-            }
-        )
+    response = await ollama.client.post(
+        OLLAMA_URL,
+        json={
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "temperature": temperature
+        },
+        timeout=deadline_timeout(LLM_TIMEOUT)
+    )
     
     if response.status_code != 200:
         raise HTTPException(status_code=503, detail=f"Ollama erro: {response.status_code}")
@@ -169,45 +231,112 @@ async def generate_with_ollama(prompt: str, temperature: float, max_tokens: int)
     }
 
 
+async def stream_with_groq(prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+    """Gera texto em streaming usando Groq"""
+    stream = await groq_client().chat.completions.create(
+        messages=build_groq_messages(prompt),
+        model=GROQ_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        timeout=deadline_timeout(LLM_TIMEOUT),
+    )
+    # Encerrar o stream (fim, erro ou cancelamento) fecha a conexão com o Groq
+    async with stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def stream_with_ollama(prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+    """Gera texto em streaming usando Ollama (NDJSON)"""
+    async with ollama.client.stream(
+        "POST",
+        OLLAMA_URL,
+        json={
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": True,
+            "temperature": temperature
+        },
+        timeout=deadline_timeout(LLM_TIMEOUT)
+    ) as response:
+        if response.status_code != 200:
+            raise Exception(f"Ollama erro: {response.status_code}")
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                break
+
+
+# Gerações em andamento por execução de job (cancelamento pelo orchestrator)
+job_tasks = JobCancellation()
+
+
 # ==================== ENDPOINTS ====================
 @app.post("/api/llm/generate")
-async def generate_text(request: GenerateRequest) -> GenerateResponse:
+async def generate_text(
+    request: GenerateRequest,
+    x_job_id: Optional[str] = Header(None)
+) -> GenerateResponse:
     """
     Gera texto usando Groq (preferido) ou Ollama (fallback)
+    O cabeçalho X-Job-ID permite cancelar a geração via /api/llm/cancel;
+    com X-Deadline-Ms a geração é abandonada (504) quando o prazo se esgota
+    Gerações idênticas são compartilhadas (cache.get_or_compute): uma única
+    chamada ao provedor entre requisições e réplicas, e prompts quentes são
+    renovados em background antes de expirar
     """
     try:
         # Determinar provedor
-        use_groq = LLM_PROVIDER == "groq" and groq_client is not None
+        use_groq = LLM_PROVIDER == "groq" and groq_client() is not None
         provider_name = "Groq" if use_groq else "Ollama"
         model_name = GROQ_MODEL if use_groq else OLLAMA_MODEL
         
         logger.info(f"🤖 Gerando texto com {provider_name} ({model_name})...")
         
-        # Verificar cache
-        cache_key = f"llm:prompt:{hash(request.prompt + request.context)}"
-        cached = cache.get(cache_key)
-        if cached:
-            logger.info("📦 Resposta retornada do cache")
-            return GenerateResponse(**cached)
+        key = generation_cache_key(request, "groq" if use_groq else "ollama", model_name)
+        generated = False
         
         # Preparar prompt com contexto
         full_prompt = request.prompt
         if request.context:
             full_prompt = f"{request.context}\n\n{request.prompt}"
         
-        # Gerar com o provedor apropriado
-        if use_groq:
-            result = await generate_with_groq(full_prompt, request.temperature, request.max_tokens)
-        else:
-            result = await generate_with_ollama(full_prompt, request.temperature, request.max_tokens)
-        
-        logger.info(f"✅ Texto gerado ({len(result['text'])} chars em {result['execution_time_seconds']:.1f}s)")
+        async def generate() -> dict:
+            nonlocal generated
+            generated = True
+            # Gerar com o provedor apropriado
+            with span("llm.generate", provider=provider_name, model=model_name) as llm_span:
+                if use_groq:
+                    result = await generate_with_groq(full_prompt, request.temperature, request.max_tokens)
+                else:
+                    result = await generate_with_ollama(full_prompt, request.temperature, request.max_tokens)
+                if llm_span is not None:
+                    llm_span.set(tokens=result["generated_tokens"])
+            
+            logger.info(f"✅ Texto gerado ({len(result['text'])} chars em {result['execution_time_seconds']:.1f}s)")
+            return result
         
         # Cachear por 1 hora
-        cache.set(cache_key, result, expire_seconds=3600)
-        
+        result = await within_deadline(job_tasks.run(
+            x_job_id,
+            cache.get_or_compute(key, generate, expire_seconds=3600, lock_seconds=LLM_TIMEOUT)
+        ))
+        if not generated:
+            logger.info("📦 Resposta retornada do cache")
         return GenerateResponse(**result)
     
+    except JobCancelledError as e:
+        logger.info(f"🛑 Geração interrompida: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except DeadlineExceededError as e:
+        logger.warning(f"⏰ Geração abandonada: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -215,6 +344,15 @@ async def generate_text(request: GenerateRequest) -> GenerateResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/llm/cancel/{job_id}")
+async def cancel_generation(job_id: str):
+    """Interrompe as gerações em andamento do job (chamado pelo orchestrator)"""
+    cancelled = job_tasks.cancel(job_id)
+    if cancelled:
+        logger.info(f"🛑 {cancelled} geração(ões) cancelada(s) para {job_id}")
+    return {"job_id": job_id, "cancelled_tasks": cancelled, **job_tasks.stats()}
+
+
 @app.get("/api/llm/info")
 async def get_llm_info():
     """Retorna informações sobre o LLM configurado"""
@@ -228,14 +366,60 @@ async def get_llm_info():
 
 
 @app.post("/api/llm/stream")
-async def stream_text(request: GenerateRequest):
+async def stream_text(request: GenerateRequest, x_job_id: Optional[str] = Header(None)):
     """
     Gera texto em streaming (para respostas longas)
+    Retorna os trechos em text/plain conforme o modelo os produz
+    O cabeçalho X-Job-ID permite interromper o stream via /api/llm/cancel;
+    a resposta é então encerrada sem o fim normal, como no prazo esgotado
     """
-    raise HTTPException(
-        status_code=501,
-        detail="Streaming ainda não implementado - use /api/llm/generate"
-    )
+    if x_job_id and job_tasks.is_cancelled(x_job_id):
+        raise HTTPException(status_code=409, detail=f"Job {x_job_id} cancelado")
+    use_groq = LLM_PROVIDER == "groq" and groq_client() is not None
+    if not use_groq and not await check_ollama_available():
+        raise HTTPException(status_code=503, detail="Ollama não está disponível")
+    
+    provider = "groq" if use_groq else "ollama"
+    key = generation_cache_key(request, provider, GROQ_MODEL if use_groq else OLLAMA_MODEL)
+    cached = await cache.get(key)
+    if cached:
+        logger.info("📦 Resposta (stream) retornada do cache")
+        return StreamingResponse(iter([cached["text"]]), media_type="text/plain; charset=utf-8")
+    
+    full_prompt = request.prompt
+    if request.context:
+        full_prompt = f"{request.context}\n\n{request.prompt}"
+    
+    async def token_stream():
+        start_time = time.time()
+        generator = stream_with_groq if use_groq else stream_with_ollama
+        parts = []
+        
+        logger.info(f"🤖 Gerando texto em streaming com {provider}...")
+        try:
+            with job_tasks.track(x_job_id):
+                async for piece in generator(full_prompt, request.temperature, request.max_tokens):
+                    # Prazo esgotado: interrompe o stream em vez de gerar texto descartado
+                    check_deadline()
+                    parts.append(piece)
+                    yield piece
+        except JobCancelledError as e:
+            logger.info(f"🛑 Stream interrompido: {e}")
+            raise
+        
+        text = "".join(parts)
+        execution_time = time.time() - start_time
+        logger.info(f"✅ Stream concluído ({len(text)} chars em {execution_time:.1f}s)")
+        
+        await cache.set(key, {
+            "text": text,
+            "model": GROQ_MODEL if use_groq else OLLAMA_MODEL,
+            "generated_tokens": len(text.split()),
+            "execution_time_seconds": execution_time,
+            "provider": provider
+        }, expire_seconds=3600)
+    
+    return StreamingResponse(token_stream(), media_type="text/plain; charset=utf-8")
 
 
 # ==================== MAIN ====================
@@ -5,6 +5,8 @@ Integra com ChromaDB para armazenamento semântico
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
+import asyncio
 import sys
 import os
 from datetime import datetime
@@ -13,33 +15,45 @@ import logging
 # Adicionar shared ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from shared.utils import get_logger
+from shared.utils import get_logger, instrument_app, Dependency, tracer
 from shared.config import CHROMADB_HOST, CHROMADB_PORT, CHROMADB_PERSIST_DIR
 
 # ==================== SETUP ====================
+logger = get_logger(__name__)
+
+
+async def connect_chromadb():
+    """Cliente HTTP do container ChromaDB (import e conexão fora do event loop)"""
+    def build():
+        import chromadb
+        return chromadb.HttpClient(host=CHROMADB_HOST, port=int(CHROMADB_PORT))
+    return await asyncio.to_thread(build)
+
+
+async def check_chromadb(client):
+    await asyncio.to_thread(client.heartbeat)
+
+
+# Conectado em background; reconecta sozinho se o ChromaDB cair
+chroma = Dependency(f"ChromaDB ({CHROMADB_HOST}:{CHROMADB_PORT})", connect_chromadb, check=check_chromadb)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Conecta o ChromaDB em background e libera recursos no encerramento"""
+    chroma.start()
+    yield
+    await chroma.close()
+    await tracer.close()
+
+
 app = FastAPI(
     title="JARVIS Memory Service",
     description="Serviço de memória vetorial com ChromaDB",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
-
-logger = get_logger(__name__)
-
-# Inicializar ChromaDB
-try:
-    import chromadb
-    
-    # Usando cliente HTTP para conectar ao container ChromaDB
-    chroma_client = chromadb.HttpClient(
-        host=CHROMADB_HOST,
-        port=int(CHROMADB_PORT)
-    )
-    # Testar conexão
-    chroma_client.heartbeat()
-    logger.info(f"✅ ChromaDB conectado em {CHROMADB_HOST}:{CHROMADB_PORT}")
-except Exception as e:
-    logger.error(f"❌ Erro ao conectar ChromaDB: {e}")
-    chroma_client = None
+instrument_app(app, "memory-service")
 
 
 # ==================== MODELS ====================
@@ -72,7 +86,7 @@ class MemoryResponse(BaseModel):
 @app.get("/health")
 async def health_check():
     """Verifica saúde do serviço"""
-    chromadb_available = chroma_client is not None
+    chromadb_available = chroma.ready
     
     return {
         "status": "healthy" if chromadb_available else "degraded",
@@ -89,6 +103,7 @@ async def store_memory(request: MemoryStoreRequest) -> Dict:
     Armazena novo item de memória no banco vetorial
     """
     try:
+        chroma_client = chroma.client
         if not chroma_client:
             raise Exception("ChromaDB não disponível")
         
@@ -125,6 +140,7 @@ async def store_memory(request: MemoryStoreRequest) -> Dict:
     
     except Exception as e:
         logger.error(f"❌ Erro ao armazenar memória: {e}", exc_info=True)
+        chroma.recheck()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -134,6 +150,7 @@ async def recall_memory(request: MemoryRecallRequest) -> Dict:
     Recupera memórias relevantes baseado em query semântica
     """
     try:
+        chroma_client = chroma.client
         if not chroma_client:
             return {"memories": []}
         
@@ -178,6 +195,7 @@ async def recall_memory(request: MemoryRecallRequest) -> Dict:
     
     except Exception as e:
         logger.error(f"❌ Erro ao recuperar memória: {e}", exc_info=True)
+        chroma.recheck()
         return {"memories": []}
 
 
@@ -187,6 +205,7 @@ async def clear_memory(user_id: str) -> Dict:
     Limpa todas as memórias de um usuário
     """
     try:
+        chroma_client = chroma.client
         if not chroma_client:
             raise Exception("ChromaDB não disponível")
         
@@ -211,6 +230,7 @@ async def get_memory_stats(user_id: str) -> Dict:
     Retorna estatísticas de memória do usuário
     """
     try:
+        chroma_client = chroma.client
         if not chroma_client:
             return {"user_id": user_id, "total_memories": 0}
         
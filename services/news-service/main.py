@@ -5,6 +5,8 @@ Reutiliza o código de news_fetcher.py existente
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import sys
 import os
 from datetime import datetime
@@ -13,7 +15,7 @@ import logging
 # Adicionar shared ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from shared.utils import get_logger, cache
+from shared.utils import get_logger, instrument_app, SingleFlight, cache, tracer
 from shared.models import NewsItem
 
 # Importar o news fetcher existente
@@ -24,11 +26,21 @@ except ImportError:
     fetch_news_parallel = None
 
 # ==================== SETUP ====================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Libera o pool de conexões do cache no encerramento"""
+    yield
+    await cache.close()
+    await tracer.close()
+
+
 app = FastAPI(
     title="JARVIS News Service",
     description="Serviço de busca e processamento de notícias",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+instrument_app(app, "news-service")
 
 logger = get_logger(__name__)
 
@@ -49,6 +61,8 @@ class NewsResponse(BaseModel):
     language: str
     source_count: int
     cached: bool
+    # Resultado de uma busca de outra requisição em andamento (single-flight)
+    coalesced: bool = False
 
 
 # ==================== HEALTH CHECK ====================
@@ -59,64 +73,84 @@ async def health_check():
         "status": "healthy",
         "service": "news-service",
         "timestamp": datetime.utcnow().isoformat(),
-        "cache_available": cache.enabled
+        "cache_available": cache.enabled,
+        "cache": cache.stats()
     }
 
 
 # ==================== ENDPOINTS ====================
+# Buscas forçadas (skip_cache) idênticas em andamento são compartilhadas
+news_flight = SingleFlight()
+
+# Validade das notícias no cache (4 horas)
+NEWS_CACHE_SECONDS = 14400
+# Tag das entradas de notícias (clear-cache remove só as chaves da tag)
+NEWS_CACHE_TAG = "news"
+# Marca da migração das chaves anteriores às tags (fora de news:* para não ser varrida)
+NEWS_LEGACY_SWEEP_KEY = "migration:news-cache-tags"
+
+
 @app.post("/api/news/fetch")
 async def fetch_news(request: NewsRequest) -> NewsResponse:
     """
     Busca notícias de múltiplas fontes
+    Via cache.get_or_compute: na expiração apenas uma requisição (entre todas
+    as réplicas) busca os feeds, e entradas quentes são renovadas antes de expirar
     """
     try:
         logger.info(f"📰 Buscando notícias ({request.language}, limit={request.limit})...")
-        
-        # Verificar cache
         cache_key = f"news:{request.language}:{request.limit}"
-        if not request.skip_cache:
-            cached_news = cache.get(cache_key)
-            if cached_news:
-                logger.info("📦 Notícias retornadas do cache")
-                return NewsResponse(
-                    news=cached_news,
-                    total_count=len(cached_news),
-                    language=request.language,
-                    source_count=0,
-                    cached=True
-                )
-        
-        # Buscar notícias (usando função existente)
-        if fetch_news_parallel:
-            news_list = fetch_news_parallel(limit=request.limit)
-        else:
-            logger.warning("News fetcher não disponível, retornando lista vazia")
-            news_list = []
         
-        # Converter para dict
-        news_dicts = [
-            {
-                "title": n.get("title", ""),
-                "summary": n.get("summary", ""),
-                "source": n.get("source", ""),
-                "url": n.get("url", ""),
-                "published_at": n.get("published_at", ""),
-                "language": request.language
-            }
-            for n in news_list
-        ]
+        async def fetch() -> list:
+            # Buscar notícias (usando função existente)
+            if fetch_news_parallel:
+                # Busca bloqueante: roda em thread para não travar o event loop
+                news_list = await asyncio.to_thread(fetch_news_parallel, limit=request.limit)
+            else:
+                logger.warning("News fetcher não disponível, retornando lista vazia")
+                news_list = []
+            
+            # Converter para dict
+            news_dicts = [
+                {
+                    "title": n.get("title", ""),
+                    "summary": n.get("summary", ""),
+                    "source": n.get("source", ""),
+                    "url": n.get("url", ""),
+                    "published_at": n.get("published_at", ""),
+                    "language": request.language
+                }
+                for n in news_list
+            ]
+            
+            logger.info(f"✅ {len(news_dicts)} notícias encontradas")
+            # Lista vazia (feeds indisponíveis) não é cacheada
+            return news_dicts or None
         
-        logger.info(f"✅ {len(news_dicts)} notícias encontradas")
+        if request.skip_cache:
+            news_dicts, shared = await news_flight.do_shared(cache_key, fetch)
+            news_dicts = news_dicts or []
+            source = "coalesced" if shared else "computed"
+            if news_dicts and not shared:
+                await cache.set(cache_key, news_dicts, expire_seconds=NEWS_CACHE_SECONDS, tags=(NEWS_CACHE_TAG,))
+        else:
+            news_dicts, source = await cache.get_or_compute_source(
+                cache_key, fetch, expire_seconds=NEWS_CACHE_SECONDS, tags=(NEWS_CACHE_TAG,)
+            )
+            news_dicts = news_dicts or []
         
-        # Cachear por 4 horas
-        cache.set(cache_key, news_dicts, expire_seconds=14400)
+        if source == "coalesced":
+            logger.info("🔗 Notícias compartilhadas de uma busca em andamento")
+        elif source == "cache":
+            logger.info("📦 Notícias retornadas do cache")
         
         return NewsResponse(
             news=news_dicts,
             total_count=len(news_dicts),
             language=request.language,
             source_count=len(set(n["source"] for n in news_dicts)),
-            cached=False
+            cached=source == "cache",
+            coalesced=source == "coalesced"
         )
     
     except Exception as e:
@@ -141,12 +175,36 @@ async def get_sources():
 
 @app.post("/api/news/clear-cache")
 async def clear_cache():
-    """Limpa o cache de notícias"""
-    count = cache.clear_pattern("news:*")
+    """Limpa o cache de notícias (pela tag, sem varrer o keyspace)"""
+    count = await cache.invalidate_tags(NEWS_CACHE_TAG)
+    count += await sweep_legacy_news_keys()
     logger.info(f"🗑️  Cache limpo: {count} chaves removidas")
     return {"cleared": count}
 
 
+async def sweep_legacy_news_keys() -> int:
+    """
+    Migração única: remove as entradas news:* gravadas antes das tags
+    A varredura roda até concluir com sucesso uma vez; depois disso, a marca
+    no Redis faz clear-cache depender só de invalidate_tags
+    """
+    try:
+        if await cache.redis_client.exists(NEWS_LEGACY_SWEEP_KEY):
+            return 0
+    except Exception as e:
+        logger.warning(f"⚠️  Não foi possível verificar a migração das chaves de notícias: {e}")
+        return 0
+    count = await cache.clear_pattern("news:*")
+    if not cache.enabled:
+        return count  # varredura falhou: tenta de novo na próxima limpeza
+    try:
+        await cache.redis_client.set(NEWS_LEGACY_SWEEP_KEY, datetime.utcnow().isoformat())
+        logger.info(f"🧹 Migração das chaves de notícias concluída: {count} chaves sem tag removidas")
+    except Exception as e:
+        logger.warning(f"⚠️  Não foi possível registrar a migração das chaves de notícias: {e}")
+    return count
+
+
 # ==================== MAIN ====================
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,348 @@
+"""
+Broker - Fila de jobs entre a API do orchestrator e os workers
+Backends: "memory" (em processo, para testes locais), "redis" (listas
+confiáveis com heartbeat) e "rabbitmq" (AMQP via aio-pika)
+"""
+import asyncio
+import itertools
+import json
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import redis.asyncio as aioredis
+
+from shared.config import (
+    REDIS_URL,
+    RABBITMQ_URL,
+    JOB_BROKER_BACKEND,
+    JOB_QUEUE_NAME,
+    WORKER_PREFETCH,
+    WORKER_HEARTBEAT_SECONDS,
+)
+from shared.utils import get_logger
+
+try:
+    import aio_pika
+except ImportError:
+    aio_pika = None
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Delivery:
+    """Mensagem entregue a um worker, pendente de ack/nack"""
+    body: Dict[str, Any]
+    priority: int
+    tag: Any = None
+    redelivered: bool = False
+
+
+class JobBroker(ABC):
+    """
+    Interface comum dos brokers de jobs
+    - publish: enfileira uma mensagem com prioridade (10 é maior)
+    - get: aguarda a próxima mensagem; ela fica reservada ao worker até ack/nack
+    - nack(requeue=True): devolve a mensagem à fila (ex.: worker encerrando)
+    """
+
+    name = "base"
+
+    async def connect(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, body: Dict[str, Any], priority: int = 5):
+        ...
+
+    @abstractmethod
+    async def get(self) -> Delivery:
+        ...
+
+    @abstractmethod
+    async def ack(self, delivery: Delivery):
+        ...
+
+    @abstractmethod
+    async def nack(self, delivery: Delivery, requeue: bool = True):
+        ...
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """Mensagens aguardando na fila (sem contar as reservadas)"""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+def _clamp_priority(priority: int) -> int:
+    return min(max(int(priority), 1), 10)
+
+
+# ==================== MEMORY ====================
+class MemoryBroker(JobBroker):
+    """Fila de prioridade em processo (API e worker no mesmo processo)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._unacked: Dict[int, Delivery] = {}
+
+    async def publish(self, body: Dict[str, Any], priority: int = 5):
+        self._put(body, _clamp_priority(priority), redelivered=False)
+
+    def _put(self, body: Dict[str, Any], priority: int, redelivered: bool):
+        self._queue.put_nowait(((-priority, next(self._sequence)), body, redelivered))
+
+    async def get(self) -> Delivery:
+        (priority, _), body, redelivered = await self._queue.get()
+        delivery = Delivery(body, -priority, tag=next(self._sequence), redelivered=redelivered)
+        self._unacked[delivery.tag] = delivery
+        return delivery
+
+    async def ack(self, delivery: Delivery):
+        self._unacked.pop(delivery.tag, None)
+
+    async def nack(self, delivery: Delivery, requeue: bool = True):
+        if self._unacked.pop(delivery.tag, None) is not None and requeue:
+            self._put(delivery.body, delivery.priority, redelivered=True)
+
+    async def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "queued": self._queue.qsize(), "unacked": len(self._unacked)}
+
+
+# ==================== REDIS ====================
+# Devolve atomicamente uma mensagem de um worker morto à fila da sua prioridade
+# (a mensagem não é recodificada: o cjson troca listas vazias por objetos)
+_REQUEUE_SCRIPT = """
+local raw = redis.call('RPOP', KEYS[1])
+if not raw then return 0 end
+local envelope = cjson.decode(raw)
+redis.call('RPUSH', ARGV[1] .. envelope['priority'], raw)
+return 1
+"""
+
+
+class RedisBroker(JobBroker):
+    """
+    Fila confiável sobre listas do Redis
+    - uma lista por prioridade; a mensagem é movida (LMOVE) para a lista de
+      processamento do worker e só sai dela no ack
+    - cada worker mantém um heartbeat; mensagens de workers sem heartbeat
+      voltam para a fila (redelivery)
+    """
+
+    name = "redis"
+    QUEUE_PREFIX = "jobs:queue:"
+    PROCESSING_PREFIX = "jobs:processing:"
+    HEARTBEAT_PREFIX = "jobs:worker:"
+    WORKERS_KEY = "jobs:workers"
+    POLL_SECONDS = 0.5
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        heartbeat_seconds: int = WORKER_HEARTBEAT_SECONDS
+    ):
+        self.worker_id = worker_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+        self._requeue = self.redis_client.register_script(_REQUEUE_SCRIPT)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.requeued = 0
+
+    def _queue_key(self, priority: int) -> str:
+        return f"{self.QUEUE_PREFIX}{priority}"
+
+    def _processing_key(self, worker_id: str) -> str:
+        return f"{self.PROCESSING_PREFIX}{worker_id}"
+
+    async def connect(self):
+        # Apenas consumidores registram heartbeat; a API só publica
+        if self.worker_id is not None:
+            await self._beat()
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def publish(self, body: Dict[str, Any], priority: int = 5):
+        priority = _clamp_priority(priority)
+        envelope = json.dumps({"priority": priority, "body": body})
+        await self.redis_client.lpush(self._queue_key(priority), envelope)
+
+    async def get(self) -> Delivery:
+        processing = self._processing_key(self.worker_id)
+        while True:
+            for priority in range(10, 0, -1):
+                raw = await self.redis_client.lmove(self._queue_key(priority), processing, "RIGHT", "LEFT")
+                if raw:
+                    envelope = json.loads(raw)
+                    return Delivery(
+                        envelope["body"],
+                        envelope["priority"],
+                        tag=raw,
+                        redelivered=envelope.get("redelivered", False)
+                    )
+            await asyncio.sleep(self.POLL_SECONDS)
+
+    async def ack(self, delivery: Delivery):
+        await self.redis_client.lrem(self._processing_key(self.worker_id), 1, delivery.tag)
+
+    async def nack(self, delivery: Delivery, requeue: bool = True):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.lrem(self._processing_key(self.worker_id), 1, delivery.tag)
+            if requeue:
+                envelope = {**json.loads(delivery.tag), "redelivered": True}
+                # Volta para a ponta consumida: é a próxima da sua prioridade
+                pipe.rpush(self._queue_key(delivery.priority), json.dumps(envelope))
+            await pipe.execute()
+
+    async def depth(self) -> int:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for priority in range(1, 11):
+                pipe.llen(self._queue_key(priority))
+            return sum(await pipe.execute())
+
+    async def close(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            try:
+                # Encerramento limpo: devolve o que ainda estiver reservado
+                await self._requeue_worker(self.worker_id)
+                await self.redis_client.delete(f"{self.HEARTBEAT_PREFIX}{self.worker_id}")
+                await self.redis_client.srem(self.WORKERS_KEY, self.worker_id)
+            except Exception as e:
+                logger.error(f"Erro ao desregistrar worker: {e}")
+        await self.redis_client.aclose()
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "worker_id": self.worker_id, "requeued": self.requeued}
+
+    # ---------- heartbeat / redelivery ----------
+    async def _beat(self):
+        await self.redis_client.set(
+            f"{self.HEARTBEAT_PREFIX}{self.worker_id}", "alive", ex=self.heartbeat_seconds * 3
+        )
+        await self.redis_client.sadd(self.WORKERS_KEY, self.worker_id)
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self._beat()
+                await self._reap_dead_workers()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no heartbeat do worker: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def _reap_dead_workers(self):
+        for worker_id in await self.redis_client.smembers(self.WORKERS_KEY):
+            if worker_id == self.worker_id:
+                continue
+            if await self.redis_client.exists(f"{self.HEARTBEAT_PREFIX}{worker_id}"):
+                continue
+            count = await self._requeue_worker(worker_id)
+            await self.redis_client.srem(self.WORKERS_KEY, worker_id)
+            if count:
+                logger.warning(f"♻️  {count} job(s) do worker {worker_id} devolvidos à fila")
+
+    async def _requeue_worker(self, worker_id: str) -> int:
+        count = 0
+        while await self._requeue(keys=[self._processing_key(worker_id)], args=[self.QUEUE_PREFIX]):
+            count += 1
+        self.requeued += count
+        return count
+
+
+# ==================== RABBITMQ ====================
+class RabbitMQBroker(JobBroker):
+    """
+    Fila durável com prioridade no RabbitMQ
+    Prefetch via basic.qos; mensagens sem ack são reentregues pelo próprio
+    RabbitMQ quando a conexão do worker cai
+    """
+
+    name = "rabbitmq"
+
+    def __init__(self, url: str = RABBITMQ_URL, queue_name: str = JOB_QUEUE_NAME, prefetch: int = WORKER_PREFETCH):
+        if aio_pika is None:
+            raise RuntimeError("Backend rabbitmq requer o pacote aio-pika")
+        self.url = url
+        self.queue_name = queue_name
+        self.prefetch = prefetch
+        self._connection = None
+        self._channel = None
+        self._queue = None
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._consuming = False
+
+    async def connect(self):
+        self._connection = await aio_pika.connect_robust(self.url)
+        self._channel = await self._connection.channel()
+        await self._channel.set_qos(prefetch_count=self.prefetch)
+        self._queue = await self._channel.declare_queue(
+            self.queue_name, durable=True, arguments={"x-max-priority": 10}
+        )
+
+    async def publish(self, body: Dict[str, Any], priority: int = 5):
+        message = aio_pika.Message(
+            json.dumps(body).encode(),
+            priority=_clamp_priority(priority),
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            content_type="application/json"
+        )
+        await self._channel.default_exchange.publish(message, routing_key=self.queue_name)
+
+    async def get(self) -> Delivery:
+        if not self._consuming:
+            await self._queue.consume(self._incoming.put)
+            self._consuming = True
+        message = await self._incoming.get()
+        return Delivery(
+            json.loads(message.body),
+            message.priority or 5,
+            tag=message,
+            redelivered=bool(message.redelivered)
+        )
+
+    async def ack(self, delivery: Delivery):
+        await delivery.tag.ack()
+
+    async def nack(self, delivery: Delivery, requeue: bool = True):
+        await delivery.tag.nack(requeue=requeue)
+
+    async def depth(self) -> int:
+        queue = await self._channel.declare_queue(self.queue_name, passive=True)
+        return queue.declaration_result.message_count
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "queue": self.queue_name, "prefetch": self.prefetch}
+
+
+def create_broker(backend: str = JOB_BROKER_BACKEND, worker_id: Optional[str] = None) -> JobBroker:
+    """Cria o broker configurado; `worker_id` identifica consumidores (redis)"""
+    if backend == "memory":
+        return MemoryBroker()
+    if backend == "redis":
+        return RedisBroker(worker_id=worker_id)
+    if backend == "rabbitmq":
+        return RabbitMQBroker()
+    raise ValueError(f"Backend de broker desconhecido: {backend}")
+
+
+def new_worker_id() -> str:
+    return f"worker-{uuid.uuid4().hex[:8]}"
@@ -0,0 +1,125 @@
+"""
+Events - Fan-out de eventos de jobs (transições de estágio e status)
+Publicados via Redis pub/sub para funcionar com várias réplicas do orchestrator
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, Set
+
+import redis.asyncio as aioredis
+
+from shared.config import REDIS_URL, JOB_STORE_BACKEND
+from shared.utils import get_logger, to_serializable
+
+logger = get_logger(__name__)
+
+
+class JobEventBus:
+    """
+    Barramento de eventos por job
+    - publish: envia o evento ao canal job_events:{job_id} no Redis
+      (ou entrega localmente se o Redis não estiver em uso/disponível)
+    - subscribe: fila local alimentada por uma única conexão pub/sub,
+      inscrita apenas nos canais com assinantes neste processo
+    """
+
+    CHANNEL_PREFIX = "job_events:"
+    QUEUE_SIZE = 100
+
+    def __init__(self, backend: str = JOB_STORE_BACKEND):
+        self.redis_client = None
+        self._pubsub = None
+        self._listener = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        if backend == "redis":
+            self.redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+            self._pubsub = self.redis_client.pubsub()
+
+    def _channel(self, job_id: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{job_id}"
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        if self._pubsub is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+
+    # ---------- API ----------
+    async def publish(self, job_id: str, event: str, **fields):
+        """Publica um evento do job"""
+        payload = to_serializable({
+            "job_id": job_id,
+            "event": event,
+            "timestamp": datetime.utcnow().isoformat(),
+            **fields,
+        })
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.publish(self._channel(job_id), json.dumps(payload))
+                return
+            except Exception as e:
+                logger.error(f"Erro ao publicar evento no Redis: {e}")
+        self._dispatch(job_id, payload)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Assina os eventos de um job; os eventos chegam na fila retornada"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        subscribers = self._subscribers.setdefault(job_id, set())
+        subscribers.add(queue)
+        if len(subscribers) == 1 and self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(self._channel(job_id))
+            except Exception as e:
+                logger.error(f"Erro ao assinar eventos no Redis: {e}")
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(self._channel(job_id))
+                    except Exception as e:
+                        logger.error(f"Erro ao cancelar assinatura no Redis: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "subscribed_jobs": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+        }
+
+    # ---------- internos ----------
+    def _dispatch(self, job_id: str, payload: Dict):
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                # Assinante lento: descarta o evento mais antigo
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.5)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    job_id = message["channel"][len(self.CHANNEL_PREFIX):]
+                    self._dispatch(job_id, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no listener de eventos: {e}")
+                await asyncio.sleep(1)
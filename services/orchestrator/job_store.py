@@ -0,0 +1,220 @@
+"""
+Job Store - Armazenamento de jobs do orchestrator
+Front LRU limitado em processo + backend Redis (hashes com TTL)
+"""
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from shared.config import (
+    REDIS_URL,
+    JOB_STORE_BACKEND,
+    JOB_STORE_LOCAL_MAX_ENTRIES,
+    CLEANUP_COMPLETED_JOBS_AFTER_DAYS,
+    CLEANUP_FAILED_JOBS_AFTER_DAYS,
+)
+from shared.utils import get_logger, to_serializable
+
+logger = get_logger(__name__)
+
+# Status que encerram o ciclo de vida de um job
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class LRUJobCache:
+    """Cache LRU em processo com limite de entradas e TTL por entrada"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        entry = self._entries.get(job_id)
+        if entry is None:
+            return None
+        expires_at, job = entry
+        if expires_at <= time.monotonic():
+            del self._entries[job_id]
+            return None
+        self._entries.move_to_end(job_id)
+        return job
+
+    def put(self, job_id: str, job: Dict, ttl_seconds: int):
+        self._entries[job_id] = (time.monotonic() + ttl_seconds, job)
+        self._entries.move_to_end(job_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, job_id: str):
+        self._entries.pop(job_id, None)
+
+    def keys(self) -> List[str]:
+        return list(self._entries.keys())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JobStore:
+    """
+    Armazenamento de jobs com retenção configurável
+    - backend "redis": hash job:{id} com TTL, front LRU em processo
+    - backend "memory": apenas o front LRU (sem durabilidade)
+    """
+
+    KEY_PREFIX = "job:"
+    CHECKPOINT_PREFIX = "checkpoint:"
+
+    def __init__(
+        self,
+        backend: str = JOB_STORE_BACKEND,
+        max_entries: int = JOB_STORE_LOCAL_MAX_ENTRIES,
+        completed_retention_seconds: int = CLEANUP_COMPLETED_JOBS_AFTER_DAYS * 86400,
+        failed_retention_seconds: int = CLEANUP_FAILED_JOBS_AFTER_DAYS * 86400,
+    ):
+        self.backend = backend
+        self.local = LRUJobCache(max_entries)
+        self.completed_retention_seconds = completed_retention_seconds
+        self.failed_retention_seconds = failed_retention_seconds
+        self.redis_client = None
+        if backend == "redis":
+            self.redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+    # ---------- helpers ----------
+    def _key(self, job_id: str) -> str:
+        return f"{self.KEY_PREFIX}{job_id}"
+
+    def _retention_for(self, status: Optional[str]) -> int:
+        if status in ("failed", "cancelled"):
+            return self.failed_retention_seconds
+        return self.completed_retention_seconds
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {k: json.dumps(to_serializable(v)) for k, v in fields.items()}
+
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in raw.items()}
+
+    # ---------- API ----------
+    async def create(self, job_id: str, checkpoints: Optional[Dict[str, Any]] = None, **fields) -> Dict:
+        """Registra um novo job; `checkpoints` são saídas de estágios já disponíveis"""
+        now = datetime.utcnow().isoformat()
+        job = to_serializable({
+            "job_id": job_id,
+            "status": "pending",
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+            **{f"{self.CHECKPOINT_PREFIX}{name}": value for name, value in (checkpoints or {}).items()},
+        })
+        await self._write(job_id, job, job, replace=True)
+        return job
+
+    async def update(self, job_id: str, **fields) -> Dict:
+        """Atualiza campos de um job existente"""
+        fields = to_serializable({**fields, "updated_at": datetime.utcnow().isoformat()})
+        job = self.local.get(job_id)
+        if job is None:
+            job = await self._read_remote(job_id) or {"job_id": job_id}
+        job.update(fields)
+        await self._write(job_id, job, fields)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Recupera um job
+        Jobs finalizados são servidos do front local; jobs em andamento
+        são lidos do Redis, que é a fonte de verdade entre réplicas
+        """
+        job = self.local.get(job_id)
+        if job is not None and (self.redis_client is None or job.get("status") in TERMINAL_STATUSES):
+            return job
+
+        remote = await self._read_remote(job_id)
+        if remote is None:
+            return job
+        self.local.put(job_id, remote, self._retention_for(remote.get("status")))
+        return remote
+
+    async def save_checkpoint(self, job_id: str, name: str, value: Any):
+        """Salva a saída de um estágio do job (mesmo hash e TTL do job)"""
+        await self.update(job_id, **{f"{self.CHECKPOINT_PREFIX}{name}": value})
+
+    async def get_checkpoints(self, job_id: str) -> Dict[str, Any]:
+        """Saídas de estágios salvas para o job"""
+        job = await self.get(job_id) or {}
+        return {
+            key[len(self.CHECKPOINT_PREFIX):]: value
+            for key, value in job.items()
+            if key.startswith(self.CHECKPOINT_PREFIX)
+        }
+
+    @classmethod
+    def public_view(cls, job: Dict) -> Dict:
+        """Job sem o conteúdo dos checkpoints (apenas os nomes)"""
+        view = {k: v for k, v in job.items() if not k.startswith(cls.CHECKPOINT_PREFIX)}
+        view["checkpoints"] = [
+            key[len(cls.CHECKPOINT_PREFIX):] for key in job if key.startswith(cls.CHECKPOINT_PREFIX)
+        ]
+        return view
+
+    async def delete(self, job_id: str):
+        """Remove um job"""
+        self.local.delete(job_id)
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.delete(self._key(job_id))
+            except Exception as e:
+                logger.error(f"Erro ao remover job do Redis: {e}")
+
+    def stats(self) -> Dict:
+        """Estatísticas do armazenamento"""
+        return {
+            "backend": self.backend,
+            "local_entries": len(self.local),
+            "local_max_entries": self.local.max_entries,
+            "local_evictions": self.local.evictions,
+        }
+
+    def recent_job_ids(self) -> List[str]:
+        """IDs dos jobs presentes no front local (mais recentes por último)"""
+        return self.local.keys()
+
+    async def close(self):
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+
+    # ---------- backend ----------
+    async def _write(self, job_id: str, job: Dict, changed: Dict, replace: bool = False):
+        ttl = self._retention_for(job.get("status"))
+        self.local.put(job_id, job, ttl)
+        if self.redis_client is None:
+            return
+        try:
+            key = self._key(job_id)
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                if replace:
+                    pipe.delete(key)
+                pipe.hset(key, mapping=self._encode(changed))
+                pipe.expire(key, ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Erro ao salvar job no Redis: {e}")
+
+    async def _read_remote(self, job_id: str) -> Optional[Dict]:
+        if self.redis_client is None:
+            return None
+        try:
+            raw = await self.redis_client.hgetall(self._key(job_id))
+            return self._decode(raw) if raw else None
+        except Exception as e:
+            logger.error(f"Erro ao ler job do Redis: {e}")
+            return None
@@ -2,9 +2,12 @@
 JARVIS Orchestrator - Coordena a execução do pipeline de podcast
 Funciona como o maestro orquestrando todos os microserviços
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import time
 from datetime import datetime
 from typing import Optional
 import sys
@@ -14,32 +17,99 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
 from shared.models import (
-    PodcastRequest, PodcastResult, JobStatus, 
-    ServiceInfo, ServiceStatus, AgentType
+    PodcastRequest, ServiceInfo, ServiceStatus, AgentType, JobMessage, BatchPodcastRequest
+)
+from shared.config import (
+    ENABLE_AUTH, BATCH_MAX_SIZE, ORCHESTRATOR_MODE, SCHEDULER_MAX_QUEUE_SIZE, PIPELINE_STREAMING,
+    PIPELINE_DEADLINE_SECONDS
+)
+from shared.utils import (
+    get_logger, instrument_app, histogram, SingleFlight, cache, to_serializable,
+    stable_digest, circuit_breaker_stats, log_context, span, tracer, build_waterfall
+)
+from job_store import JobStore, TERMINAL_STATUSES
+from scheduler import JobScheduler, QueueFullError
+from broker import create_broker
+from worker import PipelineWorker
+from podcast import (
+    job_store, event_bus, llm_client, news_client, script_client, tts_client, memory_client,
+    close_service_clients, podcast_request_from_dict, run_podcast_job, cache_podcast_result,
+    run_in_background, fetch_news, set_job_status, process_podcast_pipeline, PIPELINE_STAGE_ORDER
 )
-from shared.config import SERVICE_URLS, ENABLE_AUTH
-from shared.utils import get_logger, ServiceClient, cache
 import json
 
 # ==================== SETUP ====================
-app = FastAPI(
-    title="JARVIS Orchestrator",
-    description="Coordenador central do pipeline de podcast",
-    version="1.0.0"
+logger = get_logger(__name__)
+
+# Fila de prioridade + pool limitado de workers para os pipelines
+# (só é iniciado no modo inline; no modo queue a fila é a do broker)
+scheduler = JobScheduler()
+
+# Modo queue: a API só enfileira; workers (worker.py) executam os pipelines
+QUEUE_MODE = ORCHESTRATOR_MODE == "queue"
+broker = create_broker() if QUEUE_MODE else None
+
+# Worker embutido na API (apenas com o broker em memória)
+embedded_worker: Optional[PipelineWorker] = None
+
+# Pipelines em andamento (ou na fila) por fingerprint da requisição;
+# requisições idênticas se juntam ao pipeline existente
+pipeline_flight = SingleFlight()
+flight_leaders = {}
+
+# Resultado prometido por cada job líder e tarefas que aguardam o líder
+# (por ID do job coalescido), usados no cancelamento
+leader_completions = {}
+follower_tasks = {}
+
+# IDs de jobs sendo registrados neste processo (reenvios concorrentes do mesmo ID)
+admitting_jobs = set()
+
+# Tempo de espera na fila do scheduler (o pipeline é medido em podcast.py)
+QUEUE_WAIT = histogram(
+    "jarvis_pipeline_queue_wait_seconds",
+    "Tempo de espera na fila do scheduler antes da execução"
 )
 
-logger = get_logger(__name__)
+# Intervalo de keep-alive das conexões SSE
+SSE_KEEPALIVE_SECONDS = 15
 
-# Clientes para outros serviços
-news_client = ServiceClient(SERVICE_URLS["news_service"])
-script_client = ServiceClient(SERVICE_URLS["script_service"])
-tts_client = ServiceClient(SERVICE_URLS["tts_service"])
-memory_client = ServiceClient(SERVICE_URLS["memory_service"])
 
-# Armazenamento em memória de jobs (em produção usar banco de dados)
-active_jobs = {}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicializa e libera recursos do orchestrator"""
+    global embedded_worker
+    await event_bus.start()
+    if not QUEUE_MODE:
+        await scheduler.start()
+    if broker is not None:
+        await broker.connect()
+        if broker.name == "memory":
+            embedded_worker = PipelineWorker(broker, run_podcast_job, job_store, event_bus)
+            await embedded_worker.start()
+        logger.info(f"📬 Modo queue: jobs enfileirados no broker {broker.name}")
+    yield
+    if embedded_worker is not None:
+        await embedded_worker.stop()
+    if broker is not None:
+        await broker.close()
+    if not QUEUE_MODE:
+        await scheduler.stop()
+    await close_service_clients()
+    await cache.close()
+    await tracer.close()
+    await event_bus.close()
+    await job_store.close()
 
 
+app = FastAPI(
+    title="JARVIS Orchestrator",
+    description="Coordenador central do pipeline de podcast",
+    version="1.0.0",
+    lifespan=lifespan
+)
+instrument_app(app, "orchestrator")
+
 # ==================== HEALTH CHECK ====================
 @app.get("/health")
 async def health_check():
@@ -48,69 +118,525 @@ async def health_check():
         "status": "healthy",
         "service": "orchestrator",
         "timestamp": datetime.utcnow().isoformat(),
-        "active_jobs": len(active_jobs)
+        "job_store": job_store.stats(),
+        "scheduler": None if QUEUE_MODE else scheduler.stats(),
+        "coalescing": pipeline_flight.stats(),
+        "events": event_bus.stats(),
+        "mode": ORCHESTRATOR_MODE,
+        "broker": broker.stats() if broker is not None else None,
+        "embedded_worker": embedded_worker.stats() if embedded_worker is not None else None,
+        "circuits": circuit_breaker_stats(),
+        "hedging": {"news": news_client.stats(), "memory": memory_client.stats()}
     }
 
 
+# ==================== SCHEDULING ====================
+def request_fingerprint(request: PodcastRequest) -> str:
+    """
+    Impressão digital canônica das entradas que determinam o podcast gerado e
+    de como o pipeline roda (modo, prazo e prioridade): um job só se junta a
+    um líder que executa exatamente como ele executaria
+    """
+    payload = {
+        "agent_name": request.agent_name,
+        "agent_type": request.agent_type.value,
+        "user_id": request.user_id,
+        "language": request.language,
+        "voice": request.voice,
+        "news_count": request.news_count,
+        "streaming": bool(request.metadata.get("streaming", PIPELINE_STREAMING)),
+        "deadline_seconds": float(request.metadata.get("deadline_seconds", PIPELINE_DEADLINE_SECONDS)),
+        "priority": request.priority,
+    }
+    return stable_digest(payload)
+
+
+async def submit_podcast_job(
+    request: PodcastRequest,
+    seed: Optional[dict] = None,
+    completion: Optional[asyncio.Future] = None
+) -> int:
+    """
+    Envia um job já registrado ao scheduler (ou ao broker, no modo queue)
+    `completion` recebe o resultado do pipeline (ou None em caso de falha)
+    Levanta QueueFullError se a fila estiver cheia
+    """
+    message = JobMessage(
+        job_id=request.id,
+        agent_id=request.agent_name,
+        agent_name=request.agent_name,
+        agent_type=request.agent_type,
+        user_id=request.user_id,
+        priority=request.priority,
+        metadata=request.metadata
+    )
+    
+    if broker is not None:
+        return await publish_podcast_job(message, request, seed, completion)
+    
+    enqueued_at = time.monotonic()
+    
+    async def run():
+        QUEUE_WAIT.observe(time.monotonic() - enqueued_at)
+        try:
+            with log_context(job_id=request.id), span("podcast.pipeline", job_id=request.id):
+                result = await process_podcast_pipeline(request.id, request, seed)
+            if completion is not None and not completion.done():
+                completion.set_result(result)
+        finally:
+            if completion is not None and not completion.done():
+                completion.cancel()
+    
+    return scheduler.submit(message, run)
+
+
+async def queue_depth() -> int:
+    """Jobs aguardando execução: fila do scheduler ou, no modo queue, do broker"""
+    if QUEUE_MODE:
+        return await broker.depth()
+    return scheduler.queue_depth
+
+
+async def queue_free_slots() -> int:
+    """Quantos jobs ainda cabem na fila (mesmo limite de publish_podcast_job)"""
+    if QUEUE_MODE:
+        return max(SCHEDULER_MAX_QUEUE_SIZE - await broker.depth(), 0)
+    return scheduler.free_slots
+
+
+async def publish_podcast_job(
+    message: JobMessage,
+    request: PodcastRequest,
+    seed: Optional[dict] = None,
+    completion: Optional[asyncio.Future] = None
+) -> int:
+    """
+    Modo queue: publica o JobMessage no broker para um worker executar
+    A requisição e o seed seguem no metadata da mensagem
+    """
+    depth = await broker.depth()
+    if depth >= SCHEDULER_MAX_QUEUE_SIZE:
+        raise QueueFullError(f"Fila cheia ({SCHEDULER_MAX_QUEUE_SIZE} jobs aguardando)")
+    
+    if completion is not None:
+        run_in_background(await_remote_completion(request.id, completion))
+    message.metadata = {**message.metadata, "request": request, "seed": seed or {}}
+    await broker.publish(to_serializable(message), priority=request.priority)
+    return depth + 1
+
+
+async def await_remote_completion(job_id: str, completion: asyncio.Future):
+    """Resolve `completion` quando o job executado por um worker terminar"""
+    async with event_bus.subscribe(job_id) as queue:
+        while not completion.done():
+            job = await job_store.get(job_id) or {}
+            status = job.get("status")
+            if status in TERMINAL_STATUSES:
+                completion.set_result(job.get("result") if status == "completed" else None)
+                return
+            try:
+                # Qualquer evento do job (ou o timeout) dispara nova verificação
+                await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def follow_leader_job(job_id: str, leader_id: str, leader: asyncio.Future, user_id: str):
+    """Aguarda o pipeline líder e copia seu resultado para o job coalescido"""
+    try:
+        result = await asyncio.shield(leader)
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+        result = None
+    
+    if result is None:
+        leader_job = await job_store.get(leader_id) or {}
+        if leader_job.get("status") == "cancelled":
+            error = f"Pipeline líder {leader_id} foi cancelado"
+        else:
+            error = leader_job.get("error") or "Pipeline líder não foi concluído"
+        await set_job_status(job_id, "failed", error=error)
+        return
+    
+    result = {**result, "id": job_id, "job_id": job_id}
+    await cache_podcast_result(job_id, result, user_id)
+    await set_job_status(job_id, "completed", result=result)
+    logger.info(f"✅ Job {job_id} concluído com o resultado de {leader_id}")
+
+
+async def enqueue_podcast_job(request: PodcastRequest, seed: Optional[dict] = None, **fields) -> dict:
+    """
+    Registra o job e o envia ao scheduler
+    Se um pipeline idêntico já estiver na fila ou em execução, o job se junta
+    a ele (single-flight) em vez de ocupar uma vaga no scheduler
+    `seed` contém resultados de estágios já disponíveis (ex.: notícias do lote)
+    Um ID já registrado (ex.: reenvio do cron após timeout) não cria outro job:
+    o job existente é devolvido, sem reenfileirar nem sobrescrever seu registro
+    Levanta QueueFullError se a fila estiver cheia
+    """
+    if request.id in admitting_jobs:
+        return existing_job_view({})
+    admitting_jobs.add(request.id)
+    try:
+        existing = await job_store.get(request.id)
+        if existing is not None:
+            logger.info(f"⏭️  Job {request.id} já registrado ({existing.get('status')}); reenvio ignorado")
+            return existing_job_view(existing)
+        return await admit_podcast_job(request, seed, **fields)
+    finally:
+        admitting_jobs.discard(request.id)
+
+
+def existing_job_view(job: dict) -> dict:
+    """Resposta de enqueue_podcast_job para um ID já registrado"""
+    return {
+        "queue_position": None,
+        "coalesced_with": job.get("coalesced_with"),
+        "status": job.get("status", "pending"),
+        "existing": True
+    }
+
+
+async def admit_podcast_job(request: PodcastRequest, seed: Optional[dict] = None, **fields) -> dict:
+    """Registra um job novo: coalescido com um pipeline idêntico ou enviado ao scheduler"""
+    fingerprint = request_fingerprint(request)
+    leader = pipeline_flight.join(fingerprint)
+    if leader is not None:
+        leader_id = flight_leaders.get(fingerprint)
+        logger.info(f"🔗 Job {request.id} coalescido com {leader_id}")
+        await job_store.create(
+            request.id, checkpoints=seed, request=request, priority=request.priority,
+            coalesced_with=leader_id, **fields
+        )
+        task = run_in_background(follow_leader_job(request.id, leader_id, leader, request.user_id))
+        follower_tasks[request.id] = task
+        task.add_done_callback(lambda _: follower_tasks.pop(request.id, None))
+        return {"queue_position": None, "coalesced_with": leader_id}
+    
+    # Registrar antes de qualquer await para que duplicatas concorrentes se juntem a este job
+    completion = asyncio.get_running_loop().create_future()
+    pipeline_flight.track(fingerprint, completion)
+    flight_leaders[fingerprint] = request.id
+    leader_completions[request.id] = completion
+    completion.add_done_callback(lambda _: flight_leaders.pop(fingerprint, None))
+    completion.add_done_callback(lambda _: leader_completions.pop(request.id, None))
+    
+    # O seed vira checkpoint: uma nova tentativa do job reaproveita essas saídas
+    await job_store.create(request.id, checkpoints=seed, request=request, priority=request.priority, **fields)
+    try:
+        position = await submit_podcast_job(request, seed, completion)
+    except QueueFullError:
+        completion.cancel()
+        await job_store.delete(request.id)
+        raise
+    return {"queue_position": position, "coalesced_with": None}
+
+
 # ==================== ENDPOINTS ====================
 @app.post("/api/podcast/generate")
-async def generate_podcast(request: PodcastRequest, background_tasks: BackgroundTasks):
+async def generate_podcast(request: PodcastRequest):
     """
     Inicia geração de um podcast
-    Retorna imediatamente com o ID do job
+    Retorna imediatamente com o ID do job (429 se a fila estiver cheia)
     """
     try:
         job_id = request.id
         
         logger.info(f"📻 Iniciando podcast: {job_id} (agente: {request.agent_name})")
         
-        # Armazenar job como pendente
-        active_jobs[job_id] = {
-            "status": "pending",
-            "request": request,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        # Processar em background
-        background_tasks.add_task(
-            process_podcast_pipeline,
-            job_id,
-            request
-        )
+        # Armazenar job como pendente e enfileirar no scheduler
+        enqueued = await enqueue_podcast_job(request)
         
         return {
             "job_id": job_id,
             "status": "pending",
-            "message": "Podcast em fila de processamento"
+            "message": "Podcast em fila de processamento",
+            **enqueued,
+            "queue_depth": await queue_depth()
         }
     
+    except QueueFullError as e:
+        logger.warning(f"⚠️  Podcast rejeitado: {e}")
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao iniciar podcast: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/podcast/generate-batch")
+async def generate_podcast_batch(batch: BatchPodcastRequest):
+    """
+    Inicia a geração de vários podcasts
+    As notícias são buscadas uma única vez por idioma e compartilhadas;
+    roteiro e TTS de cada item rodam no scheduler (concorrência limitada)
+    """
+    requests = batch.requests
+    if not requests:
+        raise HTTPException(status_code=400, detail="Lote vazio")
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"Lote maior que o máximo ({BATCH_MAX_SIZE})")
+    if len({request.id for request in requests}) != len(requests):
+        raise HTTPException(status_code=400, detail="IDs duplicados no lote")
+    free_slots = await queue_free_slots()
+    if len(requests) > free_slots:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Fila sem espaço para o lote ({free_slots} vagas)"
+        )
+    
+    logger.info(f"📦 Iniciando lote {batch.id} com {len(requests)} podcasts")
+    
+    # Buscar notícias uma vez por idioma (com o maior limite pedido)
+    limits = {}
+    for request in requests:
+        limits[request.language] = max(limits.get(request.language, 0), request.news_count)
+    
+    languages = list(limits)
+    fetched = await asyncio.gather(
+        *(fetch_news(language, limits[language]) for language in languages),
+        return_exceptions=True
+    )
+    news_by_language = {}
+    for language, news in zip(languages, fetched):
+        if isinstance(news, Exception):
+            logger.warning(f"⚠️  Notícias ({language}) não pré-carregadas no lote: {news}")
+        else:
+            news_by_language[language] = news
+    
+    items = []
+    for request in requests:
+        news = news_by_language.get(request.language)
+        seed = {"news": news[:request.news_count]} if news is not None else None
+        try:
+            enqueued = await enqueue_podcast_job(request, seed=seed, batch_id=batch.id)
+            items.append({"job_id": request.id, "status": "pending", **enqueued})
+        except QueueFullError as e:
+            items.append({"job_id": request.id, "status": "rejected", "error": str(e)})
+    
+    await job_store.create(batch.id, kind="batch", job_ids=[item["job_id"] for item in items])
+    
+    return {
+        "batch_id": batch.id,
+        "total": len(items),
+        "news_fetches": len(news_by_language),
+        "items": items
+    }
+
+
+@app.get("/api/podcast/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """Retorna o status de cada item de um lote"""
+    batch = await job_store.get(batch_id)
+    if batch is None or batch.get("kind") != "batch":
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    
+    job_ids = batch.get("job_ids", [])
+    jobs = await asyncio.gather(*(job_store.get(job_id) for job_id in job_ids))
+    
+    items = []
+    summary = {}
+    for job_id, job in zip(job_ids, jobs):
+        status = job.get("status") if job else "rejected"
+        summary[status] = summary.get(status, 0) + 1
+        items.append({
+            "job_id": job_id,
+            "status": status,
+            "error": job.get("error") if job else None
+        })
+    
+    finished = all(item["status"] in TERMINAL_STATUSES | {"rejected"} for item in items)
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if finished else "running",
+        "created_at": batch.get("created_at"),
+        "summary": summary,
+        "items": items
+    }
+
+
 @app.get("/api/podcast/status/{job_id}")
 async def get_podcast_status(job_id: str):
     """Retorna status de um job"""
-    if job_id not in active_jobs:
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    # O broker não expõe a posição de uma mensagem: no modo queue só a profundidade
+    return {
+        **JobStore.public_view(job),
+        "queue": {
+            "position": None if QUEUE_MODE else scheduler.position(job_id),
+            "depth": await queue_depth()
+        }
+    }
+
+
+@app.post("/api/podcast/retry/{job_id}")
+async def retry_podcast(job_id: str):
+    """
+    Reexecuta um job que falhou a partir do primeiro estágio não concluído
+    Saídas já salvas (notícias, memória, roteiro, áudio) são reaproveitadas
+    """
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job.get("status") not in ("failed", "cancelled"):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Apenas jobs com falha ou cancelados podem ser reexecutados. Status: {job.get('status')}"
+        )
+    
+    request = podcast_request_from_dict(job["request"])
+    checkpoints = await job_store.get_checkpoints(job_id)
+    resumed_from = next((stage for stage in PIPELINE_STAGE_ORDER if stage not in checkpoints), None)
+    
+    attempts = job.get("attempts", 1) + 1
+    # Estado da execução anterior, restaurado se a fila recusar a nova tentativa
+    previous = {
+        "status": job.get("status"),
+        "error": job.get("error"),
+        "attempts": attempts - 1,
+        "deliveries": job.get("deliveries", 0),
+        "stages": job.get("stages", {}),
+        "current_stage": job.get("current_stage"),
+    }
+    await job_store.update(
+        job_id, status="pending", error=None, attempts=attempts, deliveries=0, stages={}, current_stage=None
+    )
+    try:
+        position = await submit_podcast_job(request, checkpoints)
+    except QueueFullError as e:
+        await job_store.update(job_id, **previous)
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    logger.info(f"🔁 Reexecutando {job_id} a partir de: {resumed_from} (tentativa {attempts})")
+    
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "attempt": attempts,
+        "resumed_from": resumed_from,
+        "reused_checkpoints": sorted(checkpoints),
+        "queue_position": position
+    }
+
+
+@app.delete("/api/podcast/{job_id}")
+async def cancel_podcast(job_id: str):
+    """
+    Cancela um job pendente ou em execução
+    Remove o job da fila (ou interrompe o pipeline) e pede ao script-service,
+    ao llm-service e ao tts-service que abandonem o trabalho em andamento
+    dessa execução
+    """
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job.get("status") in TERMINAL_STATUSES:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job já finalizado. Status: {job.get('status')}"
+        )
+    
+    # No modo queue o pipeline roda em um worker, que reage ao evento de status
+    was_running = scheduler.is_running(job_id) or job.get("status") == "running"
+    run_id = job.get("run_id")
+    
+    # Status primeiro: jobs coalescidos com este veem o motivo ao serem liberados
+    await set_job_status(job_id, "cancelled")
+    
+    scheduler.cancel(job_id)
+    if job_id in follower_tasks:
+        follower_tasks[job_id].cancel()
+    if job_id in leader_completions:
+        # Job removido da fila nunca executa: liberar quem aguardava por ele
+        leader_completions[job_id].cancel()
+    if scheduler.is_running(job_id):
+        await scheduler.wait_finished(job_id, timeout=5)
+    
+    # Interromper o trabalho já enviado aos serviços de geração
+    downstream = {}
+    if was_running and run_id:
+        responses = await asyncio.gather(
+            script_client.post(f"/api/script/cancel/{run_id}"),
+            llm_client.post(f"/api/llm/cancel/{run_id}"),
+            tts_client.post(f"/api/tts/cancel/{run_id}")
+        )
+        downstream = {
+            "script": (responses[0] or {}).get("cancelled_tasks"),
+            "llm": (responses[1] or {}).get("cancelled_tasks"),
+            "tts": (responses[2] or {}).get("cancelled_tasks")
+        }
+    
+    logger.info(f"🛑 Job cancelado: {job_id}")
+    
+    return {
+        "job_id": job_id,
+        "status": "cancelled",
+        "was_running": was_running,
+        "downstream_cancelled": downstream,
+        "scheduler": None if QUEUE_MODE else scheduler.stats()
+    }
+
+
+@app.get("/api/podcast/events/{job_id}")
+async def stream_podcast_events(job_id: str):
+    """
+    Server-Sent Events com o progresso de um job
+    Envia um snapshot inicial e depois cada transição de estágio/status,
+    encerrando quando o job termina
+    """
+    if await job_store.get(job_id) is None:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
-    return active_jobs[job_id]
+    def sse(payload: dict) -> str:
+        return f"event: {payload['event']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    async def event_stream():
+        # Assinar antes do snapshot para não perder transições
+        async with event_bus.subscribe(job_id) as queue:
+            job = await job_store.get(job_id) or {}
+            yield sse({
+                "event": "snapshot",
+                "job_id": job_id,
+                "status": job.get("status"),
+                "stages": job.get("stages", {}),
+                "error": job.get("error")
+            })
+            if job.get("status") in TERMINAL_STATUSES:
+                return
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse(event)
+                if event.get("event") == "status" and event.get("status") in TERMINAL_STATUSES:
+                    return
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/podcast/result/{job_id}")
 async def get_podcast_result(job_id: str):
     """Retorna resultado de um podcast completo"""
     # Tentar recuperar do cache primeiro
-    cached = cache.get(f"podcast_result:{job_id}")
+    cached = await cache.get(f"podcast_result:{job_id}")
     if cached:
         logger.info(f"📦 Resultado retornado do cache: {job_id}")
         return cached
     
-    if job_id not in active_jobs:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
-    job = active_jobs[job_id]
     if job.get("status") != "completed":
         raise HTTPException(
             status_code=202,
@@ -120,154 +646,51 @@ async def get_podcast_result(job_id: str):
     return job.get("result")
 
 
-# ==================== PIPELINE ====================
-async def process_podcast_pipeline(job_id: str, request: PodcastRequest):
-    """
-    Pipeline principal: orquestra todos os microserviços
-    Fluxo:
-    1. Buscar notícias
-    2. Recuperar memória relevante
-    3. Gerar roteiro
-    4. Gerar áudio (TTS)
-    5. Salvar resultado
-    """
-    logger.info(f"▶️  Iniciando pipeline para: {job_id}")
-    
-    try:
-        # Atualizar status
-        active_jobs[job_id]["status"] = "running"
-        
-        # Step 1: Buscar notícias
-        logger.info(f"📰 Step 1/4: Buscando notícias...")
-        news_response = await news_client.post(
-            "/api/news/fetch",
-            data={
-                "language": request.language,
-                "limit": request.news_count
-            }
-        )
-        
-        if not news_response:
-            raise Exception("Falha ao buscar notícias")
-        
-        news_list = news_response.get("news", [])
-        logger.info(f"✅ {len(news_list)} notícias encontradas")
-        
-        # Step 2: Recuperar memória relevante
-        logger.info(f"🧠 Step 2/4: Buscando memórias relevantes...")
-        memory_response = await memory_client.post(
-            "/api/memory/recall",
-            data={
-                "query": f"podcast {request.agent_type.value}",
-                "limit": 3,
-                "user_id": request.user_id
-            }
-        )
-        
-        memory_context = ""
-        if memory_response and memory_response.get("memories"):
-            memories = memory_response.get("memories", [])
-            memory_context = " ".join([m.get("content", "") for m in memories])
-            logger.info(f"✅ {len(memories)} memórias recuperadas")
-        else:
-            logger.info("ℹ️  Nenhuma memória anterior encontrada")
-        
-        # Step 3: Gerar roteiro
-        logger.info(f"📝 Step 3/4: Gerando roteiro...")
-        script_response = await script_client.post(
-            "/api/script/generate",
-            data={
-                "agent_name": request.agent_name,
-                "agent_type": request.agent_type.value,
-                "news": news_list,
-                "memory_context": memory_context,
-                "language": request.language
-            }
-        )
-        
-        if not script_response:
-            raise Exception("Falha ao gerar roteiro")
-        
-        script = script_response.get("script", "")
-        logger.info(f"✅ Roteiro gerado ({len(script)} caracteres)")
-        
-        # Step 4: Gerar áudio (TTS)
-        logger.info(f"🎙️  Step 4/4: Gerando áudio...")
-        tts_response = await tts_client.post(
-            "/api/tts/generate",
-            data={
-                "text": script,
-                "voice": request.voice,
-                "agent_name": request.agent_name,
-                "language": request.language
-            }
-        )
-        
-        if not tts_response:
-            raise Exception("Falha ao gerar áudio")
-        
-        audio_path = tts_response.get("audio_path", "")
-        duration = tts_response.get("duration", 0.0)
-        logger.info(f"✅ Áudio gerado ({duration:.1f}s)")
-        
-        # Step 5: Salvar resultado
-        result = PodcastResult(
-            id=request.id,
-            job_id=job_id,
-            agent_name=request.agent_name,
-            agent_type=request.agent_type,
-            status=JobStatus.COMPLETED,
-            script=script,
-            audio_path=audio_path,
-            audio_duration=duration,
-            news_used=news_list,
-            memory_recalled=memory_context,
-            completed_at=datetime.utcnow()
-        )
-        
-        # Cachear resultado
-        cache.set(f"podcast_result:{job_id}", result.__dict__, expire_seconds=86400)
-        
-        # Atualizar job
-        active_jobs[job_id]["status"] = "completed"
-        active_jobs[job_id]["result"] = result.__dict__
-        
-        logger.info(f"✅ Pipeline concluído: {job_id}")
-        
-        # Salvar na memória para futuras referências
-        await memory_client.post(
-            "/api/memory/store",
-            data={
-                "user_id": request.user_id,
-                "content": f"Podcast gerado: {request.agent_name} - {request.agent_type.value}",
-                "metadata": {
-                    "job_id": job_id,
-                    "news_count": len(news_list),
-                    "duration": duration,
-                    "agent": request.agent_name
-                }
-            }
-        )
-    
-    except Exception as e:
-        logger.error(f"❌ Erro no pipeline: {e}", exc_info=True)
-        active_jobs[job_id]["status"] = "failed"
-        active_jobs[job_id]["error"] = str(e)
+@app.post("/api/podcast/clear-cache/{user_id}")
+async def clear_user_cache(user_id: str):
+    """Remove do cache os resultados de podcast de um usuário"""
+    count = await cache.invalidate_tags(f"user:{user_id}")
+    logger.info(f"🗑️  Cache do usuário {user_id} limpo: {count} chaves removidas")
+    return {"user_id": user_id, "cleared": count}
 
 
 # ==================== DEBUG ENDPOINTS ====================
 @app.get("/api/debug/jobs")
 async def debug_jobs():
-    """Lista todos os jobs (apenas para debug)"""
+    """Lista os jobs mantidos em memória local (apenas para debug)"""
+    job_ids = job_store.recent_job_ids()
     return {
-        "total_jobs": len(active_jobs),
-        "jobs": list(active_jobs.keys()),
-        "details": active_jobs
+        "total_jobs": len(job_ids),
+        "jobs": job_ids,
+        "store": job_store.stats()
+    }
+
+
+@app.get("/api/debug/trace/{job_id}")
+async def debug_trace(job_id: str):
+    """
+    Waterfall da última execução do job: spans de todos os serviços em ordem
+    de árvore, com deslocamento e duração (spans exportados a cada ~1s)
+    """
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    trace_id = job.get("trace_id")
+    if not trace_id:
+        raise HTTPException(status_code=404, detail="Job sem trace (tracing desabilitado ou não amostrado)")
+    
+    spans = await tracer.load(trace_id)
+    waterfall = build_waterfall(spans)
+    return {
+        "job_id": job_id,
+        "trace_id": trace_id,
+        "duration_ms": max((row["offset_ms"] + row["duration_ms"] for row in waterfall), default=0),
+        "spans": waterfall
     }
 
 
 @app.post("/api/debug/test-pipeline")
-async def test_pipeline(background_tasks: BackgroundTasks):
+async def test_pipeline():
     """Inicia um pipeline de teste"""
     request = PodcastRequest(
         agent_name="jarvis_teste",
@@ -276,7 +699,10 @@ async def test_pipeline(background_tasks: BackgroundTasks):
         news_count=3
     )
     
-    background_tasks.add_task(process_podcast_pipeline, request.id, request)
+    try:
+        await enqueue_podcast_job(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     
     return {"job_id": request.id, "status": "started"}
 
@@ -0,0 +1,163 @@
+"""
+Pipeline - Execução de estágios como um pequeno DAG
+Estágios independentes rodam concorrentemente, cada um com seu timeout
+(limitado pelo prazo da execução, quando houver)
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from shared.utils import get_logger, log_context, span, deadline_timeout, DeadlineExceededError
+
+logger = get_logger(__name__)
+
+
+class StageError(Exception):
+    """Falha de um estágio obrigatório do pipeline"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"Estágio '{stage}' falhou: {message}")
+        self.stage = stage
+
+
+@dataclass
+class Stage:
+    """
+    Estágio do pipeline
+    - func recebe o dicionário com os resultados dos estágios já concluídos
+    - estágios não obrigatórios usam `default` em caso de falha ou timeout
+    - `provides` permite que um estágio produza várias saídas (func retorna
+      um dicionário com essas chaves); por padrão a saída é `name`
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Awaitable[Any]]
+    depends_on: List[str] = field(default_factory=list)
+    timeout_seconds: Optional[float] = None
+    required: bool = True
+    default: Any = None
+    provides: Optional[List[str]] = None
+    
+    @property
+    def outputs(self) -> List[str]:
+        return self.provides or [self.name]
+
+
+# Callback de transições de estágio: (estágio, status, detalhes)
+StageListener = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+# Callback de checkpoint: recebe as saídas de um estágio concluído com sucesso
+StageCheckpoint = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+async def _notify(listener: Optional[StageListener], stage: str, status: str, **details):
+    if listener is None:
+        return
+    try:
+        await listener(stage, status, details)
+    except Exception as e:
+        logger.error(f"Erro no listener do estágio {stage}: {e}")
+
+
+def _outputs(stage: Stage, value: Any) -> Dict[str, Any]:
+    if stage.provides:
+        value = value or {}
+        return {output: value.get(output) for output in stage.provides}
+    return {stage.name: value}
+
+
+async def _run_stage(
+    stage: Stage,
+    results: Dict[str, Any],
+    listener: Optional[StageListener] = None,
+    checkpoint: Optional[StageCheckpoint] = None
+) -> Dict[str, Any]:
+    start = time.monotonic()
+    await _notify(listener, stage.name, "started")
+    timeout = stage.timeout_seconds
+    try:
+        timeout = deadline_timeout(stage.timeout_seconds)
+        # O estágio roda numa task própria, que herda o contexto de log e o span
+        with log_context(stage=stage.name), span(f"stage.{stage.name}"):
+            value = await asyncio.wait_for(stage.func(results), timeout=timeout)
+    except DeadlineExceededError as e:
+        return await _stage_failed(stage, str(e), start, listener)
+    except asyncio.TimeoutError:
+        if timeout != stage.timeout_seconds:
+            message = f"prazo da execução esgotado após {timeout:.1f}s"
+        else:
+            message = f"timeout após {stage.timeout_seconds}s"
+        return await _stage_failed(stage, message, start, listener)
+    except StageError:
+        raise
+    except Exception as e:
+        return await _stage_failed(stage, str(e), start, listener, cause=e)
+    duration = time.monotonic() - start
+    logger.info(f"⏱️  Estágio {stage.name} concluído em {duration:.2f}s")
+    outputs = _outputs(stage, value)
+    if checkpoint is not None:
+        try:
+            await checkpoint(outputs)
+        except Exception as e:
+            logger.error(f"Erro ao salvar checkpoint do estágio {stage.name}: {e}")
+    await _notify(listener, stage.name, "completed", duration_seconds=round(duration, 3))
+    return outputs
+
+
+async def _stage_failed(
+    stage: Stage,
+    message: str,
+    start: float,
+    listener: Optional[StageListener],
+    cause: Optional[Exception] = None
+) -> Any:
+    duration = round(time.monotonic() - start, 3)
+    if stage.required:
+        await _notify(listener, stage.name, "failed", duration_seconds=duration, error=message)
+        raise StageError(stage.name, message) from cause
+    logger.warning(f"⚠️  Estágio {stage.name} ignorado ({message})")
+    await _notify(listener, stage.name, "skipped", duration_seconds=duration, error=message)
+    return _outputs(stage, stage.default)
+
+
+async def run_stages(
+    stages: List[Stage],
+    results: Optional[Dict[str, Any]] = None,
+    listener: Optional[StageListener] = None,
+    checkpoint: Optional[StageCheckpoint] = None
+) -> Dict[str, Any]:
+    """
+    Executa os estágios respeitando as dependências
+    Estágios cujo resultado já está em `results` não são executados novamente
+    `listener` é notificado a cada transição (started/completed/skipped/failed)
+    `checkpoint` recebe as saídas de cada estágio concluído com sucesso
+    """
+    results = dict(results or {})
+    names = {output for stage in stages for output in stage.outputs}
+    for stage in stages:
+        missing = [dep for dep in stage.depends_on if dep not in names and dep not in results]
+        if missing:
+            raise ValueError(f"Estágio '{stage.name}' depende de estágios inexistentes: {missing}")
+
+    pending = [s for s in stages if not all(output in results for output in s.outputs)]
+    running: Dict[asyncio.Task, Stage] = {}
+
+    try:
+        while pending or running:
+            ready = [s for s in pending if all(dep in results for dep in s.depends_on)]
+            for stage in ready:
+                pending.remove(stage)
+                running[asyncio.create_task(_run_stage(stage, results, listener, checkpoint))] = stage
+
+            if not running:
+                raise ValueError(f"Dependência cíclica entre estágios: {[s.name for s in pending]}")
+
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.pop(task)
+                results.update(task.result())
+    finally:
+        for task in running:
+            task.cancel()
+
+    return results
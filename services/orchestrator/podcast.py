@@ -0,0 +1,487 @@
+"""
+Podcast - Pipeline de geração de podcast e o estado compartilhado dos jobs
+Importado pela API (main.py) e pelos workers (worker.py): apenas define
+clientes, job store e eventos (conexões abertas no primeiro uso), sem
+scheduler, broker ou app FastAPI
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from shared.models import PodcastRequest, PodcastResult, JobStatus, AgentType
+from shared.config import (
+    SERVICE_URLS, SERVICE_REPLICA_URLS, PIPELINE_STAGE_TIMEOUTS, PIPELINE_STREAMING,
+    TTS_SEGMENT_MIN_CHARS, TTS_STREAM_CONCURRENCY, PIPELINE_DEADLINE_SECONDS
+)
+from shared.utils import (
+    get_logger, histogram, ServiceClient, cache, to_serializable, JOB_ID_HEADER, deadline_scope,
+    log_context, span, current_trace_id
+)
+from job_store import JobStore
+from events import JobEventBus
+from pipeline import Stage, run_stages
+
+# ==================== SETUP ====================
+logger = get_logger(__name__)
+
+# Armazenamento de jobs (Redis com TTL + front LRU limitado)
+job_store = JobStore()
+
+# Eventos de progresso dos jobs (Redis pub/sub, entre réplicas)
+event_bus = JobEventBus()
+
+# Clientes para outros serviços (conexões persistentes, fechadas no lifespan)
+llm_client = ServiceClient(SERVICE_URLS["llm_service"])
+news_client = ServiceClient(SERVICE_URLS["news_service"], replica_urls=SERVICE_REPLICA_URLS["news_service"])
+script_client = ServiceClient(SERVICE_URLS["script_service"])
+tts_client = ServiceClient(SERVICE_URLS["tts_service"])
+memory_client = ServiceClient(SERVICE_URLS["memory_service"], replica_urls=SERVICE_REPLICA_URLS["memory_service"])
+
+
+async def close_service_clients():
+    """Fecha os pools de conexões dos clientes de serviço"""
+    for client in (llm_client, news_client, script_client, tts_client, memory_client):
+        await client.close()
+
+
+# Métricas do pipeline: onde o tempo de cada podcast é gasto
+STAGE_DURATION = histogram(
+    "jarvis_pipeline_stage_duration_seconds",
+    "Duração de cada estágio do pipeline por status",
+    ("stage", "status")
+)
+PIPELINE_DURATION = histogram(
+    "jarvis_pipeline_duration_seconds",
+    "Duração total do pipeline de podcast por status",
+    ("status",)
+)
+
+
+# ==================== JOBS ====================
+def podcast_request_from_dict(data: dict) -> PodcastRequest:
+    """Reconstrói um PodcastRequest salvo no job store"""
+    data = dict(data)
+    data["agent_type"] = AgentType(data.get("agent_type", AgentType.PODCAST_DAILY.value))
+    if isinstance(data.get("created_at"), str):
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return PodcastRequest(**data)
+
+
+async def run_podcast_job(job_id: str, request_data: dict, seed: dict):
+    """Executa o pipeline de um job recebido do broker (usado pelos workers)"""
+    with log_context(job_id=job_id), span("podcast.pipeline", job_id=job_id):
+        return await process_podcast_pipeline(job_id, podcast_request_from_dict(request_data), seed)
+
+
+async def cache_podcast_result(job_id: str, result: dict, user_id: str):
+    """Cacheia o resultado (24h) com a tag do usuário, para invalidação por usuário"""
+    await cache.set(
+        f"podcast_result:{job_id}", result, expire_seconds=86400, tags=(f"user:{user_id}",)
+    )
+
+
+# ==================== PIPELINE ====================
+# Tarefas em background fora do caminho crítico (mantém referência até concluírem)
+background_jobs = set()
+
+
+def run_in_background(coro):
+    """Agenda uma corrotina sem bloquear o pipeline"""
+    task = asyncio.create_task(coro)
+    background_jobs.add(task)
+    task.add_done_callback(background_jobs.discard)
+    return task
+
+
+async def fetch_news(language: str, limit: int) -> list:
+    """Busca notícias no news-service"""
+    logger.info(f"📰 Buscando notícias...")
+    news_response = await news_client.post(
+        "/api/news/fetch",
+        data={
+            "language": language,
+            "limit": limit
+        },
+        hedge=True
+    )
+    
+    if not news_response:
+        raise Exception("Falha ao buscar notícias")
+    
+    news_list = news_response.get("news", [])
+    logger.info(f"✅ {len(news_list)} notícias encontradas")
+    return news_list
+
+
+async def fetch_news_stage(request: PodcastRequest) -> list:
+    """Estágio: buscar notícias"""
+    return await fetch_news(request.language, request.news_count)
+
+
+async def recall_memory_stage(request: PodcastRequest) -> str:
+    """Estágio: recuperar memória relevante"""
+    logger.info(f"🧠 Buscando memórias relevantes...")
+    memory_response = await memory_client.post(
+        "/api/memory/recall",
+        data={
+            "query": f"podcast {request.agent_type.value}",
+            "limit": 3,
+            "user_id": request.user_id
+        },
+        hedge=True
+    )
+    
+    if memory_response and memory_response.get("memories"):
+        memories = memory_response.get("memories", [])
+        logger.info(f"✅ {len(memories)} memórias recuperadas")
+        return " ".join([m.get("content", "") for m in memories])
+    
+    logger.info("ℹ️  Nenhuma memória anterior encontrada")
+    return ""
+
+
+async def generate_script_stage(
+    request: PodcastRequest,
+    news_list: list,
+    memory_context: str,
+    headers: Optional[dict] = None
+) -> str:
+    """Estágio: gerar roteiro"""
+    logger.info(f"📝 Gerando roteiro...")
+    script_response = await script_client.post(
+        "/api/script/generate",
+        data={
+            "agent_name": request.agent_name,
+            "agent_type": request.agent_type.value,
+            "news": news_list,
+            "memory_context": memory_context,
+            "language": request.language
+        },
+        headers=headers
+    )
+    
+    if not script_response:
+        raise Exception("Falha ao gerar roteiro")
+    
+    script = script_response.get("script", "")
+    logger.info(f"✅ Roteiro gerado ({len(script)} caracteres)")
+    return script
+
+
+async def generate_audio_stage(request: PodcastRequest, script: str, headers: Optional[dict] = None) -> dict:
+    """Estágio: gerar áudio (TTS)"""
+    logger.info(f"🎙️  Gerando áudio...")
+    tts_response = await tts_client.post(
+        "/api/tts/generate",
+        data={
+            "text": script,
+            "voice": request.voice,
+            "agent_name": request.agent_name,
+            "language": request.language
+        },
+        headers=headers
+    )
+    
+    if not tts_response:
+        raise Exception("Falha ao gerar áudio")
+    
+    audio = {
+        "audio_path": tts_response.get("audio_path", ""),
+        "duration": tts_response.get("duration", 0.0)
+    }
+    logger.info(f"✅ Áudio gerado ({audio['duration']:.1f}s)")
+    return audio
+
+
+async def generate_streaming_stage(
+    request: PodcastRequest,
+    news_list: list,
+    memory_context: str,
+    on_script: Optional[Callable[[str], Awaitable]] = None,
+    headers: Optional[dict] = None
+) -> dict:
+    """
+    Estágio combinado (modo streaming): roteiro e áudio em paralelo
+    O roteiro chega frase a frase do script-service; a cada ~TTS_SEGMENT_MIN_CHARS
+    um segmento é enviado ao TTS enquanto o LLM continua escrevendo.
+    Ao final os segmentos são unidos em um único MP3.
+    """
+    logger.info(f"📝🎙️  Gerando roteiro e áudio em streaming...")
+    start = time.monotonic()
+    semaphore = asyncio.Semaphore(TTS_STREAM_CONCURRENCY)
+    sentences: List[str] = []
+    pending_text: List[str] = []
+    segment_tasks: List[asyncio.Task] = []
+    
+    async def synthesize(index: int, text: str) -> dict:
+        async with semaphore:
+            response = await tts_client.post(
+                "/api/tts/generate",
+                data={
+                    "text": text,
+                    "voice": request.voice,
+                    "agent_name": f"{request.agent_name}_seg{index:03d}",
+                    "language": request.language
+                },
+                headers=headers
+            )
+        if not response:
+            raise Exception(f"Falha ao gerar áudio do segmento {index}")
+        if index == 0:
+            logger.info(f"⚡ Primeiro segmento de áudio em {time.monotonic() - start:.1f}s")
+        return response
+    
+    def flush_segment():
+        text = " ".join(part.strip() for part in pending_text).strip()
+        pending_text.clear()
+        if text:
+            segment_tasks.append(asyncio.create_task(synthesize(len(segment_tasks), text)))
+    
+    try:
+        async for line in script_client.stream(
+            "/api/script/stream",
+            data={
+                "agent_name": request.agent_name,
+                "agent_type": request.agent_type.value,
+                "news": news_list,
+                "memory_context": memory_context,
+                "language": request.language
+            },
+            headers=headers,
+            lines=True
+        ):
+            event = json.loads(line)
+            if event.get("error"):
+                raise Exception(f"Falha ao gerar roteiro: {event['error']}")
+            if "sentence" in event:
+                sentences.append(event["sentence"])
+                pending_text.append(event["sentence"])
+                if sum(len(part) for part in pending_text) >= TTS_SEGMENT_MIN_CHARS:
+                    flush_segment()
+        flush_segment()
+        
+        script = "".join(sentences).strip()
+        if not script:
+            raise Exception("Falha ao gerar roteiro")
+        logger.info(f"✅ Roteiro gerado ({len(script)} caracteres, {len(segment_tasks)} segmentos)")
+        if on_script is not None:
+            # Preserva o roteiro mesmo que a síntese falhe depois
+            await on_script(script)
+        
+        segments = await asyncio.gather(*segment_tasks)
+    finally:
+        for task in segment_tasks:
+            task.cancel()
+    
+    tts_response = await tts_client.post(
+        "/api/tts/concat",
+        data={
+            "segments": [segment["audio_path"] for segment in segments],
+            "agent_name": request.agent_name,
+            "voice": request.voice,
+            "language": request.language
+        },
+        headers=headers
+    )
+    if not tts_response:
+        raise Exception("Falha ao unir segmentos de áudio")
+    
+    audio = {
+        "audio_path": tts_response.get("audio_path", ""),
+        "duration": tts_response.get("duration", 0.0)
+    }
+    logger.info(f"✅ Áudio gerado ({audio['duration']:.1f}s)")
+    return {"script": script, "tts": audio}
+
+
+async def store_podcast_memory(job_id: str, request: PodcastRequest, news_count: int, duration: float):
+    """Salva o podcast na memória para futuras referências (fora do caminho crítico)"""
+    response = await memory_client.post(
+        "/api/memory/store",
+        data={
+            "user_id": request.user_id,
+            "content": f"Podcast gerado: {request.agent_name} - {request.agent_type.value}",
+            "metadata": {
+                "job_id": job_id,
+                "news_count": news_count,
+                "duration": duration,
+                "agent": request.agent_name
+            }
+        }
+    )
+    if not response:
+        logger.warning(f"⚠️  Falha ao salvar memória do podcast: {job_id}")
+
+
+# Ordem lógica das saídas do pipeline (para retomada a partir de checkpoints)
+PIPELINE_STAGE_ORDER = ["news", "memory", "script", "tts"]
+
+
+def build_podcast_stages(
+    job_id: str,
+    request: PodcastRequest,
+    completed=(),
+    headers: Optional[dict] = None
+) -> List[Stage]:
+    """
+    DAG do pipeline de podcast
+    news e memory são independentes e rodam em paralelo;
+    script depende de ambos e tts depende do script
+    (no modo streaming script e tts são um único estágio sobreposto,
+    exceto quando o roteiro já está em `completed`)
+    `headers` acompanham as chamadas de geração (identificação da execução)
+    """
+    stages = [
+        Stage(
+            "news",
+            lambda r: fetch_news_stage(request),
+            timeout_seconds=PIPELINE_STAGE_TIMEOUTS["news"]
+        ),
+        Stage(
+            "memory",
+            lambda r: recall_memory_stage(request),
+            timeout_seconds=PIPELINE_STAGE_TIMEOUTS["memory"],
+            required=False,
+            default=""
+        ),
+    ]
+    
+    if request.metadata.get("streaming", PIPELINE_STREAMING) and "script" not in completed:
+        return stages + [
+            Stage(
+                "script_tts",
+                lambda r: generate_streaming_stage(
+                    request, r["news"], r["memory"],
+                    on_script=lambda script: job_store.save_checkpoint(job_id, "script", script),
+                    headers=headers
+                ),
+                depends_on=["news", "memory"],
+                timeout_seconds=PIPELINE_STAGE_TIMEOUTS["script"] + PIPELINE_STAGE_TIMEOUTS["tts"],
+                provides=["script", "tts"]
+            ),
+        ]
+    
+    return stages + [
+        Stage(
+            "script",
+            lambda r: generate_script_stage(request, r["news"], r["memory"], headers=headers),
+            depends_on=["news", "memory"],
+            timeout_seconds=PIPELINE_STAGE_TIMEOUTS["script"]
+        ),
+        Stage(
+            "tts",
+            lambda r: generate_audio_stage(request, r["script"], headers=headers),
+            depends_on=["script"],
+            timeout_seconds=PIPELINE_STAGE_TIMEOUTS["tts"]
+        ),
+    ]
+
+
+async def set_job_status(job_id: str, status: str, **fields):
+    """Atualiza o status do job e publica o evento correspondente"""
+    await job_store.update(job_id, status=status, **fields)
+    await event_bus.publish(job_id, "status", status=status, error=fields.get("error"))
+
+
+def build_stage_listener(job_id: str):
+    """Registra tempos de cada estágio no job e publica as transições"""
+    stages = {}
+    
+    async def on_stage(stage: str, status: str, details: dict):
+        if "duration_seconds" in details:
+            STAGE_DURATION.labels(stage, status).observe(details["duration_seconds"])
+        stages[stage] = {"status": status, **details}
+        await job_store.update(job_id, stages=stages, current_stage=stage)
+        await event_bus.publish(job_id, "stage", stage=stage, status=status, **details)
+    
+    return on_stage
+
+
+async def process_podcast_pipeline(job_id: str, request: PodcastRequest, seed: Optional[dict] = None):
+    """
+    Pipeline principal: orquestra todos os microserviços
+    Fluxo:
+    1. Buscar notícias e recuperar memória relevante (em paralelo)
+    2. Gerar roteiro
+    3. Gerar áudio (TTS)
+    4. Salvar resultado
+    5. Registrar na memória (em background)
+    Estágios presentes em `seed` não são executados novamente
+    A execução tem um orçamento de tempo (metadata["deadline_seconds"] ou
+    PIPELINE_DEADLINE_SECONDS), propagado a todos os serviços chamados
+    """
+    logger.info(f"▶️  Iniciando pipeline para: {job_id}")
+    start = time.monotonic()
+    # Identifica esta execução nos serviços de geração (cancelamento)
+    run_id = f"{job_id}.{uuid.uuid4().hex[:8]}"
+    deadline_seconds = float(request.metadata.get("deadline_seconds", PIPELINE_DEADLINE_SECONDS))
+    
+    try:
+        # Atualizar status
+        await set_job_status(
+            job_id, "running", run_id=run_id, deadline_seconds=deadline_seconds, trace_id=current_trace_id()
+        )
+        
+        async def checkpoint(outputs: dict):
+            for name, value in outputs.items():
+                await job_store.save_checkpoint(job_id, name, value)
+        
+        seed = seed or {}
+        with deadline_scope(deadline_seconds):
+            results = await run_stages(
+                build_podcast_stages(job_id, request, completed=seed.keys(), headers={JOB_ID_HEADER: run_id}),
+                seed,
+                listener=build_stage_listener(job_id),
+                checkpoint=checkpoint
+            )
+        
+        news_list = results["news"]
+        memory_context = results["memory"]
+        script = results["script"]
+        audio_path = results["tts"]["audio_path"]
+        duration = results["tts"]["duration"]
+        
+        # Salvar resultado
+        result = PodcastResult(
+            id=request.id,
+            job_id=job_id,
+            agent_name=request.agent_name,
+            agent_type=request.agent_type,
+            status=JobStatus.COMPLETED,
+            script=script,
+            audio_path=audio_path,
+            audio_duration=duration,
+            news_used=news_list,
+            memory_recalled=memory_context,
+            completed_at=datetime.utcnow(),
+            execution_time_seconds=round(time.monotonic() - start, 3)
+        )
+        
+        result_dict = to_serializable(result)
+        
+        # Cachear resultado
+        await cache_podcast_result(job_id, result_dict, request.user_id)
+        
+        # Atualizar job
+        await set_job_status(job_id, "completed", result=result_dict)
+        
+        PIPELINE_DURATION.labels("completed").observe(result.execution_time_seconds)
+        logger.info(f"✅ Pipeline concluído: {job_id} ({result.execution_time_seconds:.1f}s)")
+        
+        # Salvar na memória para futuras referências, sem atrasar o job
+        run_in_background(store_podcast_memory(job_id, request, len(news_list), duration))
+        return result_dict
+    
+    except asyncio.CancelledError:
+        PIPELINE_DURATION.labels("cancelled").observe(time.monotonic() - start)
+        logger.info(f"🛑 Pipeline interrompido: {job_id}")
+        raise
+    
+    except Exception as e:
+        PIPELINE_DURATION.labels("failed").observe(time.monotonic() - start)
+        logger.error(f"❌ Erro no pipeline: {e}", exc_info=True)
+        await set_job_status(job_id, "failed", error=str(e))
+        return None
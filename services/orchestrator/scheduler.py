@@ -0,0 +1,174 @@
+"""
+Scheduler - Fila de prioridade com pool limitado de workers
+Controla quantos pipelines rodam ao mesmo tempo e rejeita excesso de carga
+"""
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from shared.config import SCHEDULER_WORKERS, SCHEDULER_MAX_QUEUE_SIZE
+from shared.models import JobMessage
+from shared.utils import get_logger, counter, gauge
+
+logger = get_logger(__name__)
+
+SCHEDULER_RUNNING = gauge("jarvis_scheduler_running_jobs", "Pipelines em execução")
+SCHEDULER_QUEUED = gauge("jarvis_scheduler_queued_jobs", "Jobs aguardando na fila")
+SCHEDULER_JOBS = counter(
+    "jarvis_scheduler_jobs_total",
+    "Jobs encerrados pelo scheduler por desfecho",
+    ("outcome",)
+)
+
+
+class QueueFullError(Exception):
+    """Fila do scheduler cheia (admission control)"""
+
+
+class JobScheduler:
+    """
+    Scheduler de jobs do orchestrator
+    - prioridade de JobMessage.priority (10 é maior), FIFO entre iguais
+    - no máximo `workers` pipelines simultâneos
+    - no máximo `max_queue_size` jobs aguardando
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, max_queue_size: int = SCHEDULER_MAX_QUEUE_SIZE):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._pending: Dict[str, Tuple[Tuple[int, int], Callable[[], Awaitable]]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        """Inicia o pool de workers"""
+        for i in range(self.workers):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"🗓️  Scheduler iniciado ({self.workers} workers, fila máx. {self.max_queue_size})")
+
+    async def stop(self):
+        """Encerra workers e pipelines em execução"""
+        for task in [*self._workers, *self._running.values()]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._running.values(), return_exceptions=True)
+        self._workers.clear()
+
+    # ---------- API ----------
+    def submit(self, message: JobMessage, runner: Callable[[], Awaitable]) -> int:
+        """
+        Enfileira um job
+        Retorna a posição na fila ou levanta QueueFullError
+        """
+        if len(self._pending) >= self.max_queue_size:
+            self.rejected += 1
+            SCHEDULER_JOBS.labels("rejected").inc()
+            raise QueueFullError(f"Fila cheia ({self.max_queue_size} jobs aguardando)")
+
+        priority = min(max(message.priority, 1), 10)
+        key = (-priority, next(self._sequence))
+        self._pending[message.job_id] = (key, runner)
+        self._queue.put_nowait((key, message.job_id))
+        self._update_gauges()
+        return self.position(message.job_id)
+    
+    def cancel(self, job_id: str) -> bool:
+        """
+        Remove o job da fila ou cancela sua execução, liberando a vaga
+        Retorna False se o job não está no scheduler
+        """
+        if self._pending.pop(job_id, None) is not None:
+            # A entrada na PriorityQueue é descartada pelo worker
+            self.cancelled += 1
+            SCHEDULER_JOBS.labels("cancelled").inc()
+            self._update_gauges()
+            return True
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+    
+    async def wait_finished(self, job_id: str, timeout: float) -> bool:
+        """Aguarda o término da execução do job; False se ainda estiver rodando"""
+        task = self._running.get(job_id)
+        if task is None:
+            return True
+        done, _ = await asyncio.wait([task], timeout=timeout)
+        return bool(done)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posição (1 = próximo) de um job aguardando na fila"""
+        entry = self._pending.get(job_id)
+        if entry is None:
+            return None
+        key = entry[0]
+        return 1 + sum(1 for other, _ in self._pending.values() if other < key)
+
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._running
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def free_slots(self) -> int:
+        """Quantos jobs ainda cabem na fila"""
+        return max(self.max_queue_size - len(self._pending), 0)
+
+    def stats(self) -> Dict:
+        """Estatísticas do scheduler"""
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "queued": len(self._pending),
+            "max_queue_size": self.max_queue_size,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+    
+    def _update_gauges(self):
+        SCHEDULER_RUNNING.set(len(self._running))
+        SCHEDULER_QUEUED.set(len(self._pending))
+
+    # ---------- workers ----------
+    async def _worker(self, index: int):
+        while True:
+            key, job_id = await self._queue.get()
+            entry = self._pending.get(job_id)
+            if entry is None or entry[0] != key:
+                # Job removido (ou reenfileirado) antes de ser executado
+                continue
+
+            del self._pending[job_id]
+            _, runner = entry
+            task = asyncio.create_task(runner())
+            self._running[job_id] = task
+            self._update_gauges()
+            try:
+                await task
+                self.completed += 1
+                SCHEDULER_JOBS.labels("completed").inc()
+            except asyncio.CancelledError:
+                # Cancelamento do próprio worker propaga; do job apenas libera o slot
+                if asyncio.current_task().cancelling():
+                    raise
+                self.cancelled += 1
+                SCHEDULER_JOBS.labels("cancelled").inc()
+                logger.info(f"🛑 Worker {index}: job {job_id} cancelado")
+            except Exception as e:
+                self.failed += 1
+                SCHEDULER_JOBS.labels("failed").inc()
+                logger.error(f"❌ Worker {index}: job {job_id} falhou: {e}")
+            finally:
+                self._running.pop(job_id, None)
+                self._update_gauges()
@@ -0,0 +1,229 @@
+"""
+Worker - Executa pipelines de podcast consumidos do broker de jobs
+No modo ORCHESTRATOR_MODE=queue a API apenas enfileira JobMessages; várias
+instâncias deste worker (em qualquer nó) processam a fila em paralelo
+Uso: python worker.py
+"""
+import asyncio
+import signal
+import sys
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Adicionar shared ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from shared.config import JOB_BROKER_BACKEND, WORKER_ID, WORKER_PREFETCH, WORKER_MAX_DELIVERIES
+from shared.utils import get_logger, cache, tracer
+from broker import Delivery, JobBroker, create_broker, new_worker_id
+from events import JobEventBus
+from job_store import JobStore, TERMINAL_STATUSES
+
+logger = get_logger(__name__)
+
+# Executa o pipeline de um job: (job_id, requisição serializada, seed) -> resultado
+# (None quando o pipeline falhou e registrou a falha no job)
+PipelineRunner = Callable[[str, Dict[str, Any], Dict[str, Any]], Awaitable[Any]]
+
+
+class PipelineWorker:
+    """
+    Consumidor do broker de jobs
+    - no máximo `prefetch` pipelines simultâneos (mensagens reservadas)
+    - ack quando o pipeline termina (com sucesso ou falha registrada no job)
+    - jobs cancelados são interrompidos via eventos do job
+    - ao encerrar, pipelines em andamento voltam à fila (nack) e são
+      retomados por outro worker a partir dos checkpoints
+    """
+
+    def __init__(
+        self,
+        broker: JobBroker,
+        runner: PipelineRunner,
+        job_store: JobStore,
+        event_bus: JobEventBus,
+        prefetch: int = WORKER_PREFETCH,
+        worker_id: Optional[str] = None,
+        max_deliveries: int = WORKER_MAX_DELIVERIES
+    ):
+        self.broker = broker
+        self.runner = runner
+        self.job_store = job_store
+        self.event_bus = event_bus
+        self.prefetch = prefetch
+        self.worker_id = worker_id or new_worker_id()
+        self.max_deliveries = max_deliveries
+        self._slots = asyncio.Semaphore(prefetch)
+        self._handlers: Set[asyncio.Task] = set()
+        self._consumer: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.requeued = 0
+        self.dead_lettered = 0
+
+    # ---------- ciclo de vida ----------
+    async def start(self):
+        self._consumer = asyncio.create_task(self._consume())
+        logger.info(f"👷 Worker {self.worker_id} iniciado (prefetch {self.prefetch}, broker {self.broker.name})")
+
+    async def stop(self):
+        """Para de consumir e devolve à fila os jobs em andamento"""
+        self._stopping = True
+        if self._consumer is not None:
+            self._consumer.cancel()
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(
+            *([self._consumer] if self._consumer else []), *self._handlers, return_exceptions=True
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "prefetch": self.prefetch,
+            "running": len(self._handlers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "requeued": self.requeued,
+            "dead_lettered": self.dead_lettered,
+            "broker": self.broker.stats(),
+        }
+
+    # ---------- consumo ----------
+    async def _consume(self):
+        while True:
+            # Só reserva a próxima mensagem quando há vaga (prefetch)
+            await self._slots.acquire()
+            try:
+                delivery = await self.broker.get()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._handle(delivery))
+            self._handlers.add(task)
+            task.add_done_callback(self._handler_done)
+
+    def _handler_done(self, task: asyncio.Task):
+        self._handlers.discard(task)
+        self._slots.release()
+
+    async def _handle(self, delivery: Delivery):
+        body = delivery.body
+        job_id = body["job_id"]
+        try:
+            job = await self.job_store.get(job_id)
+            if job is None or job.get("status") in TERMINAL_STATUSES:
+                # Cancelado (ou removido) enquanto aguardava na fila
+                logger.info(f"⏭️  Job {job_id} descartado ({(job or {}).get('status', 'inexistente')})")
+                await self.broker.ack(delivery)
+                return
+
+            deliveries = job.get("deliveries", 0) + 1
+            if deliveries > self.max_deliveries:
+                await self._dead_letter(job_id, deliveries - 1)
+                await self.broker.ack(delivery)
+                return
+            await self.job_store.update(job_id, deliveries=deliveries, worker_id=self.worker_id)
+
+            # Retomar a partir do que já foi concluído (ex.: redelivery)
+            metadata = body.get("metadata", {})
+            seed = {**(metadata.get("seed") or {}), **await self.job_store.get_checkpoints(job_id)}
+            if delivery.redelivered:
+                logger.info(f"♻️  Job {job_id} reentregue; retomando com {sorted(seed)}")
+
+            pipeline = asyncio.create_task(self.runner(job_id, metadata["request"], seed))
+            watcher = asyncio.create_task(self._watch_cancellation(job_id, pipeline))
+            try:
+                # O pipeline registra a falha no job e retorna None
+                if await pipeline is None:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+            finally:
+                watcher.cancel()
+            await self.broker.ack(delivery)
+
+        except asyncio.CancelledError:
+            if self._stopping:
+                # Worker encerrando: outro worker retoma o job
+                self.requeued += 1
+                await self._safe_nack(delivery)
+                raise
+            self.cancelled += 1
+            logger.info(f"🛑 Job {job_id} cancelado no worker {self.worker_id}")
+            await self.broker.ack(delivery)
+        except Exception as e:
+            logger.error(f"❌ Erro ao processar job {job_id}: {e}", exc_info=True)
+            await self._safe_nack(delivery)
+
+    async def _safe_nack(self, delivery: Delivery):
+        try:
+            await asyncio.shield(self.broker.nack(delivery, requeue=True))
+        except Exception as e:
+            logger.error(f"Erro ao devolver job à fila: {e}")
+
+    async def _watch_cancellation(self, job_id: str, pipeline: asyncio.Task):
+        """Interrompe o pipeline quando o job é cancelado pela API"""
+        async with self.event_bus.subscribe(job_id) as queue:
+            # O cancelamento pode ter ocorrido antes da assinatura
+            job = await self.job_store.get(job_id) or {}
+            while job.get("status") != "cancelled":
+                event = await queue.get()
+                if event.get("event") == "status":
+                    job = event
+        pipeline.cancel()
+
+    async def _dead_letter(self, job_id: str, deliveries: int):
+        self.dead_lettered += 1
+        error = f"Job abandonado após {deliveries} entregas sem conclusão"
+        logger.error(f"☠️  {job_id}: {error}")
+        await self.job_store.update(job_id, status="failed", error=error)
+        await self.event_bus.publish(job_id, "status", status="failed", error=error)
+
+
+async def run_worker():
+    """
+    Processo worker dedicado: compartilha o pipeline (podcast.py) com a API
+    do orchestrator, sem importar a API (scheduler, broker e app FastAPI)
+    """
+    import podcast
+
+    if JOB_BROKER_BACKEND == "memory":
+        # Fila em memória só existe dentro do processo da API (worker embutido)
+        raise SystemExit("JOB_BROKER_BACKEND=memory não suporta worker separado; use redis ou rabbitmq")
+
+    worker_id = WORKER_ID or new_worker_id()
+    broker = create_broker(worker_id=worker_id)
+    await broker.connect()
+    await podcast.event_bus.start()
+
+    worker = PipelineWorker(
+        broker,
+        podcast.run_podcast_job,
+        podcast.job_store,
+        podcast.event_bus,
+        worker_id=worker_id
+    )
+    await worker.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info(f"👋 Encerrando worker {worker_id}...")
+    await worker.stop()
+    await broker.close()
+    await podcast.close_service_clients()
+    await cache.close()
+    await tracer.close()
+    await podcast.event_bus.close()
+    await podcast.job_store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -2,9 +2,13 @@
 Script Service - Microserviço para geração de roteiros de podcast
 Integra com LLM Service para gerar conteúdo
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import json
+import re
 import sys
 import os
 from datetime import datetime
@@ -14,19 +18,38 @@ from locale import setlocale, LC_ALL
 # Adicionar shared ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from shared.utils import get_logger, ServiceClient, cache
-from shared.config import SERVICE_URLS
+from shared.utils import (
+    get_logger, instrument_app, propagate_deadline, within_deadline, DeadlineExceededError,
+    ServiceClient, SingleFlight, cache, cache_key, JOB_ID_HEADER, circuit_breaker_stats, tracer,
+    JobCancellation, JobCancelledError
+)
+from shared.config import SERVICE_URLS, LLM_PROVIDER, GROQ_MODEL, OLLAMA_MODEL
 from shared.models import AgentType
 
 # ==================== SETUP ====================
+logger = get_logger(__name__)
+
+# Conexões persistentes com o LLM Service (fechadas no encerramento)
+llm_client = ServiceClient(SERVICE_URLS["llm_service"])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Libera os pools de conexões no encerramento"""
+    yield
+    await llm_client.close()
+    await cache.close()
+    await tracer.close()
+
+
 app = FastAPI(
     title="JARVIS Script Service",
     description="Serviço de geração de roteiros de podcast",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
-
-logger = get_logger(__name__)
-llm_client = ServiceClient(SERVICE_URLS["llm_service"])
+propagate_deadline(app)
+instrument_app(app, "script-service")
 
 
 # ==================== MODELS ====================
@@ -56,7 +79,8 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "script-service",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "circuits": circuit_breaker_stats()
     }
 
 
@@ -110,34 +134,77 @@ def format_news_for_prompt(news_list: List[dict]) -> str:
     return formatted
 
 
-# ==================== ENDPOINTS ====================
-@app.post("/api/script/generate")
-async def generate_script(request: ScriptRequest) -> ScriptResponse:
+# Fim de frase: pontuação final seguida de espaço, ou quebra de parágrafo
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+|\n{2,}')
+
+
+class SentenceBuffer:
+    """Acumula trechos de texto e libera frases completas"""
+    
+    def __init__(self):
+        self._buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        """Adiciona texto e retorna as frases completas encontradas"""
+        self._buffer += text
+        sentences = []
+        position = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            sentences.append(self._buffer[position:match.end()])
+            position = match.end()
+        self._buffer = self._buffer[position:]
+        return sentences
+    
+    def flush(self) -> List[str]:
+        """Retorna o texto restante como última frase"""
+        rest, self._buffer = self._buffer, ""
+        return [rest] if rest.strip() else []
+
+
+def script_cache_key(request: ScriptRequest) -> str:
     """
-    Gera roteiro de podcast baseado em notícias
+    Chave do roteiro: o payload enviado ao LLM (prompt com agente, data,
+    notícias, memória e duração; temperatura; max_tokens) e o modelo
     """
-    try:
-        logger.info(f"📝 Gerando roteiro para: {request.agent_name}")
-        
-        # Verificar cache
-        cache_key = f"script:{request.agent_name}:{hash(str(request.news))}"
-        cached = cache.get(cache_key)
-        if cached:
-            logger.info("📦 Roteiro retornado do cache")
-            return ScriptResponse(**cached)
-        
-        # Obter data e dia
-        day_name, date_str = get_current_date_info(request.language)
-        
-        # Formatar notícias
-        news_formatted = format_news_for_prompt(request.news)
-        
-        # Construir prompt
-        memory_section = ""
-        if request.memory_context:
-            memory_section = f"\n\nCONTEXTO DE MEMÓRIA ANTERIOR:\n{request.memory_context}\n"
-        
-        prompt = f"""
+    return cache_key(
+        "script",
+        llm_payload=build_llm_payload(request),
+        agent_type=request.agent_type,
+        language=request.language,
+        provider=LLM_PROVIDER,
+        model=GROQ_MODEL if LLM_PROVIDER == "groq" else OLLAMA_MODEL
+    )
+
+
+def build_script_result(script: str, request: ScriptRequest) -> dict:
+    """Calcula estatísticas do roteiro"""
+    word_count = len(script.split())
+    # Estimativa: ~130 palavras por minuto em português
+    estimated_duration = (word_count / 130) * 60  # em segundos
+    
+    return {
+        "script": script,
+        "word_count": word_count,
+        "estimated_duration_seconds": estimated_duration,
+        "agent_name": request.agent_name,
+        "language": request.language
+    }
+
+
+def build_script_prompt(request: ScriptRequest) -> str:
+    """Monta o prompt de geração de roteiro"""
+    # Obter data e dia
+    day_name, date_str = get_current_date_info(request.language)
+    
+    # Formatar notícias
+    news_formatted = format_news_for_prompt(request.news)
+    
+    # Construir prompt
+    memory_section = ""
+    if request.memory_context:
+        memory_section = f"\n\nCONTEXTO DE MEMÓRIA ANTERIOR:\n{request.memory_context}\n"
+    
+    return f"""
 Você é o J.A.R.V.I.S, um agente de IA especializado em criar podcasts diários sobre tecnologia.
 
 Informações atuais:
@@ -162,50 +229,166 @@ Formato: Apenas o texto do roteiro, sem marcações.
 Comece direto com o conteúdo do podcast.
 """
 
-        # Chamar LLM Service
-        llm_response = await llm_client.post(
-            "/api/llm/generate",
-            data={
-                "prompt": prompt,
-                "context": f"Agent: {request.agent_name}, Type: podcast",
-                "temperature": 0.8,
-                "max_tokens": 3000
-            }
-        )
-        
-        if not llm_response:
-            raise Exception("LLM Service indisponível")
-        
-        script = llm_response.get("text", "")
-        
-        if not script:
-            raise Exception("LLM não retornou um script válido")
-        
-        # Calcular estatísticas
-        word_count = len(script.split())
-        # Estimativa: ~130 palavras por minuto em português
-        estimated_duration = (word_count / 130) * 60  # em segundos
-        
-        logger.info(f"✅ Roteiro gerado ({word_count} palavras, ~{estimated_duration/60:.1f} minutos)")
+
+def build_llm_payload(request: ScriptRequest) -> dict:
+    """Payload enviado ao LLM Service"""
+    return {
+        "prompt": build_script_prompt(request),
+        "context": f"Agent: {request.agent_name}, Type: podcast",
+        "temperature": 0.8,
+        "max_tokens": 3000
+    }
+
+
+# Roteiros idênticos em andamento são compartilhados entre requisições
+script_flight = SingleFlight()
+
+# Requisições em andamento por execução de job (cancelamento pelo orchestrator)
+job_tasks = JobCancellation()
+
+
+def job_headers(job_id: Optional[str]) -> Optional[dict]:
+    """Cabeçalhos que identificam o job nas chamadas ao LLM Service"""
+    return {JOB_ID_HEADER: job_id} if job_id else None
+
+
+# ==================== ENDPOINTS ====================
+@app.post("/api/script/generate")
+async def generate_script(
+    request: ScriptRequest,
+    x_job_id: Optional[str] = Header(None)
+) -> ScriptResponse:
+    """
+    Gera roteiro de podcast baseado em notícias
+    Roteiros idênticos em andamento são gerados uma única vez: a chamada ao
+    LLM Service é compartilhada e por isso não leva o X-Job-ID de nenhum job.
+    O cancelamento (/api/script/cancel) interrompe apenas a espera do job; a
+    chamada compartilhada é abandonada quando ninguém mais aguarda por ela.
+    O X-Deadline-Ms (orçamento restante) é repassado ao LLM Service
+    """
+    try:
+        logger.info(f"📝 Gerando roteiro para: {request.agent_name}")
         
-        result = {
-            "script": script,
-            "word_count": word_count,
-            "estimated_duration_seconds": estimated_duration,
-            "agent_name": request.agent_name,
-            "language": request.language
-        }
+        # Verificar cache
+        key = script_cache_key(request)
+        cached = await cache.get(key)
+        if cached:
+            logger.info("📦 Roteiro retornado do cache")
+            return ScriptResponse(**cached)
         
-        # Cachear por 24 horas
-        cache.set(cache_key, result, expire_seconds=86400)
+        async def generate() -> dict:
+            # Chamar LLM Service (sem X-Job-ID: a chamada é de todos os jobs coalescidos)
+            llm_response = await llm_client.post(
+                "/api/llm/generate",
+                data=build_llm_payload(request)
+            )
+            
+            if not llm_response:
+                raise Exception("LLM Service indisponível")
+            
+            script = llm_response.get("text", "")
+            
+            if not script:
+                raise Exception("LLM não retornou um script válido")
+            
+            # Calcular estatísticas
+            result = build_script_result(script, request)
+            
+            logger.info(
+                f"✅ Roteiro gerado ({result['word_count']} palavras, "
+                f"~{result['estimated_duration_seconds']/60:.1f} minutos)"
+            )
+            
+            # Cachear por 24 horas
+            await cache.set(key, result, expire_seconds=86400)
+            return result
         
+        result = await within_deadline(job_tasks.run(x_job_id, script_flight.do(key, generate)))
         return ScriptResponse(**result)
     
+    except JobCancelledError as e:
+        logger.info(f"🛑 Roteiro interrompido: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except DeadlineExceededError as e:
+        logger.warning(f"⏰ Roteiro abandonado: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Erro ao gerar roteiro: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/script/cancel/{job_id}")
+async def cancel_script(job_id: str):
+    """Interrompe os roteiros em andamento do job: esperas e streams (chamado pelo orchestrator)"""
+    cancelled = job_tasks.cancel(job_id)
+    if cancelled:
+        logger.info(f"🛑 {cancelled} roteiro(s) cancelado(s) para {job_id}")
+    return {"job_id": job_id, "cancelled_tasks": cancelled, **job_tasks.stats()}
+
+
+@app.post("/api/script/stream")
+async def stream_script(request: ScriptRequest, x_job_id: Optional[str] = Header(None)):
+    """
+    Gera roteiro em streaming, frase a frase (NDJSON)
+    Eventos: {"sentence": ...} por frase, {"done": true, ...} ao final
+    ou {"error": ...} em caso de falha
+    O cabeçalho X-Job-ID permite interromper o stream via /api/script/cancel
+    (e é repassado ao LLM Service, que interrompe a geração do mesmo job)
+    """
+    if x_job_id and job_tasks.is_cancelled(x_job_id):
+        raise HTTPException(status_code=409, detail=f"Job {x_job_id} cancelado")
+    logger.info(f"📝 Gerando roteiro em streaming para: {request.agent_name}")
+    key = script_cache_key(request)
+    cached = await cache.get(key)
+    
+    def event(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False) + "\n"
+    
+    async def sentence_stream():
+        buffer = SentenceBuffer()
+        try:
+            if cached:
+                logger.info("📦 Roteiro (stream) retornado do cache")
+                for sentence in buffer.feed(cached["script"]) + buffer.flush():
+                    yield event({"sentence": sentence})
+                result = cached
+            else:
+                parts = []
+                with job_tasks.track(x_job_id):
+                    async for chunk in llm_client.stream(
+                        "/api/llm/stream",
+                        data=build_llm_payload(request),
+                        headers=job_headers(x_job_id)
+                    ):
+                        parts.append(chunk)
+                        for sentence in buffer.feed(chunk):
+                            yield event({"sentence": sentence})
+                for sentence in buffer.flush():
+                    yield event({"sentence": sentence})
+                
+                script = "".join(parts)
+                if not script:
+                    raise Exception("LLM não retornou um script válido")
+                
+                result = build_script_result(script, request)
+                await cache.set(key, result, expire_seconds=86400)
+                logger.info(f"✅ Roteiro (stream) gerado ({result['word_count']} palavras)")
+            
+            yield event({
+                "done": True,
+                "word_count": result["word_count"],
+                "estimated_duration_seconds": result["estimated_duration_seconds"]
+            })
+        except JobCancelledError as e:
+            logger.info(f"🛑 Roteiro (stream) interrompido: {e}")
+            yield event({"error": str(e)})
+        except Exception as e:
+            logger.error(f"❌ Erro no streaming do roteiro: {e}", exc_info=True)
+            yield event({"error": str(e)})
+    
+    return StreamingResponse(sentence_stream(), media_type="application/x-ndjson")
+
+
 @app.get("/api/script/preview")
 async def preview_script(agent_name: str, language: str = "pt-BR"):
     """
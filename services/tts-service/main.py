@@ -2,10 +2,13 @@
 TTS Service - Microserviço para síntese de voz (Text-to-Speech)
 Integra com edge-tts para gerar áudio
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from pydantic import BaseModel
+from typing import List, Optional
+from contextlib import asynccontextmanager
 import sys
 import os
+import uuid
 from datetime import datetime
 import logging
 import asyncio
@@ -14,7 +17,10 @@ from pathlib import Path
 # Adicionar shared ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from shared.utils import get_logger, cache
+from shared.utils import (
+    get_logger, instrument_app, SingleFlight, JobCancellation, JobCancelledError, cache, cache_key,
+    propagate_deadline, within_deadline, DeadlineExceededError, span, tracer
+)
 from shared.config import S3_ENDPOINT, S3_BUCKET
 
 # Importar TTS existente
@@ -25,11 +31,22 @@ except ImportError:
     text_to_speech = None
 
 # ==================== SETUP ====================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Libera o pool de conexões do cache no encerramento"""
+    yield
+    await cache.close()
+    await tracer.close()
+
+
 app = FastAPI(
     title="JARVIS TTS Service",
     description="Serviço de síntese de voz (Text-to-Speech)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+propagate_deadline(app)
+instrument_app(app, "tts-service")
 
 logger = get_logger(__name__)
 
@@ -49,6 +66,14 @@ class TTSRequest(BaseModel):
     pitch: float = 1.0
 
 
+class TTSConcatRequest(BaseModel):
+    """Requisição para unir segmentos de áudio em um único MP3"""
+    segments: List[str]
+    agent_name: str = "jarvis"
+    voice: str = "pt-BR-FranciscaNeural"
+    language: str = "pt-BR"
+
+
 class TTSResponse(BaseModel):
     """Resposta com áudio gerado"""
     audio_path: str
@@ -58,6 +83,18 @@ class TTSResponse(BaseModel):
     size_bytes: int
 
 
+def audio_cache_key(request: TTSRequest) -> str:
+    """Chave da síntese: texto e todos os parâmetros de voz"""
+    return cache_key(
+        "tts",
+        text=request.text,
+        voice=request.voice,
+        language=request.language,
+        speed=request.speed,
+        pitch=request.pitch
+    )
+
+
 # ==================== HEALTH CHECK ====================
 @app.get("/health")
 async def health_check():
@@ -71,70 +108,144 @@ async def health_check():
 
 
 # ==================== ENDPOINTS ====================
+# Sínteses idênticas em andamento são compartilhadas entre requisições
+audio_flight = SingleFlight()
+
+# Sínteses em andamento por execução de job (cancelamento pelo orchestrator)
+job_tasks = JobCancellation()
+
+
 @app.post("/api/tts/generate")
-async def generate_audio(request: TTSRequest) -> TTSResponse:
+async def generate_audio(
+    request: TTSRequest,
+    x_job_id: Optional[str] = Header(None)
+) -> TTSResponse:
     """
     Gera áudio a partir de texto usando edge-tts
+    O cabeçalho X-Job-ID permite cancelar a síntese via /api/tts/cancel;
+    com X-Deadline-Ms a síntese é abandonada (504) quando o prazo se esgota
     """
     try:
         logger.info(f"🎙️  Gerando áudio ({request.voice}, {len(request.text)} chars)...")
         
         # Verificar cache
-        cache_key = f"tts:{hash(request.text)}:{request.voice}"
-        cached = cache.get(cache_key)
+        key = audio_cache_key(request)
+        cached = await cache.get(key)
         if cached:
-            logger.info("📦 Áudio retornado do cache")
-            return TTSResponse(**cached)
+            # O arquivo é local: pode não existir nesta réplica (ou após reinício
+            # e limpeza do /tmp); nesse caso a entrada é descartada e o áudio refeito
+            if Path(cached["audio_path"]).exists():
+                logger.info("📦 Áudio retornado do cache")
+                return TTSResponse(**cached)
+            logger.info(f"🗑️  Áudio do cache ausente nesta réplica, gerando novamente: {cached['audio_path']}")
+            await cache.delete(key)
         
-        # Gerar nome do arquivo
-        from datetime import datetime
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        audio_file = OUTPUT_DIR / f"{request.agent_name}_{timestamp}.mp3"
-        
-        # Gerar áudio
-        if text_to_speech:
+        async def generate() -> dict:
+            # Gerar nome do arquivo
+            audio_file = build_output_path(request.agent_name)
+            
+            # Gerar áudio com edge-tts (assíncrono: cancelar a síntese fecha a
+            # conexão com o serviço de voz)
             try:
-                text_to_speech(request.text, str(audio_file))
-                logger.info(f"✅ Áudio gerado: {audio_file}")
-            except Exception as e:
-                logger.warning(f"Erro ao gerar áudio com função local: {e}")
-                # Fallback: usar edge-tts diretamente
                 await generate_audio_with_edge_tts(
                     request.text,
                     request.voice,
                     str(audio_file)
                 )
-        else:
-            logger.warning("TTS local indisponível, usando edge-tts direto")
-            await generate_audio_with_edge_tts(
-                request.text,
-                request.voice,
-                str(audio_file)
-            )
-        
-        # Obter informações do arquivo
-        if not audio_file.exists():
-            raise Exception(f"Arquivo de áudio não foi criado: {audio_file}")
+            except Exception as e:
+                if not text_to_speech:
+                    raise
+                logger.warning(f"Erro ao gerar áudio com edge-tts, usando função local: {e}")
+                # Fallback: função local síncrona, em thread (não interrompível)
+                await asyncio.to_thread(text_to_speech, request.text, str(audio_file))
+                logger.info(f"✅ Áudio gerado: {audio_file}")
+            
+            # Obter informações do arquivo
+            if not audio_file.exists():
+                raise Exception(f"Arquivo de áudio não foi criado: {audio_file}")
+            
+            file_size = audio_file.stat().st_size
+            # Estimativa: ~100 bytes por segundo (MP3 de qualidade média)
+            duration = file_size / 100
+            
+            result = {
+                "audio_path": str(audio_file),
+                "duration": duration,
+                "voice": request.voice,
+                "language": request.language,
+                "size_bytes": file_size
+            }
+            
+            # Cachear por 30 dias
+            await cache.set(key, result, expire_seconds=2592000)
+            return result
         
-        file_size = audio_file.stat().st_size
-        # Estimativa: ~100 bytes por segundo (MP3 de qualidade média)
-        duration = file_size / 100
+        result = await within_deadline(job_tasks.run(x_job_id, audio_flight.do(key, generate)))
+        return TTSResponse(**result)
+    
+    except JobCancelledError as e:
+        logger.info(f"🛑 Síntese interrompida: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except DeadlineExceededError as e:
+        logger.warning(f"⏰ Síntese abandonada: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Erro ao gerar áudio: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/tts/cancel/{job_id}")
+async def cancel_audio(job_id: str):
+    """Interrompe as sínteses em andamento do job (chamado pelo orchestrator)"""
+    cancelled = job_tasks.cancel(job_id)
+    if cancelled:
+        logger.info(f"🛑 {cancelled} síntese(s) cancelada(s) para {job_id}")
+    return {"job_id": job_id, "cancelled_tasks": cancelled, **job_tasks.stats()}
+
+
+@app.post("/api/tts/concat")
+async def concat_audio(
+    request: TTSConcatRequest,
+    x_job_id: Optional[str] = Header(None)
+) -> TTSResponse:
+    """
+    Une segmentos MP3 (gerados por /api/tts/generate) em um único arquivo
+    Usado no modo streaming, em que o roteiro é sintetizado frase a frase
+    Como em /api/tts/generate, X-Job-ID e X-Deadline-Ms abandonam a espera
+    (409/504); a cópia em thread não é interrompida
+    """
+    try:
+        segments = [Path(segment).resolve() for segment in request.segments]
+        for segment in segments:
+            if segment.parent != OUTPUT_DIR.resolve() or not segment.exists():
+                raise HTTPException(status_code=400, detail=f"Segmento inválido: {segment}")
         
-        result = {
-            "audio_path": str(audio_file),
-            "duration": duration,
-            "voice": request.voice,
-            "language": request.language,
-            "size_bytes": file_size
-        }
+        audio_file = build_output_path(request.agent_name)
+        await within_deadline(job_tasks.run(
+            x_job_id, asyncio.to_thread(concat_mp3_files, segments, audio_file)
+        ))
         
-        # Cachear por 30 dias
-        cache.set(cache_key, result, expire_seconds=2592000)
+        file_size = audio_file.stat().st_size
+        logger.info(f"✅ {len(segments)} segmentos unidos em {audio_file}")
         
-        return TTSResponse(**result)
+        return TTSResponse(
+            audio_path=str(audio_file),
+            duration=file_size / 100,
+            voice=request.voice,
+            language=request.language,
+            size_bytes=file_size
+        )
     
+    except HTTPException:
+        raise
+    except JobCancelledError as e:
+        logger.info(f"🛑 União de segmentos interrompida: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except DeadlineExceededError as e:
+        logger.warning(f"⏰ União de segmentos abandonada: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        logger.error(f"❌ Erro ao gerar áudio: {e}", exc_info=True)
+        logger.error(f"❌ Erro ao unir segmentos: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -152,6 +263,21 @@ async def get_available_voices():
 
 
 # ==================== HELPER FUNCTIONS ====================
+def build_output_path(agent_name: str) -> Path:
+    """Caminho único para um novo arquivo de áudio"""
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    return OUTPUT_DIR / f"{agent_name}_{timestamp}_{uuid.uuid4().hex[:8]}.mp3"
+
+
+def concat_mp3_files(segments: List[Path], output: Path):
+    """Concatena frames MP3 (edge-tts gera MP3 sem cabeçalho, então basta unir os bytes)"""
+    with open(output, "wb") as out:
+        for segment in segments:
+            with open(segment, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    out.write(chunk)
+
+
 async def generate_audio_with_edge_tts(text: str, voice: str, output_path: str):
     """Gera áudio usando edge-tts diretamente"""
     try:
@@ -159,8 +285,14 @@ async def generate_audio_with_edge_tts(text: str, voice: str, output_path: str):
         
         logger.info(f"📝 Gerando áudio com edge-tts...")
         
-        communicate = Communicate(text, voice, rate="+0%", volume="+0%", pitch="+0Hz")
-        await communicate.save(output_path)
+        with span("tts.edge_tts", voice=voice, chars=len(text)):
+            communicate = Communicate(text, voice, rate="+0%", volume="+0%", pitch="+0Hz")
+            try:
+                await communicate.save(output_path)
+            except asyncio.CancelledError:
+                # Síntese cancelada: não deixar um arquivo parcial para trás
+                Path(output_path).unlink(missing_ok=True)
+                raise
         
         logger.info(f"✅ Áudio salvo: {output_path}")
     
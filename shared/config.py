@@ -17,6 +17,14 @@ SERVICE_URLS = {
     "tts_service": os.getenv("TTS_SERVICE_URL", "http://tts-service:8004"),
     "memory_service": os.getenv("MEMORY_SERVICE_URL", "http://memory-service:8005"),
     "orchestrator": os.getenv("ORCHESTRATOR_URL", "http://orchestrator:8010"),
+    "cron_service": os.getenv("CRON_SERVICE_URL", "http://cron-service:8006"),
+}
+
+# Réplicas adicionais de cada serviço, usadas pelos hedges de leitura
+# (ex.: NEWS_SERVICE_REPLICA_URLS=http://news-2:8002,http://news-3:8002)
+SERVICE_REPLICA_URLS = {
+    name: [url for url in os.getenv(f"{name.upper()}_REPLICA_URLS", "").split(",") if url]
+    for name in SERVICE_URLS
 }
 
 # ==================== LLM CONFIGURATION ====================
@@ -58,6 +66,31 @@ REDIS_URL = (
     else f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 )
 
+# Pool de conexões do cache assíncrono e timeout de cada operação (segundos)
+# Um Redis lento faz a consulta falhar como miss em vez de travar a requisição
+REDIS_CACHE_MAX_CONNECTIONS = int(os.getenv("REDIS_CACHE_MAX_CONNECTIONS", "50"))
+REDIS_CACHE_TIMEOUT_SECONDS = float(os.getenv("REDIS_CACHE_TIMEOUT_SECONDS", "1.0"))
+
+# Versão do formato das chaves de cache (cache_key); incrementar invalida
+# em massa as entradas anteriores, que apenas expiram
+CACHE_KEY_VERSION = int(os.getenv("CACHE_KEY_VERSION", "1"))
+
+# Formato dos valores no cache (CacheCodec): serializador ("msgpack" ou
+# "json") e compressão ("zlib", "zstd" ou "none") acima do tamanho mínimo
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "msgpack")
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zlib")
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+
+# get_or_compute: validade do lock de recomputação (deve cobrir o cálculo) e
+# agressividade da atualização antecipada (XFetch; 0 desliga)
+CACHE_LOCK_TIMEOUT_SECONDS = float(os.getenv("CACHE_LOCK_TIMEOUT_SECONDS", "30"))
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+
+# Camada local (LRU em processo) na frente do Redis; 0 entradas desabilita
+# O TTL local limita a defasagem caso uma invalidação via pub/sub se perca
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1000"))
+LOCAL_CACHE_TTL_SECONDS = float(os.getenv("LOCAL_CACHE_TTL_SECONDS", "60"))
+
 # ==================== MESSAGE QUEUE ====================
 # RabbitMQ / Celery
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
@@ -82,6 +115,75 @@ CHROMADB_HOST = os.getenv("CHROMADB_HOST", "chromadb")
 CHROMADB_PORT = int(os.getenv("CHROMADB_PORT", "8000"))
 CHROMADB_PERSIST_DIR = os.getenv("CHROMADB_PERSIST_DIR", "/data/chromadb")
 
+# ==================== JOBS ====================
+# Backend do armazenamento de jobs do orchestrator: "redis" ou "memory"
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "redis")
+
+# Máximo de jobs mantidos no front LRU em processo
+JOB_STORE_LOCAL_MAX_ENTRIES = int(os.getenv("JOB_STORE_LOCAL_MAX_ENTRIES", "1000"))
+
+# Retenção dos jobs no Redis (em dias, por status final)
+CLEANUP_COMPLETED_JOBS_AFTER_DAYS = int(os.getenv("CLEANUP_COMPLETED_JOBS_AFTER_DAYS", "7"))
+CLEANUP_FAILED_JOBS_AFTER_DAYS = int(os.getenv("CLEANUP_FAILED_JOBS_AFTER_DAYS", "3"))
+
+# Scheduler: pipelines simultâneos e tamanho máximo da fila de espera
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+SCHEDULER_MAX_QUEUE_SIZE = int(os.getenv("SCHEDULER_MAX_QUEUE_SIZE", "100"))
+
+# Modo de execução: "inline" (pipelines no processo da API) ou "queue"
+# (a API enfileira JobMessages e processos worker executam os pipelines)
+ORCHESTRATOR_MODE = os.getenv("ORCHESTRATOR_MODE", "inline")
+
+# Broker da fila de jobs no modo queue: "memory" (worker embutido na API,
+# para testes locais), "redis" ou "rabbitmq"
+JOB_BROKER_BACKEND = os.getenv("JOB_BROKER_BACKEND", "redis")
+JOB_QUEUE_NAME = os.getenv("JOB_QUEUE_NAME", "podcast_jobs")
+
+# Workers: pipelines simultâneos por processo, heartbeat e limite de entregas
+WORKER_ID = os.getenv("WORKER_ID", "")
+WORKER_PREFETCH = int(os.getenv("WORKER_PREFETCH", "2"))
+WORKER_HEARTBEAT_SECONDS = int(os.getenv("WORKER_HEARTBEAT_SECONDS", "10"))
+WORKER_MAX_DELIVERIES = int(os.getenv("WORKER_MAX_DELIVERIES", "3"))
+
+# Máximo de podcasts por requisição de lote
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "50"))
+
+# Timeout (segundos) de cada estágio do pipeline de podcast
+PIPELINE_STAGE_TIMEOUTS = {
+    "news": float(os.getenv("STAGE_TIMEOUT_NEWS_SECONDS", "30")),
+    "memory": float(os.getenv("STAGE_TIMEOUT_MEMORY_SECONDS", "10")),
+    "script": float(os.getenv("STAGE_TIMEOUT_SCRIPT_SECONDS", "120")),
+    "tts": float(os.getenv("STAGE_TIMEOUT_TTS_SECONDS", "180")),
+}
+
+# Orçamento de tempo de ponta a ponta de cada execução do pipeline (segundos)
+# Propagado aos serviços; os timeouts de cada salto são limitados pelo restante
+PIPELINE_DEADLINE_SECONDS = float(os.getenv("PIPELINE_DEADLINE_SECONDS", "300"))
+
+# Modo streaming: roteiro sintetizado frase a frase enquanto o LLM escreve
+PIPELINE_STREAMING = os.getenv("PIPELINE_STREAMING", "false").lower() == "true"
+TTS_SEGMENT_MIN_CHARS = int(os.getenv("TTS_SEGMENT_MIN_CHARS", "400"))
+TTS_STREAM_CONCURRENCY = int(os.getenv("TTS_STREAM_CONCURRENCY", "3"))
+
+# ==================== CRON ====================
+# Arquivo JSON com as definições de agentes (lista de Agent)
+CRON_AGENTS_FILE = os.getenv("CRON_AGENTS_FILE", "/config/agents.json")
+
+# Fuso horário em que as expressões Agent.schedule são interpretadas
+CRON_TIMEZONE = os.getenv("CRON_TIMEZONE", "America/Sao_Paulo")
+
+# Antecedência da pré-geração em relação ao horário de publicação (minutos)
+CRON_PREGENERATE_MINUTES = int(os.getenv("CRON_PREGENERATE_MINUTES", "30"))
+
+# Janela em que os inícios são espalhados antes da pré-geração (minutos)
+CRON_JITTER_WINDOW_MINUTES = int(os.getenv("CRON_JITTER_WINDOW_MINUTES", "20"))
+
+# Intervalo máximo entre verificações do agendador (segundos)
+CRON_TICK_SECONDS = int(os.getenv("CRON_TICK_SECONDS", "30"))
+
+# Prioridade dos jobs pré-gerados (abaixo das requisições interativas)
+CRON_JOB_PRIORITY = int(os.getenv("CRON_JOB_PRIORITY", "3"))
+
 # ==================== LOGGING ====================
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FORMAT = os.getenv(
@@ -89,6 +191,32 @@ LOG_FORMAT = os.getenv(
     "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+# "queue": formatação e escrita numa thread de fundo (fora do event loop);
+# "sync": StreamHandler direto. LOG_JSON emite um objeto JSON por linha, com
+# service/job_id/stage
+LOG_MODE = os.getenv("LOG_MODE", "queue")
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+
+# Amostragem de logs INFO/DEBUG por logger (fração mantida); avisos e erros
+# sempre passam. Ex.: LOG_SAMPLE_RATES=ServiceClient=0.1,pipeline=0.5
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (
+        item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item
+    )
+}
+
+# ==================== TRACING ====================
+# Spans (trace id/span id via cabeçalho traceparent) gravados no Redis para
+# /api/debug/trace/{job_id}; opcionalmente também em arquivo (JSON por linha)
+# e/ou enviados a um coletor HTTP
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_RETENTION_SECONDS = int(os.getenv("TRACE_RETENTION_SECONDS", "86400"))
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+
 # ==================== API ====================
 API_TITLE = "JARVIS AI Platform"
 API_VERSION = os.getenv("API_VERSION", "1.0.0")
@@ -103,6 +231,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 ENABLE_AUTH = os.getenv("ENABLE_AUTH", "true").lower() == "true"
 ENABLE_RATE_LIMITING = os.getenv("ENABLE_RATE_LIMITING", "true").lower() == "true"
 ENABLE_TELEMETRY = os.getenv("ENABLE_TELEMETRY", "false").lower() == "true"
+ENABLE_PROMETHEUS = os.getenv("ENABLE_PROMETHEUS", "true").lower() == "true"
 
 # ==================== PADRÕES ====================
 # Número de tentativas para operações resilientes
@@ -111,3 +240,41 @@ RETRY_DELAY_SECONDS = int(os.getenv("RETRY_DELAY_SECONDS", "2"))
 
 # Timeout padrão para chamadas HTTP entre serviços
 HTTP_TIMEOUT_SECONDS = int(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+
+# Pool de conexões persistentes (keep-alive) de cada ServiceClient
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+# HTTP/2 entre serviços (requer o pacote h2; só é negociado sobre TLS,
+# ex.: atrás de um proxy - o uvicorn atende apenas HTTP/1.1)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# Novas tentativas por chamada entre serviços (limitadas ao orçamento de retry:
+# fração das requisições do destino, com um mínimo por segundo)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+# Circuit breaker por destino: abre com a taxa de falhas na janela (a partir
+# de um mínimo de chamadas) e recusa chamadas pelo tempo de abertura
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_MIN_REQUESTS = int(os.getenv("CIRCUIT_MIN_REQUESTS", "10"))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "15"))
+
+# Hedge de leituras idempotentes: segunda tentativa quando a primeira passa do
+# percentil de latência do endpoint (atraso padrão enquanto há poucas amostras),
+# limitada a uma fração das requisições
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "1.0"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+
+# Dependências externas (ChromaDB, Groq, Redis do cache síncrono): conexão em
+# background com backoff exponencial até o máximo e verificação periódica
+DEPENDENCY_RETRY_BASE_SECONDS = float(os.getenv("DEPENDENCY_RETRY_BASE_SECONDS", "1"))
+DEPENDENCY_RETRY_MAX_SECONDS = float(os.getenv("DEPENDENCY_RETRY_MAX_SECONDS", "30"))
+DEPENDENCY_CHECK_SECONDS = float(os.getenv("DEPENDENCY_CHECK_SECONDS", "15"))
+
+# Folga reservada em cada salto para a resposta voltar ao chamador antes do prazo
+DEADLINE_MARGIN_SECONDS = float(os.getenv("DEADLINE_MARGIN_SECONDS", "0.5"))
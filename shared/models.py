@@ -66,9 +66,17 @@ class PodcastRequest:
     news_count: int = 8
     language: str = "pt-BR"
     voice: str = "pt-BR-FranciscaNeural"
+    priority: int = 5  # 1-10, 10 é maior prioridade
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+@dataclass
+class BatchPodcastRequest:
+    """Requisição para geração de vários podcasts de uma vez"""
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    requests: List[PodcastRequest] = field(default_factory=list)
+
+
 @dataclass
 class PodcastResult:
     """Resultado da geração de um podcast"""
@@ -1,84 +1,1117 @@
 """
 Utilitários compartilhados para logging, cache, e comunicação entre serviços
 """
+import asyncio
+import atexit
+import contextvars
+import fnmatch
+import hashlib
 import logging
+import math
+import queue
+import random
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from logging.handlers import QueueHandler, QueueListener
 import httpx
 import json
-from typing import Any, Optional, Dict
-from datetime import datetime, timedelta
+from dataclasses import is_dataclass, asdict
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Dict, Tuple
+from datetime import datetime, timedelta, timezone
+import time
 import redis
-from shared.config import REDIS_URL, LOG_LEVEL, LOG_FORMAT, HTTP_TIMEOUT_SECONDS
+import redis.asyncio as aioredis
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from shared.config import (
+    REDIS_URL, REDIS_CACHE_MAX_CONNECTIONS, REDIS_CACHE_TIMEOUT_SECONDS, CACHE_KEY_VERSION,
+    LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL_SECONDS, CACHE_LOCK_TIMEOUT_SECONDS,
+    CACHE_EARLY_REFRESH_BETA, CACHE_SERIALIZER, CACHE_COMPRESSION, CACHE_COMPRESS_MIN_BYTES,
+    LOG_LEVEL, LOG_FORMAT, LOG_MODE, LOG_JSON, LOG_QUEUE_MAX_SIZE, LOG_SAMPLE_RATES,
+    HTTP_TIMEOUT_SECONDS, DEADLINE_MARGIN_SECONDS, ENABLE_PROMETHEUS,
+    HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY_SECONDS, HTTP2_ENABLED,
+    HTTP_MAX_RETRIES, CIRCUIT_FAILURE_RATE, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW_SECONDS, CIRCUIT_OPEN_SECONDS,
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY_SECONDS,
+    HEDGE_BUDGET_RATIO, TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_RETENTION_SECONDS, TRACE_EXPORT_FILE,
+    TRACE_COLLECTOR_URL, DEPENDENCY_RETRY_BASE_SECONDS, DEPENDENCY_RETRY_MAX_SECONDS, DEPENDENCY_CHECK_SECONDS
+)
+
+try:
+    from prometheus_client import (
+        Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+    )
+except ImportError:
+    Counter = Gauge = Histogram = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import h2  # noqa: F401 (habilita http2 no httpx)
+except ImportError:
+    h2 = None
 
 # ==================== LOGGING ====================
+# Campos anexados aos registros emitidos no contexto atual (job_id, stage...)
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+_log_service: Optional[str] = None
+_log_handler: Optional[logging.Handler] = None
+
+
+class ContextFilter(logging.Filter):
+    """Anexa o serviço e os campos de log_context ao registro (na thread de origem)"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.service = _log_service
+        record.context = _log_context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos registros INFO/DEBUG do logger; avisos e erros sempre passam"""
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha: horário, nível, logger, serviço, contexto e mensagem"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": getattr(record, "service", None),
+            **getattr(record, "context", {}),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enfileira o registro sem formatá-lo: formatação e escrita ficam com a
+    thread do QueueListener. Com a fila cheia o registro é descartado em vez
+    de bloquear o event loop
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _shared_log_handler() -> logging.Handler:
+    """Handler único do processo; no modo queue, escrita numa thread de fundo"""
+    global _log_handler
+    if _log_handler is None:
+        stream = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT))
+        if LOG_MODE == "queue":
+            handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_MAX_SIZE))
+            listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+            listener.start()
+            # Esvazia a fila no encerramento do processo
+            atexit.register(listener.stop)
+        else:
+            handler = stream
+        handler.addFilter(ContextFilter())
+        _log_handler = handler
+    return _log_handler
+
+
 def get_logger(name: str) -> logging.Logger:
-    """Retorna um logger configurado"""
+    """Retorna um logger configurado (ver LOG_MODE, LOG_JSON e LOG_SAMPLE_RATES)"""
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
     
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter(LOG_FORMAT)
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_shared_log_handler())
+        if name in LOG_SAMPLE_RATES:
+            logger.addFilter(SamplingFilter(LOG_SAMPLE_RATES[name]))
     
     return logger
 
 
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """Campos (job_id, stage...) incluídos nos logs emitidos dentro do bloco"""
+    fields = {key: value for key, value in fields.items() if value is not None}
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def set_log_service(name: str):
+    """Nome do serviço incluído em todos os logs do processo"""
+    global _log_service
+    _log_service = name
+
+
+# ==================== SERIALIZAÇÃO ====================
+def to_serializable(value: Any) -> Any:
+    """Converte dataclasses, enums e datas em estruturas compatíveis com JSON"""
+    if is_dataclass(value) and not isinstance(value, type):
+        return to_serializable(asdict(value))
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): to_serializable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_serializable(v) for v in value]
+    return value
+
+
+# ==================== SINGLE-FLIGHT ====================
+class SingleFlight:
+    """
+    Coalescência de chamadas concorrentes com a mesma chave
+    Enquanto uma execução para a chave estiver em andamento, novas chamadas
+    aguardam o mesmo resultado em vez de repetir o trabalho
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.leaders = 0
+        self.followers = 0
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa func uma única vez por chave em andamento
+        A execução roda em task própria: o cancelamento de quem chamou primeiro
+        não interrompe os demais; ela só é cancelada quando ninguém mais aguarda
+        """
+        value, _ = await self.do_shared(key, func)
+        return value
+    
+    async def do_shared(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Como do(), mais se o resultado foi compartilhado: True quando quem
+        chamou se juntou a uma execução já em andamento (não rodou func)
+        """
+        future = self.join(key)
+        shared = future is not None
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self.track(key, future)
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future), shared
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+                if not future.done():
+                    future.cancel()
+    
+    def track(self, key: str, future: asyncio.Future):
+        """Registra uma execução gerenciada externamente para a chave"""
+        self.leaders += 1
+        self._calls[key] = future
+        
+        def _release(done: asyncio.Future):
+            if self._calls.get(key) is done:
+                del self._calls[key]
+            if not done.cancelled():
+                done.exception()  # evita aviso de exceção não lida
+        
+        future.add_done_callback(_release)
+    
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """Future da execução em andamento para a chave (ou None)"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.followers += 1
+        return future
+    
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers
+        }
+
+
+# ==================== CANCELAMENTO ====================
+# Cabeçalho com o identificador da execução do job nas chamadas entre serviços
+JOB_ID_HEADER = "X-Job-ID"
+
+
+class JobCancelledError(Exception):
+    """Trabalho interrompido porque o job foi cancelado"""
+
+
+class JobCancellation:
+    """
+    Registro do trabalho em andamento por job dentro de um serviço
+    Um pedido de cancelamento interrompe as tarefas daquele job; cancelamentos
+    recentes são lembrados para recusar chamadas que cheguem depois deles
+    """
+    
+    REMEMBER_SECONDS = 300
+    
+    def __init__(self):
+        self._tasks: Dict[str, set] = {}
+        self._cancelled: Dict[str, float] = {}
+        self.cancelled_tasks = 0
+    
+    async def run(self, job_id: Optional[str], awaitable: Awaitable) -> Any:
+        """Executa `awaitable` associado ao job; levanta JobCancelledError se cancelado"""
+        if not job_id:
+            return await awaitable
+        if self.is_cancelled(job_id):
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise JobCancelledError(f"Job {job_id} cancelado")
+        
+        task = asyncio.ensure_future(awaitable)
+        tasks = self._tasks.setdefault(job_id, set())
+        tasks.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                raise JobCancelledError(f"Job {job_id} cancelado") from None
+            raise
+        finally:
+            tasks.discard(task)
+            if not tasks:
+                self._tasks.pop(job_id, None)
+
+    @contextmanager
+    def track(self, job_id: Optional[str]) -> Iterator[None]:
+        """
+        Associa a task corrente ao job enquanto o bloco executa (ex.: geradores
+        de streaming, que não cabem em run()); o cancelamento do job interrompe
+        o bloco e chega a ele como JobCancelledError
+        """
+        if not job_id:
+            yield
+            return
+        if self.is_cancelled(job_id):
+            raise JobCancelledError(f"Job {job_id} cancelado")
+
+        task = asyncio.current_task()
+        tasks = self._tasks.setdefault(job_id, set())
+        tasks.add(task)
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Só o cancelamento do job é convertido; os demais (ex.: desligamento) propagam
+            if self.is_cancelled(job_id) and task.cancelling() == 1:
+                task.uncancel()
+                raise JobCancelledError(f"Job {job_id} cancelado") from None
+            raise
+        finally:
+            tasks.discard(task)
+            if not tasks:
+                self._tasks.pop(job_id, None)
+
+    def cancel(self, job_id: str) -> int:
+        """Cancela as tarefas do job; retorna quantas foram interrompidas"""
+        now = time.monotonic()
+        self._cancelled = {
+            key: at for key, at in self._cancelled.items() if now - at < self.REMEMBER_SECONDS
+        }
+        self._cancelled[job_id] = now
+        tasks = list(self._tasks.get(job_id, ()))
+        for task in tasks:
+            task.cancel()
+        self.cancelled_tasks += len(tasks)
+        return len(tasks)
+    
+    def is_cancelled(self, job_id: str) -> bool:
+        cancelled_at = self._cancelled.get(job_id)
+        return cancelled_at is not None and time.monotonic() - cancelled_at < self.REMEMBER_SECONDS
+    
+    def stats(self) -> Dict:
+        return {
+            "active_jobs": len(self._tasks),
+            "cancelled_tasks": self.cancelled_tasks
+        }
+
+
+# ==================== PRAZO (DEADLINE) ====================
+# Cabeçalho com o orçamento de tempo restante do job, em milissegundos
+# Relativo (como o grpc-timeout): cada serviço o converte num prazo local no
+# relógio monotônico, sem depender de relógios sincronizados entre os nós
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+
+class DeadlineExceededError(Exception):
+    """Prazo do job esgotado: o trabalho não seria aproveitado"""
+
+
+# Prazo (time.monotonic) da requisição/execução corrente; herdado pelas tasks filhas
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Define o prazo do contexto atual (`seconds` a partir de agora)
+    Um prazo herdado mais curto prevalece; None mantém o prazo atual
+    """
+    deadline = _deadline.get()
+    if seconds is not None:
+        candidate = time.monotonic() + seconds
+        deadline = candidate if deadline is None else min(deadline, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Tempo restante até o prazo do contexto (None quando não há prazo)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_timeout(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout de uma operação limitado pelo prazo, descontada a folga de resposta
+    Levanta DeadlineExceededError se o prazo já se esgotou
+    """
+    remaining = remaining_seconds()
+    if remaining is None:
+        return timeout
+    budget = remaining - DEADLINE_MARGIN_SECONDS
+    if budget <= 0:
+        raise DeadlineExceededError(f"Prazo esgotado ({remaining:.2f}s restantes)")
+    return budget if timeout is None else min(timeout, budget)
+
+
+def check_deadline():
+    """Levanta DeadlineExceededError se o prazo do contexto já se esgotou"""
+    deadline_timeout()
+
+
+def deadline_headers(headers: Optional[Dict] = None) -> Optional[Dict]:
+    """Cabeçalhos da chamada acrescidos do orçamento restante (se houver prazo)"""
+    remaining = remaining_seconds()
+    if remaining is None:
+        return headers
+    budget_ms = max(int((remaining - DEADLINE_MARGIN_SECONDS) * 1000), 0)
+    return {**(headers or {}), DEADLINE_HEADER: str(budget_ms)}
+
+
+async def within_deadline(awaitable: Awaitable) -> Any:
+    """Aguarda `awaitable` até o prazo; levanta DeadlineExceededError ao estourar"""
+    try:
+        timeout = deadline_timeout()
+    except DeadlineExceededError:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError(f"Prazo esgotado após {timeout:.2f}s") from None
+
+
+def propagate_deadline(app):
+    """
+    Lê o orçamento recebido em X-Deadline-Ms e o define como prazo da requisição
+    Requisições que chegam com o orçamento esgotado são recusadas (504) sem
+    executar o endpoint; chamadas via ServiceClient repassam o restante
+    """
+    @app.middleware("http")
+    async def deadline_middleware(request: Request, call_next):
+        header = request.headers.get(DEADLINE_HEADER)
+        if header is None:
+            return await call_next(request)
+        try:
+            budget = int(header) / 1000
+        except ValueError:
+            return JSONResponse({"detail": f"{DEADLINE_HEADER} inválido"}, status_code=400)
+        if budget <= DEADLINE_MARGIN_SECONDS:
+            return JSONResponse({"detail": "Prazo esgotado"}, status_code=504)
+        with deadline_scope(budget):
+            return await call_next(request)
+
+
+# ==================== TRACING ====================
+# Contexto de trace entre serviços no formato W3C: 00-{trace_id}-{span_id}-{flags}
+TRACEPARENT_HEADER = "traceparent"
+# Sondas frequentes que não geram traces
+UNTRACED_PATHS = ("/health", "/ready", "/metrics")
+
+
+class Span:
+    """Operação medida dentro de um trace (handler, chamada, cache, provedor...)"""
+    
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "service", "start", "duration", "attributes",
+                 "error", "sampled")
+    
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, sampled: bool, attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.service = _log_service
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.sampled = sampled
+    
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, span_id do pai, amostrado) do cabeçalho traceparent, se válido"""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+class Tracer:
+    """
+    Registro de spans sem dependências externas
+    O trace nasce no orchestrator (ou no primeiro serviço sem traceparent) e
+    segue pelos cabeçalhos do ServiceClient. Spans concluídos são exportados
+    em lote por uma task de fundo: lista trace:{trace_id} no Redis (com TTL,
+    lida por load()), arquivo JSON por linha e/ou POST ao coletor
+    """
+    
+    KEY_PREFIX = "trace:"
+    FLUSH_SECONDS = 1.0
+    MAX_PENDING = 10000
+    
+    def __init__(
+        self,
+        enabled: bool = TRACING_ENABLED,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        url: str = REDIS_URL,
+        retention_seconds: int = TRACE_RETENTION_SECONDS,
+        export_file: str = TRACE_EXPORT_FILE,
+        collector_url: str = TRACE_COLLECTOR_URL
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.url = url
+        self.retention_seconds = retention_seconds
+        self.export_file = export_file
+        self.collector_url = collector_url
+        self._redis: Optional[aioredis.Redis] = None
+        self._pending: List[Dict] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._export_failing: set = set()
+        # Por destino; "pending" conta os spans descartados com a fila cheia
+        self.exported: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+    
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+        """
+        Span filho do span atual (ou do `traceparent` recebido; sem nenhum,
+        inicia um trace). Exceções marcam o span com erro e são propagadas
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = uuid.uuid4().hex, None, random.random() < self.sample_rate
+        
+        current = Span(trace_id, parent_id, name, sampled, attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                _current_span.set(parent)  # encerrado em outro contexto (ex.: gerador)
+            current.duration = time.time() - current.start
+            if current.sampled:
+                self._record(current)
+    
+    def _record(self, span: Span):
+        if len(self._pending) >= self.MAX_PENDING:
+            self._pending.pop(0)
+            self.dropped["pending"] = self.dropped.get("pending", 0) + 1
+        self._pending.append(span.to_dict())
+        if self._flusher is None or self._flusher.done():
+            try:
+                # Contexto vazio: a exportação não herda span nem campos de log
+                self._flusher = asyncio.get_running_loop().create_task(
+                    self._flush_loop(), context=contextvars.Context()
+                )
+            except RuntimeError:
+                pass  # fora do event loop: exportado na próxima oportunidade
+    
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.FLUSH_SECONDS)
+            await self.flush()
+    
+    async def flush(self):
+        """
+        Exporta os spans pendentes (Redis, arquivo e coletor)
+        Cada destino é independente: a falha de um não impede os demais e o
+        lote é contado como descartado só no destino que falhou
+        """
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        await self._export("redis", batch, self._push_redis)
+        if self.export_file:
+            await self._export("file", batch, lambda batch: asyncio.to_thread(self._append_file, batch))
+        if self.collector_url:
+            await self._export("collector", batch, self._post_collector)
+    
+    async def _export(self, sink: str, batch: List[Dict], export: Callable[[List[Dict]], Awaitable[Any]]):
+        try:
+            await export(batch)
+            self.exported[sink] = self.exported.get(sink, 0) + len(batch)
+            self._export_failing.discard(sink)
+        except Exception as e:
+            self.dropped[sink] = self.dropped.get(sink, 0) + len(batch)
+            if sink not in self._export_failing:
+                get_logger(__name__).warning(
+                    f"⚠️  Falha ao exportar spans para {sink} (descartados até normalizar): {e}"
+                )
+            self._export_failing.add(sink)
+    
+    async def _push_redis(self, batch: List[Dict]):
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                self.url, socket_timeout=REDIS_CACHE_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_CACHE_TIMEOUT_SECONDS
+            )
+        traces: Dict[str, List[str]] = {}
+        for entry in batch:
+            traces.setdefault(entry["trace_id"], []).append(json.dumps(entry, default=str))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for trace_id, entries in traces.items():
+                pipe.rpush(f"{self.KEY_PREFIX}{trace_id}", *entries)
+                pipe.expire(f"{self.KEY_PREFIX}{trace_id}", self.retention_seconds)
+            await pipe.execute()
+    
+    async def _post_collector(self, batch: List[Dict]):
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.post(self.collector_url, json={"spans": batch})
+            response.raise_for_status()
+    
+    def _append_file(self, batch: List[Dict]):
+        with open(self.export_file, "a", encoding="utf-8") as f:
+            for entry in batch:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+    
+    async def load(self, trace_id: str) -> List[Dict]:
+        """Spans exportados de um trace (de todos os serviços), por início"""
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.url, socket_timeout=REDIS_CACHE_TIMEOUT_SECONDS)
+        raw = await self._redis.lrange(f"{self.KEY_PREFIX}{trace_id}", 0, -1)
+        return sorted((json.loads(entry) for entry in raw), key=lambda entry: entry["start"])
+    
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "pending": len(self._pending), "exported": dict(self.exported),
+                "dropped": dict(self.dropped)}
+    
+    async def close(self):
+        """Exporta o que estiver pendente e fecha a conexão"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Span no tracer do processo (ver Tracer.span)"""
+    return tracer.span(name, traceparent, **attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    """ID do trace atual, se houver e for amostrado (exportado)"""
+    current = _current_span.get()
+    return current.trace_id if current is not None and current.sampled else None
+
+
+def trace_headers(headers: Optional[Dict] = None) -> Optional[Dict]:
+    """Cabeçalhos com o traceparent do span atual, se houver"""
+    current = _current_span.get()
+    if current is None:
+        return headers
+    return {**(headers or {}), TRACEPARENT_HEADER: current.traceparent}
+
+
+def build_waterfall(spans: List[Dict], width: int = 60) -> List[Dict]:
+    """
+    Spans em ordem de árvore (pai antes dos filhos, irmãos por início) com
+    profundidade, deslocamento desde o início do trace e uma barra proporcional
+    """
+    if not spans:
+        return []
+    ids = {entry["span_id"] for entry in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for entry in spans:
+        parent = entry["parent_id"] if entry["parent_id"] in ids else None
+        children.setdefault(parent, []).append(entry)
+    origin = min(entry["start"] for entry in spans)
+    total = max(entry["start"] + (entry["duration"] or 0) for entry in spans) - origin or 1e-9
+    
+    rows = []
+    
+    def visit(parent: Optional[str], depth: int):
+        for entry in sorted(children.get(parent, []), key=lambda item: item["start"]):
+            offset = entry["start"] - origin
+            duration = entry["duration"] or 0
+            begin = int(offset / total * width)
+            length = max(int(duration / total * width), 1)
+            rows.append({
+                "name": entry["name"],
+                "service": entry["service"],
+                "depth": depth,
+                "offset_ms": round(offset * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                "error": entry.get("error"),
+                "attributes": entry.get("attributes", {}),
+                "bar": " " * begin + "█" * min(length, width - begin),
+            })
+            visit(entry["span_id"], depth + 1)
+    
+    visit(None, 0)
+    return rows
+
+
+# ==================== MÉTRICAS ====================
+# Buckets de latência (segundos): de chamadas ao cache até geração de áudio
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRICS_ENABLED = ENABLE_PROMETHEUS and Histogram is not None
+
+
+class _NoopMetric:
+    """Métrica sem efeito, usada quando prometheus_client não está disponível"""
+    
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+    
+    def observe(self, value: float):
+        pass
+    
+    def inc(self, amount: float = 1):
+        pass
+    
+    def dec(self, amount: float = 1):
+        pass
+    
+    def set(self, value: float):
+        pass
+
+
+def histogram(name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+    """Histograma Prometheus (ou métrica sem efeito se desabilitado)"""
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+def counter(name: str, documentation: str, labels: tuple = ()):
+    """Contador Prometheus (ou métrica sem efeito se desabilitado)"""
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+def gauge(name: str, documentation: str, labels: tuple = ()):
+    """Gauge Prometheus (ou métrica sem efeito se desabilitado)"""
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    return Gauge(name, documentation, labels)
+
+
+HTTP_REQUEST_DURATION = histogram(
+    "jarvis_http_request_duration_seconds",
+    "Latência das requisições HTTP por rota",
+    ("service", "method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = gauge(
+    "jarvis_http_requests_in_flight",
+    "Requisições HTTP em andamento",
+    ("service",)
+)
+CACHE_REQUESTS = counter(
+    "jarvis_cache_requests_total",
+    "Consultas ao cache por namespace e resultado (local_hit/hit/miss/error)",
+    ("namespace", "result")
+)
+CIRCUIT_STATE = gauge(
+    "jarvis_circuit_breaker_state",
+    "Estado do circuit breaker por destino (0 fechado, 1 semiaberto, 2 aberto)",
+    ("destination",)
+)
+CIRCUIT_REJECTIONS = counter(
+    "jarvis_circuit_breaker_rejections_total",
+    "Chamadas recusadas sem contato com o destino (circuito aberto)",
+    ("destination",)
+)
+HTTP_CLIENT_HEDGES = counter(
+    "jarvis_http_client_hedges_total",
+    "Requisições com hedge por destino: segundas tentativas enviadas (sent) e as que responderam primeiro (won)",
+    ("destination", "result")
+)
+HTTP_CLIENT_RETRIES = counter(
+    "jarvis_http_client_retries_total",
+    "Novas tentativas de chamadas entre serviços por destino e resultado (retried/budget_exhausted)",
+    ("destination", "result")
+)
+
+
+def instrument_app(app, service_name: str):
+    """
+    Instrumenta um app FastAPI: latência e requisições em andamento por rota,
+    e expõe as métricas em /metrics e a prontidão em /ready
+    Em respostas streaming a latência mede até o envio dos cabeçalhos
+    Os logs passam a levar o nome do serviço e o X-Job-ID da requisição, e
+    cada requisição vira um span filho do traceparent recebido
+    """
+    set_log_service(service_name)
+    
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(service_name)
+        in_flight.inc()
+        start = time.perf_counter()
+        status = 500
+        server_scope = (
+            span(request.method, request.headers.get(TRACEPARENT_HEADER), kind="server")
+            if request.url.path not in UNTRACED_PATHS else nullcontext()
+        )
+        try:
+            with log_context(job_id=request.headers.get(JOB_ID_HEADER)), server_scope as server_span:
+                response = await call_next(request)
+                status = response.status_code
+                if server_span is not None:
+                    server_span.name = f"{request.method} {request_route(request)}"
+                    server_span.set(status=status)
+            return response
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(
+                service_name,
+                request.method,
+                request_route(request),
+                str(status)
+            ).observe(time.perf_counter() - start)
+    
+    @app.get("/ready", include_in_schema=False)
+    async def readiness():
+        """
+        Prontidão, separada do /health (liveness): 503 enquanto alguma
+        dependência obrigatória não está conectada. O cache é opcional
+        (indisponível, as consultas viram miss) e apenas reportado
+        """
+        dependencies = dependency_stats()
+        ready = all(state["ready"] for state in dependencies.values() if state["required"])
+        return JSONResponse(
+            {
+                "status": "ready" if ready else "not_ready",
+                "service": service_name,
+                "dependencies": dependencies,
+                "cache_available": cache.enabled,
+            },
+            status_code=200 if ready else 503
+        )
+    
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        if not METRICS_ENABLED:
+            return Response("# métricas desabilitadas\n", media_type="text/plain")
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def request_route(request: Request) -> str:
+    """Rota como template (/api/podcast/status/{job_id}) para limitar cardinalidade"""
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+
+def cache_namespace(key: str) -> str:
+    """Prefixo da chave (ex.: "llm" em "llm:prompt:...") usado como rótulo"""
+    return key.split(":", 1)[0]
+
+
+# ==================== CHAVES DE CACHE ====================
+def stable_digest(value: Any) -> str:
+    """
+    SHA-256 da forma canônica do valor (JSON com chaves ordenadas e compacto)
+    Estável entre processos e réplicas, ao contrário de hash(), que usa semente
+    aleatória por processo
+    """
+    canonical = json.dumps(
+        to_serializable(value), sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cache_key(namespace: str, **fields) -> str:
+    """
+    Chave de cache determinística: "{namespace}:v{versão}:{digest dos campos}"
+    `fields` deve conter todo parâmetro que altera o resultado (modelo,
+    temperatura, idioma, voz...). Para invalidar em massa, incremente
+    CACHE_KEY_VERSION ou limpe o padrão "{namespace}:v{versão}:*"
+    """
+    return f"{namespace}:v{CACHE_KEY_VERSION}:{stable_digest(fields)}"
+
+
+# ==================== CODEC DO CACHE ====================
+class CacheCodecError(ValueError):
+    """Valor do cache em formato desconhecido ou corrompido"""
+
+
+class CacheCodec:
+    """
+    Formato dos valores gravados no Redis
+    Cabeçalho de 4 bytes: marcador 0x00 (nunca inicia um JSON), versão do
+    formato, serializador ("j" JSON, "m" MessagePack) e compressão ("-",
+    "z" zlib, "s" zstd); só comprime acima de `compress_min_bytes`
+    Valores sem cabeçalho são o JSON puro das versões anteriores e continuam
+    legíveis; a decodificação aceita qualquer combinação, independente da
+    configuração de escrita
+    """
+    
+    MARKER = 0x00
+    VERSION = 1
+    SERIALIZERS = {"json": b"j", "msgpack": b"m"}
+    COMPRESSORS = {"none": b"-", "zlib": b"z", "zstd": b"s"}
+    
+    def __init__(
+        self,
+        serializer: str = CACHE_SERIALIZER,
+        compression: str = CACHE_COMPRESSION,
+        compress_min_bytes: int = CACHE_COMPRESS_MIN_BYTES
+    ):
+        if serializer not in self.SERIALIZERS:
+            raise ValueError(f"Serializador de cache desconhecido: {serializer}")
+        if compression not in self.COMPRESSORS:
+            raise ValueError(f"Compressão de cache desconhecida: {compression}")
+        logger = get_logger(__name__)
+        if serializer == "msgpack" and msgpack is None:
+            logger.warning("⚠️  msgpack não instalado, cache serializado em JSON")
+            serializer = "json"
+        if compression == "zstd" and zstandard is None:
+            logger.warning("⚠️  zstandard não instalado, cache comprimido com zlib")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._zstd_compressor = zstandard.ZstdCompressor() if compression == "zstd" else None
+    
+    @property
+    def name(self) -> str:
+        return f"{self.serializer}+{self.compression}"
+    
+    def encode(self, value: Any) -> bytes:
+        if self.serializer == "msgpack":
+            payload = msgpack.packb(value, use_bin_type=True)
+        else:
+            payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.compress_min_bytes:
+            if self.compression == "zstd":
+                compressed = self._zstd_compressor.compress(payload)
+            else:
+                compressed = zlib.compress(payload, 6)
+            # Só vale a pena se reduzir (ex.: áudio já comprimido não reduz)
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compression
+        header = bytes([self.MARKER, self.VERSION]) + self.SERIALIZERS[self.serializer] + self.COMPRESSORS[compression]
+        return header + payload
+    
+    def decode(self, raw: bytes) -> Any:
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        if not raw or raw[0] != self.MARKER:
+            return json.loads(raw)  # formato legado (JSON sem cabeçalho)
+        if len(raw) < 4 or raw[1] != self.VERSION:
+            raise CacheCodecError(f"Versão de formato do cache não suportada: {raw[1:2]!r}")
+        serializer, compression, payload = raw[2:3], raw[3:4], raw[4:]
+        
+        if compression == b"z":
+            payload = zlib.decompress(payload)
+        elif compression == b"s":
+            if zstandard is None:
+                raise CacheCodecError("Valor comprimido com zstd, mas zstandard não está instalado")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif compression != b"-":
+            raise CacheCodecError(f"Compressão desconhecida no cache: {compression!r}")
+        
+        if serializer == b"m":
+            if msgpack is None:
+                raise CacheCodecError("Valor em MessagePack, mas msgpack não está instalado")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if serializer == b"j":
+            return json.loads(payload)
+        raise CacheCodecError(f"Serializador desconhecido no cache: {serializer!r}")
+
+
 # ==================== REDIS CACHE ====================
 class CacheManager:
-    """Gerencador de cache com Redis"""
+    """
+    Gerencador de cache com Redis (cliente síncrono)
+    Para scripts e código fora do event loop; os serviços usam AsyncCacheManager
+    A conexão é verificada no primeiro uso; com o Redis fora, o cache fica
+    desabilitado só até a próxima tentativa (backoff exponencial)
+    """
     
-    def __init__(self):
+    def __init__(self, codec: Optional[CacheCodec] = None):
+        self.codec = codec or CacheCodec()
+        self.redis_client = redis.from_url(
+            REDIS_URL, socket_timeout=REDIS_CACHE_TIMEOUT_SECONDS,
+            socket_connect_timeout=REDIS_CACHE_TIMEOUT_SECONDS
+        )
+        self.enabled: Optional[bool] = None  # None: ainda não verificado
+        self._failures = 0
+        self._retry_at = 0.0
+    
+    def _available(self) -> bool:
+        """Conectado ou, passada a espera de reconexão, se o ping responde"""
+        if self.enabled:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
         try:
-            self.redis_client = redis.from_url(REDIS_URL, decode_responses=True)
             self.redis_client.ping()
-            self.enabled = True
         except Exception as e:
-            get_logger(__name__).warning(f"Redis indisponível, cache desabilitado: {e}")
-            self.enabled = False
+            self._failed(e)
+            return False
+        if self.enabled is False:
+            get_logger(__name__).info("✅ Redis reconectado, cache reabilitado")
+        self.enabled = True
+        self._failures = 0
+        return True
+    
+    def _failed(self, error: Exception):
+        if self.enabled is not False:
+            get_logger(__name__).warning(f"Redis indisponível, cache desabilitado até reconectar: {error}")
+        self.enabled = False
+        self._retry_at = time.monotonic() + dependency_retry_delay(self._failures)
+        self._failures += 1
+    
+    def _error(self, action: str, error: Exception):
+        get_logger(__name__).error(f"Erro ao {action} cache: {error}")
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self._failed(error)
     
     def get(self, key: str) -> Optional[Any]:
         """Recupera valor do cache"""
-        if not self.enabled:
+        if not self._available():
             return None
         try:
             value = self.redis_client.get(key)
+            CACHE_REQUESTS.labels(cache_namespace(key), "hit" if value else "miss").inc()
             if value:
-                return json.loads(value)
+                return self.codec.decode(value)
             return None
         except Exception as e:
-            get_logger(__name__).error(f"Erro ao recuperar cache: {e}")
+            CACHE_REQUESTS.labels(cache_namespace(key), "error").inc()
+            self._error("recuperar", e)
             return None
     
     def set(self, key: str, value: Any, expire_seconds: int = 3600) -> bool:
         """Armazena valor no cache"""
-        if not self.enabled:
+        if not self._available():
             return False
         try:
             self.redis_client.setex(
                 key,
                 expire_seconds,
-                json.dumps(value)
+                self.codec.encode(value)
             )
             return True
         except Exception as e:
-            get_logger(__name__).error(f"Erro ao salvar cache: {e}")
+            self._error("salvar", e)
             return False
     
     def delete(self, key: str) -> bool:
         """Remove valor do cache"""
-        if not self.enabled:
+        if not self._available():
             return False
         try:
             self.redis_client.delete(key)
             return True
         except Exception as e:
-            get_logger(__name__).error(f"Erro ao deletar cache: {e}")
+            self._error("deletar", e)
             return False
     
     def clear_pattern(self, pattern: str) -> int:
         """Limpa múltiplas chaves por padrão"""
-        if not self.enabled:
+        if not self._available():
             return 0
         try:
             cursor = 0
@@ -92,69 +1125,1329 @@ class CacheManager:
                     break
             return count
         except Exception as e:
-            get_logger(__name__).error(f"Erro ao limpar cache: {e}")
+            self._error("limpar", e)
             return 0
 
 
+class LocalCacheTier:
+    """
+    Camada LRU em processo com limite de entradas e TTL por entrada
+    Guarda os valores já decodificados: devem ser tratados como somente leitura
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        return self.lookup(key)[0]
+    
+    def lookup(self, key: str) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
+        """Valor, TTL restante no Redis e custo de recomputação registrado"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None, None
+        expires_at, value, remote_expires_at, delta = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._entries[key]
+            return None, None, None
+        self._entries.move_to_end(key)
+        return value, remote_expires_at - now, delta
+    
+    def put(self, key: str, value: Any, expire_seconds: float, delta: Optional[float] = None):
+        now = time.monotonic()
+        ttl = min(expire_seconds, self.ttl_seconds)
+        self._entries[key] = (now + ttl, value, now + expire_seconds, delta)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+    
+    def delete_pattern(self, pattern: str) -> int:
+        """Remove as chaves que casam com o padrão glob (mesma sintaxe do SCAN)"""
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AsyncCacheManager:
+    """
+    Gerenciador de cache com Redis (redis.asyncio) para os handlers async
+    Consultas não bloqueiam o event loop e usam um pool limitado de conexões;
+    com o Redis lento ou fora, as operações falham após o timeout como miss
+    
+    Camada local opcional (LRU/TTL em processo) consultada antes do Redis:
+    escritas e clear_pattern são anunciadas no canal de invalidação e as
+    demais réplicas descartam suas cópias. A camada local só é usada enquanto
+    a réplica está inscrita no canal; sem ele, as consultas vão ao Redis
+    
+    get_or_compute protege contra estouro de recomputação (stampede) quando
+    uma entrada quente expira
+    
+    Tags: escritas podem marcar a chave com tags (ex.: "news", "user:42");
+    cada tag é um conjunto no Redis com suas chaves, e invalidate_tags remove
+    apenas essas chaves, sem varrer o keyspace como clear_pattern
+    """
+    
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    RESUBSCRIBE_SECONDS = 5
+    # Chave irmã com o custo (segundos) da última recomputação da entrada
+    DELTA_SUFFIX = ":delta"
+    LOCK_PREFIX = "lock:"
+    TAG_PREFIX = "tag:"
+    # Chaves por comando DELETE e por mensagem de invalidação
+    BATCH_SIZE = 500
+    
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        max_connections: int = REDIS_CACHE_MAX_CONNECTIONS,
+        timeout: float = REDIS_CACHE_TIMEOUT_SECONDS,
+        local_max_entries: int = LOCAL_CACHE_MAX_ENTRIES,
+        local_ttl_seconds: float = LOCAL_CACHE_TTL_SECONDS,
+        codec: Optional[CacheCodec] = None
+    ):
+        self.url = url
+        self.codec = codec or CacheCodec()
+        # Respostas em bytes: os valores são binários (ver CacheCodec)
+        pool = aioredis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            timeout=timeout,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout
+        )
+        self.redis_client = aioredis.Redis(connection_pool=pool)
+        # Último estado conhecido do Redis (atualizado a cada operação)
+        self.enabled = True
+        
+        self.local: Optional[LocalCacheTier] = None
+        if local_max_entries > 0:
+            self.local = LocalCacheTier(local_max_entries, local_ttl_seconds)
+        self.instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+        # Incrementado a cada invalidação recebida: evita repopular a camada
+        # local com um valor lido do Redis antes de uma escrita concorrente
+        self._generation = 0
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        # get_or_compute: recomputações coalescidas no processo e em background
+        self._compute_flight = SingleFlight()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.computes = 0
+        self.lock_waits = 0
+        self.early_refreshes = 0
+    
+    def _failed(self, action: str, error: Exception):
+        self.enabled = False
+        get_logger(__name__).error(f"Erro ao {action} cache: {error}")
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Recupera valor do cache (camada local, depois Redis)"""
+        with span("cache.get", namespace=cache_namespace(key)) as cache_span:
+            value, _, _ = await self._lookup(key, with_meta=False)
+            if cache_span is not None:
+                cache_span.set(hit=value is not None)
+        return value
+    
+    async def set(self, key: str, value: Any, expire_seconds: int = 3600, tags: Iterable[str] = ()) -> bool:
+        """Armazena valor no cache e invalida as cópias locais das outras réplicas"""
+        return await self._store(key, value, expire_seconds, tags=tuple(tags))
+    
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Vários valores (None para os ausentes), num único round-trip ao Redis"""
+        values: List[Optional[Any]] = [None] * len(keys)
+        local = self._local_tier()
+        missing = []
+        for index, key in enumerate(keys):
+            value = local.get(key) if local is not None else None
+            if value is None:
+                missing.append(index)
+                continue
+            self.local_hits += 1
+            CACHE_REQUESTS.labels(cache_namespace(key), "local_hit").inc()
+            values[index] = value
+        if not missing:
+            return values
+        
+        generation = self._generation
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for index in missing:
+                    pipe.get(keys[index])
+                    pipe.ttl(keys[index])
+                replies = await pipe.execute()
+            self.enabled = True
+        except Exception as e:
+            for index in missing:
+                CACHE_REQUESTS.labels(cache_namespace(keys[index]), "error").inc()
+            self._failed("recuperar", e)
+            return values
+        for index, raw, ttl in zip(missing, replies[::2], replies[1::2]):
+            values[index], _, _ = self._decode_hit(keys[index], raw, ttl, None, local, generation)
+        return values
+    
+    async def mset(self, mapping: Dict[str, Any], expire_seconds: int = 3600, tags: Iterable[str] = ()) -> bool:
+        """Armazena vários valores num único round-trip (mesma validade e tags)"""
+        if not mapping:
+            return True
+        tags = tuple(tags)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.setex(key, expire_seconds, self.codec.encode(value))
+                self._tag(pipe, list(mapping), expire_seconds, tags)
+                await pipe.execute()
+            self.enabled = True
+        except Exception as e:
+            self._failed("salvar", e)
+            return False
+        local = self._local_tier()
+        if local is not None:
+            self._generation += 1
+            for key, value in mapping.items():
+                local.put(key, value, expire_seconds)
+        await self._publish_invalidation(keys=list(mapping))
+        return True
+    
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int = 3600,
+        lock_seconds: float = CACHE_LOCK_TIMEOUT_SECONDS,
+        beta: float = CACHE_EARLY_REFRESH_BETA,
+        tags: Iterable[str] = ()
+    ) -> Any:
+        """
+        Valor do cache ou, num miss, o resultado de compute() (None não é cacheado)
+        - compute roda uma única vez por chave: single-flight no processo e lock
+          no Redis entre réplicas; as demais aguardam o valor ser gravado
+        - expiração antecipada probabilística (XFetch): quanto mais perto de
+          expirar e mais cara a recomputação, maior a chance de uma leitura
+          disparar a atualização em background, antes que a entrada expire
+        `lock_seconds` deve cobrir o tempo de compute; beta=0 desliga a antecipação
+        """
+        value, _ = await self.get_or_compute_source(key, compute, expire_seconds, lock_seconds, beta, tags)
+        return value
+    
+    async def get_or_compute_source(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int = 3600,
+        lock_seconds: float = CACHE_LOCK_TIMEOUT_SECONDS,
+        beta: float = CACHE_EARLY_REFRESH_BETA,
+        tags: Iterable[str] = ()
+    ) -> Tuple[Any, str]:
+        """
+        Como get_or_compute, mais a origem do valor:
+        - "cache": lido do cache
+        - "computed": compute() desta chamada produziu o valor
+        - "coalesced": calculado por outra requisição em andamento (no processo,
+          via single-flight, ou em outra réplica, aguardando o lock no Redis)
+        """
+        tags = tuple(tags)
+        with span("cache.get_or_compute", namespace=cache_namespace(key)) as cache_span:
+            value, ttl, delta = await self._lookup(key, with_meta=beta > 0)
+            if cache_span is not None:
+                cache_span.set(hit=value is not None)
+            if value is not None:
+                if ttl is not None and delta and -delta * beta * math.log(1.0 - random.random()) >= ttl:
+                    self._refresh_in_background(key, compute, expire_seconds, lock_seconds, tags)
+                return value, "cache"
+            (value, computed), shared = await self._compute_flight.do_shared(
+                key, lambda: self._compute_locked(key, compute, expire_seconds, lock_seconds, tags)
+            )
+            return value, "computed" if computed and not shared else "coalesced"
+    
+    async def delete(self, key: str) -> bool:
+        """Remove valor do cache (em todas as camadas e réplicas)"""
+        try:
+            await self.redis_client.delete(key)
+            self.enabled = True
+        except Exception as e:
+            self._failed("deletar", e)
+            return False
+        finally:
+            self._invalidate_local(key=key)
+        await self._publish_invalidation(key=key)
+        return True
+    
+    async def clear_pattern(self, pattern: str) -> int:
+        """Limpa múltiplas chaves por padrão (em todas as camadas e réplicas)"""
+        try:
+            count = 0
+            batch = []
+            async for key in self.redis_client.scan_iter(match=pattern):
+                batch.append(key)
+                if len(batch) >= 500:
+                    count += await self.redis_client.delete(*batch)
+                    batch.clear()
+            if batch:
+                count += await self.redis_client.delete(*batch)
+            self.enabled = True
+        except Exception as e:
+            self._failed("limpar", e)
+            return 0
+        finally:
+            self._invalidate_local(pattern=pattern)
+        await self._publish_invalidation(pattern=pattern)
+        return count
+    
+    async def invalidate_tags(self, *tags: str) -> int:
+        """
+        Remove as entradas marcadas com as tags (em todas as camadas e réplicas)
+        Custo proporcional ao número de chaves da tag, sem varrer o keyspace
+        """
+        count = 0
+        for tag in tags:
+            # Renomear isola o conjunto: escritas concorrentes já vão para um novo
+            pending = f"{self.TAG_PREFIX}{tag}:{uuid.uuid4().hex}"
+            try:
+                try:
+                    await self.redis_client.rename(f"{self.TAG_PREFIX}{tag}", pending)
+                except redis.ResponseError:
+                    continue  # tag sem chaves
+                batch = []
+                async for key in self.redis_client.sscan_iter(pending, count=self.BATCH_SIZE):
+                    batch.append(key.decode("utf-8"))
+                    if len(batch) >= self.BATCH_SIZE:
+                        count += await self._delete_keys(batch)
+                        batch = []
+                if batch:
+                    count += await self._delete_keys(batch)
+                await self.redis_client.delete(pending)
+                self.enabled = True
+            except Exception as e:
+                self._failed("invalidar", e)
+        return count
+    
+    def stats(self) -> Dict:
+        """Acertos por camada, taxa de acerto e recomputações"""
+        total = self.local_hits + self.remote_hits + self.misses
+        return {
+            "redis_available": self.enabled,
+            "codec": self.codec.name,
+            "local_enabled": self.local is not None,
+            "local_active": self._subscribed,
+            "local_entries": len(self.local) if self.local is not None else 0,
+            "local_evictions": self.local.evictions if self.local is not None else 0,
+            "local_hits": self.local_hits,
+            "redis_hits": self.remote_hits,
+            "misses": self.misses,
+            "local_hit_ratio": round(self.local_hits / total, 4) if total else 0.0,
+            "redis_hit_ratio": round(self.remote_hits / total, 4) if total else 0.0,
+            "computes": self.computes,
+            "lock_waits": self.lock_waits,
+            "early_refreshes": self.early_refreshes,
+        }
+    
+    async def close(self):
+        """Encerra a escuta de invalidações e fecha o pool de conexões"""
+        refreshing = list(self._refreshing.values())
+        for task in refreshing:
+            task.cancel()
+        await asyncio.gather(*refreshing, return_exceptions=True)
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self.redis_client.aclose()
+    
+    # ---------- leitura / escrita ----------
+    async def _lookup(self, key: str, with_meta: bool = True) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
+        """Valor, TTL restante (s) e custo de recomputação (s) da chave"""
+        local = self._local_tier()
+        if local is not None:
+            value, ttl, delta = local.lookup(key)
+            if value is not None:
+                self.local_hits += 1
+                CACHE_REQUESTS.labels(cache_namespace(key), "local_hit").inc()
+                return value, ttl, delta
+        generation = self._generation
+        try:
+            if local is None and not with_meta:
+                raw, ttl, delta = await self.redis_client.get(key), None, None
+            else:
+                # Valor, TTL e custo num único round-trip (a cópia local não passa do TTL)
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    pipe.get(key)
+                    pipe.ttl(key)
+                    pipe.get(f"{key}{self.DELTA_SUFFIX}")
+                    raw, ttl, delta = await pipe.execute()
+            self.enabled = True
+        except Exception as e:
+            CACHE_REQUESTS.labels(cache_namespace(key), "error").inc()
+            self._failed("recuperar", e)
+            return None, None, None
+        return self._decode_hit(key, raw, ttl, delta, local, generation)
+    
+    def _decode_hit(
+        self,
+        key: str,
+        raw: Optional[bytes],
+        ttl: Optional[int],
+        delta: Optional[bytes],
+        local: Optional[LocalCacheTier],
+        generation: int
+    ) -> Tuple[Optional[Any], Optional[float], Optional[float]]:
+        """Decodifica a resposta do Redis, contabiliza e popula a camada local"""
+        if not raw:
+            self.misses += 1
+            CACHE_REQUESTS.labels(cache_namespace(key), "miss").inc()
+            return None, None, None
+        try:
+            value = self.codec.decode(raw)
+        except Exception as e:
+            # Entrada ilegível (formato futuro ou corrompida): tratada como miss
+            self.misses += 1
+            CACHE_REQUESTS.labels(cache_namespace(key), "error").inc()
+            get_logger(__name__).error(f"Erro ao decodificar cache ({key}): {e}")
+            return None, None, None
+        self.remote_hits += 1
+        CACHE_REQUESTS.labels(cache_namespace(key), "hit").inc()
+        ttl = ttl if ttl is not None and ttl > 0 else None
+        delta = float(delta) if delta else None
+        if local is not None and ttl and generation == self._generation:
+            local.put(key, value, ttl, delta)
+        return value, ttl, delta
+    
+    async def _store(
+        self,
+        key: str,
+        value: Any,
+        expire_seconds: int,
+        delta: Optional[float] = None,
+        tags: Tuple[str, ...] = ()
+    ) -> bool:
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(key, expire_seconds, self.codec.encode(value))
+                if delta is not None:
+                    pipe.setex(f"{key}{self.DELTA_SUFFIX}", expire_seconds, round(delta, 3))
+                self._tag(pipe, [key], expire_seconds, tags)
+                await pipe.execute()
+            self.enabled = True
+        except Exception as e:
+            self._failed("salvar", e)
+            return False
+        local = self._local_tier()
+        if local is not None:
+            self._generation += 1
+            local.put(key, value, expire_seconds, delta)
+        await self._publish_invalidation(key=key)
+        return True
+    
+    def _tag(self, pipe, keys: List[str], expire_seconds: int, tags: Tuple[str, ...]):
+        """Inclui as chaves nos conjuntos das tags, que duram tanto quanto a entrada mais longa"""
+        for tag in tags:
+            tag_key = f"{self.TAG_PREFIX}{tag}"
+            pipe.sadd(tag_key, *keys)
+            pipe.expire(tag_key, expire_seconds, nx=True)
+            pipe.expire(tag_key, expire_seconds, gt=True)
+    
+    async def _delete_keys(self, keys: List[str]) -> int:
+        """Remove as chaves (e o custo registrado de cada uma) em todas as camadas"""
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                pipe.delete(*(f"{key}{self.DELTA_SUFFIX}" for key in keys))
+                deleted, _ = await pipe.execute()
+        finally:
+            self._invalidate_local(keys=keys)
+        await self._publish_invalidation(keys=keys)
+        return deleted
+    
+    # ---------- recomputação (get_or_compute) ----------
+    async def _compute_and_store(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int,
+        tags: Tuple[str, ...] = ()
+    ) -> Any:
+        self.computes += 1
+        start = time.monotonic()
+        value = await compute()
+        if value is not None:
+            await self._store(key, value, expire_seconds, delta=time.monotonic() - start, tags=tags)
+        return value
+    
+    async def _compute_locked(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int,
+        lock_seconds: float,
+        tags: Tuple[str, ...] = ()
+    ) -> Tuple[Any, bool]:
+        """
+        Recalcula sob lock distribuído; sem o lock, aguarda o valor da outra réplica
+        Retorna (valor, se compute rodou aqui)
+        """
+        give_up_at = time.monotonic() + lock_seconds
+        delay = 0.05
+        while True:
+            lock = self.redis_client.lock(f"{self.LOCK_PREFIX}{key}", timeout=lock_seconds)
+            try:
+                acquired = await lock.acquire(blocking=False)
+            except Exception as e:
+                # Redis indisponível: calcula sem coordenação entre réplicas
+                self._failed("bloquear", e)
+                return await self._compute_and_store(key, compute, expire_seconds, tags), True
+            
+            if acquired:
+                try:
+                    # Outra réplica pode ter gravado entre o miss e o lock
+                    value, _, _ = await self._lookup(key, with_meta=False)
+                    if value is not None:
+                        return value, False
+                    return await self._compute_and_store(key, compute, expire_seconds, tags), True
+                finally:
+                    await self._release(lock)
+            
+            self.lock_waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            value, _, _ = await self._lookup(key, with_meta=False)
+            if value is not None:
+                return value, False
+            if time.monotonic() >= give_up_at:
+                # Quem detinha o lock não gravou a tempo: calcula por conta própria
+                return await self._compute_and_store(key, compute, expire_seconds, tags), True
+    
+    def _refresh_in_background(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int,
+        lock_seconds: float,
+        tags: Tuple[str, ...] = ()
+    ):
+        if key in self._refreshing:
+            return
+        self.early_refreshes += 1
+        # Contexto vazio: a atualização não herda o prazo da requisição que a disparou
+        task = asyncio.create_task(
+            self._refresh(key, compute, expire_seconds, lock_seconds, tags), context=contextvars.Context()
+        )
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+    
+    async def _refresh(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire_seconds: int,
+        lock_seconds: float,
+        tags: Tuple[str, ...] = ()
+    ):
+        lock = self.redis_client.lock(f"{self.LOCK_PREFIX}{key}", timeout=lock_seconds)
+        try:
+            if not await lock.acquire(blocking=False):
+                return  # outra réplica já está atualizando
+        except Exception as e:
+            self._failed("bloquear", e)
+            return
+        try:
+            await self._compute_and_store(key, compute, expire_seconds, tags)
+        except Exception as e:
+            get_logger(__name__).error(f"Erro ao atualizar cache em background ({key}): {e}")
+        finally:
+            await self._release(lock)
+    
+    @staticmethod
+    async def _release(lock):
+        try:
+            await lock.release()
+        except Exception:
+            pass  # lock expirado ou Redis indisponível: expira sozinho
+    
+    # ---------- camada local / invalidação ----------
+    def _local_tier(self) -> Optional[LocalCacheTier]:
+        """Camada local, se ativa (inicia a escuta de invalidações no primeiro uso)"""
+        if self.local is None:
+            return None
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen_invalidations())
+        return self.local if self._subscribed else None
+    
+    async def _publish_invalidation(
+        self,
+        key: Optional[str] = None,
+        pattern: Optional[str] = None,
+        keys: Optional[List[str]] = None
+    ):
+        if self.local is None:
+            return
+        message = {"origin": self.instance_id, "key": key, "pattern": pattern, "keys": keys}
+        try:
+            await self.redis_client.publish(self.INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            get_logger(__name__).error(f"Erro ao publicar invalidação de cache: {e}")
+    
+    def _invalidate_local(
+        self,
+        key: Optional[str] = None,
+        pattern: Optional[str] = None,
+        keys: Optional[List[str]] = None
+    ):
+        if self.local is None:
+            return
+        self._generation += 1
+        if key:
+            self.local.delete(key)
+        elif pattern:
+            self.local.delete_pattern(pattern)
+        for key in keys or ():
+            self.local.delete(key)
+    
+    def _apply_invalidation(self, message: Dict):
+        if message.get("origin") != self.instance_id:
+            self._invalidate_local(
+                key=message.get("key"), pattern=message.get("pattern"), keys=message.get("keys")
+            )
+    
+    async def _listen_invalidations(self):
+        """Mantém a inscrição no canal; a camada local é descartada ao perdê-la"""
+        logger = get_logger(__name__)
+        # Conexão dedicada e sem timeout de leitura (aguarda mensagens indefinidamente)
+        client = aioredis.from_url(self.url, decode_responses=True)
+        try:
+            while True:
+                pubsub = client.pubsub()
+                try:
+                    await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                    self._subscribed = True
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._apply_invalidation(json.loads(message["data"]))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"⚠️  Invalidação de cache indisponível, camada local suspensa: {e}")
+                finally:
+                    self._subscribed = False
+                    self.local.clear()
+                    await pubsub.aclose()
+                await asyncio.sleep(self.RESUBSCRIBE_SECONDS)
+        finally:
+            await client.aclose()
+
+
+# ==================== CIRCUIT BREAKER ====================
+class CircuitOpenError(Exception):
+    """Chamada recusada localmente: o circuito do destino está aberto"""
+
+
+class RollingWindow:
+    """Contadores somados numa janela deslizante, em baldes de 1 segundo"""
+    
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._buckets: deque = deque()
+    
+    def add(self, first: int = 0, second: int = 0):
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += first
+            self._buckets[-1][2] += second
+        else:
+            self._buckets.append([now, first, second])
+    
+    def totals(self) -> Tuple[int, int]:
+        horizon = time.monotonic() - self.window_seconds
+        while self._buckets and self._buckets[0][0] < horizon:
+            self._buckets.popleft()
+        return sum(b[1] for b in self._buckets), sum(b[2] for b in self._buckets)
+    
+    def clear(self):
+        self._buckets.clear()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um destino (fechado / aberto / semiaberto)
+    - fechado: abre quando, com ao menos `min_requests` na janela, a taxa de
+      falhas atinge `failure_rate`
+    - aberto: recusa as chamadas por `open_seconds` (ou pelo Retry-After
+      recebido, que também abre o circuito), sem esperar o timeout do destino
+    - semiaberto: deixa passar uma chamada de teste; sucesso fecha o
+      circuito, falha o reabre
+    Falhas são erros de conexão, timeouts, 5xx e 429; os demais 4xx indicam
+    um destino saudável
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_requests: int = CIRCUIT_MIN_REQUESTS,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._window = RollingWindow(window_seconds)
+        self._open_until = 0.0
+        self._trial_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+        CIRCUIT_STATE.labels(name).set(0)
+    
+    def allow(self) -> bool:
+        """Reserva a chamada; toda chamada permitida termina em record() ou release()"""
+        if self.state == self.OPEN:
+            if time.monotonic() < self._open_until:
+                return self._reject()
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._trial_in_flight:
+                return self._reject()
+            self._trial_in_flight = True
+        return True
+    
+    def record(self, success: bool, retry_after: Optional[float] = None):
+        """Resultado de uma chamada permitida"""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+            if success:
+                self._window.clear()
+                self._transition(self.CLOSED)
+            else:
+                self._open(retry_after)
+            return
+        self._window.add(1, 0 if success else 1)
+        if self.state == self.CLOSED and not success:
+            total, failures = self._window.totals()
+            if retry_after or (total >= self.min_requests and failures / total >= self.failure_rate):
+                self._open(retry_after)
+    
+    def release(self):
+        """Chamada permitida que não chegou a um resultado (ex.: cancelada)"""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+    
+    def stats(self) -> Dict:
+        total, failures = self._window.totals()
+        return {
+            "state": self.state,
+            "requests_in_window": total,
+            "failure_rate": round(failures / total, 4) if total else 0.0,
+            "open_remaining_seconds": round(max(self._open_until - time.monotonic(), 0), 1)
+                if self.state == self.OPEN else 0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+    
+    def _reject(self) -> bool:
+        self.rejected += 1
+        CIRCUIT_REJECTIONS.labels(self.name).inc()
+        return False
+    
+    def _open(self, retry_after: Optional[float] = None):
+        # Retry-After do destino define quando a próxima chamada de teste é bem-vinda
+        self._open_until = time.monotonic() + (self.open_seconds if retry_after is None else retry_after)
+        if self.state != self.OPEN:
+            self.opened += 1
+            get_logger(__name__).warning(
+                f"🔌 Circuito aberto para {self.name} por {self._open_until - time.monotonic():.1f}s"
+            )
+        self._transition(self.OPEN)
+    
+    def _transition(self, state: str):
+        if state == self.CLOSED and self.state != self.CLOSED:
+            get_logger(__name__).info(f"🔌 Circuito fechado para {self.name}")
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(self.STATE_VALUES[state])
+
+
+class RetryBudget:
+    """
+    Limita novas tentativas a uma fração do tráfego de um destino
+    Na janela, retries <= max(ratio * requisições, mínimo por segundo * janela):
+    com o destino sobrecarregado, as tentativas não multiplicam a carga
+    """
+    
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+        window_seconds: float = 10
+    ):
+        self.ratio = ratio
+        self.min_retries = min_per_second * window_seconds
+        self._window = RollingWindow(window_seconds)
+        self.exhausted = 0
+    
+    def record_request(self):
+        self._window.add(1, 0)
+    
+    def try_withdraw(self) -> bool:
+        """Consome uma nova tentativa do orçamento, se houver"""
+        requests, retries = self._window.totals()
+        if retries >= max(self.ratio * requests, self.min_retries):
+            self.exhausted += 1
+            return False
+        self._window.add(0, 1)
+        return True
+    
+    def stats(self) -> Dict:
+        requests, retries = self._window.totals()
+        return {"requests_in_window": requests, "retries_in_window": retries, "exhausted": self.exhausted}
+
+
+# Um breaker e um orçamento por destino, compartilhados pelos clientes do processo
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_retry_budgets: Dict[str, RetryBudget] = {}
+
+
+def circuit_breaker(destination: str) -> CircuitBreaker:
+    if destination not in _circuit_breakers:
+        _circuit_breakers[destination] = CircuitBreaker(destination)
+    return _circuit_breakers[destination]
+
+
+def retry_budget(destination: str) -> RetryBudget:
+    if destination not in _retry_budgets:
+        _retry_budgets[destination] = RetryBudget()
+    return _retry_budgets[destination]
+
+
+def circuit_breaker_stats() -> Dict:
+    """Estado dos breakers e orçamentos de retry por destino (para o /health)"""
+    return {
+        destination: {**breaker.stats(), "retry_budget": retry_budget(destination).stats()}
+        for destination, breaker in _circuit_breakers.items()
+    }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Cabeçalho Retry-After (segundos ou data HTTP) em segundos"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((moment - datetime.now(moment.tzinfo)).total_seconds(), 0.0)
+
+
+# ==================== DEPENDÊNCIAS ====================
+def dependency_retry_delay(attempt: int) -> float:
+    """Espera antes da tentativa seguinte de reconexão (exponencial, com jitter)"""
+    delay = min(DEPENDENCY_RETRY_BASE_SECONDS * 2 ** attempt, DEPENDENCY_RETRY_MAX_SECONDS)
+    return random.uniform(delay / 2, delay)
+
+
+class Dependency:
+    """
+    Cliente de uma dependência externa (ChromaDB, SDK do LLM...) criado em
+    background a partir do lifespan, sem atrasar a subida do serviço
+    - connect() cria o cliente (imports pesados incluídos); falhas são
+      repetidas com backoff exponencial, sem desabilitar a dependência
+    - check(cliente), se informado, roda a cada `check_seconds`; falhando, a
+      dependência fica indisponível e um novo cliente é criado em background
+    - recheck() antecipa a verificação quando um uso do cliente falha
+    `client` é None enquanto indisponível; dependências `required` decidem o
+    /ready do serviço
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Awaitable[Any]],
+        check: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        required: bool = True,
+        check_seconds: float = DEPENDENCY_CHECK_SECONDS
+    ):
+        self.name = name
+        self.connect = connect
+        self.check = check
+        self.required = required
+        self.check_seconds = check_seconds
+        self.ready = False
+        self.last_error: Optional[str] = None
+        self.connects = 0
+        self._client: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.logger = get_logger(__name__)
+        _dependencies[name] = self
+    
+    @property
+    def client(self) -> Any:
+        return self._client if self.ready else None
+    
+    def start(self):
+        """Inicia a conexão em background (chamado no lifespan)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def recheck(self):
+        """Antecipa a verificação (ex.: um uso do cliente falhou); a reconexão mantém o backoff"""
+        if self.ready:
+            self._wakeup.set()
+    
+    async def _run(self):
+        attempt = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                if not self.ready:
+                    self._client = await self.connect()
+                if self.check is not None:
+                    await self.check(self._client)
+                if not self.ready:
+                    self.connects += 1
+                    self.logger.info(f"✅ {self.name} conectado")
+                self.ready = True
+                self.last_error = None
+                attempt = 0
+                delay = self.check_seconds if self.check is not None else None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.ready or attempt == 0:
+                    self.logger.warning(f"⚠️  {self.name} indisponível, reconectando em background: {e}")
+                self.ready = False
+                self.last_error = str(e)
+                delay = dependency_retry_delay(attempt)
+                attempt += 1
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "required": self.required,
+            "connects": self.connects,
+            "last_error": self.last_error,
+        }
+    
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.ready = False
+
+
+# Dependências do processo por nome (reportadas no /ready)
+_dependencies: Dict[str, Dependency] = {}
+
+
+def dependency_stats() -> Dict:
+    return {name: dependency.stats() for name, dependency in _dependencies.items()}
+
+
 # ==================== HTTP CLIENT ====================
+class LatencyTracker:
+    """Latências recentes de sucesso por endpoint, para o atraso do hedge"""
+    
+    MIN_SAMPLES = 20
+    
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_samples: int = 200):
+        self.percentile = percentile
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+    
+    def observe(self, endpoint: str, seconds: float):
+        if endpoint not in self._samples:
+            self._samples[endpoint] = deque(maxlen=self.max_samples)
+        self._samples[endpoint].append(seconds)
+    
+    def quantile(self, endpoint: str) -> Optional[float]:
+        """Percentil configurado, ou None com poucas amostras"""
+        samples = self._samples.get(endpoint)
+        if not samples or len(samples) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return ordered[index]
+
+
 class ServiceClient:
-    """Cliente HTTP para comunicação entre microserviços"""
+    """
+    Cliente HTTP para comunicação entre microserviços
+    Mantém um httpx.AsyncClient com pool de conexões persistentes, criado no
+    primeiro uso e liberado por close() no encerramento (lifespan) do serviço
+    Dentro de um prazo (deadline_scope), o timeout de cada chamada é limitado
+    pelo tempo restante, que também é repassado no cabeçalho X-Deadline-Ms;
+    com o prazo esgotado a chamada nem é feita
+    
+    Resiliência por destino (compartilhada pelos clientes do processo):
+    - circuit breaker: com o destino fora ou lento, as chamadas falham na hora
+    - novas tentativas com backoff exponencial e jitter, limitadas pelo
+      orçamento de retry do destino e pelo prazo; respeitam Retry-After
+    - GET tenta de novo em qualquer falha transitória; POST só quando a
+      requisição certamente não foi processada (falha de conexão, 429, 503)
     
-    def __init__(self, service_url: str, timeout: int = HTTP_TIMEOUT_SECONDS):
+    Hedge (opt-in por chamada, só para leituras idempotentes): se a resposta
+    não chega até o percentil de latência do endpoint (HEDGE_PERCENTILE), uma
+    segunda tentativa vai à próxima réplica (`replica_urls`; sem réplicas, ao
+    mesmo endereço por outra conexão); vale a primeira resposta e a outra é
+    cancelada. Os hedges são limitados a uma fração das requisições
+    """
+    
+    RETRY_BASE_SECONDS = 0.1
+    RETRY_MAX_SECONDS = 2.0
+    # Retry-After maior que isso (ou que o prazo restante) encerra as tentativas
+    RETRY_AFTER_MAX_SECONDS = 30.0
+    # Falhas de conexão: a requisição não chegou ao destino
+    UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+    
+    def __init__(
+        self,
+        service_url: str,
+        timeout: int = HTTP_TIMEOUT_SECONDS,
+        max_connections: int = HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        http2: bool = HTTP2_ENABLED,
+        max_retries: int = HTTP_MAX_RETRIES,
+        replica_urls: Optional[List[str]] = None
+    ):
         self.service_url = service_url
         self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2
+        self.max_retries = max_retries
+        self.breaker = circuit_breaker(service_url)
+        self.retry_budget = retry_budget(service_url)
+        self.replica_urls = [url.rstrip("/") for url in replica_urls or []]
+        self.latency = LatencyTracker()
+        self.hedge_budget = RetryBudget(ratio=HEDGE_BUDGET_RATIO, min_per_second=0)
+        self._next_replica = 0
+        self.hedges = 0
+        self.hedge_wins = 0
         self.logger = get_logger(self.__class__.__name__)
+        self._client: Optional[httpx.AsyncClient] = None
+        if http2 and h2 is None:
+            self.logger.warning("⚠️ HTTP2_ENABLED requer o pacote h2; usando HTTP/1.1")
+            self.http2 = False
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente com pool compartilhado pelas chamadas ao serviço"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.service_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2
+            )
+        return self._client
+    
+    async def close(self):
+        """Fecha as conexões do pool (chamado no encerramento do serviço)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def get(
         self,
         endpoint: str,
         params: Optional[Dict] = None,
-        headers: Optional[Dict] = None
+        headers: Optional[Dict] = None,
+        hedge: bool = False
     ) -> Optional[Dict]:
         """Faz requisição GET"""
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(
-                    f"{self.service_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                )
-                response.raise_for_status()
-                return response.json()
-        except Exception as e:
-            self.logger.error(f"Erro em GET {endpoint}: {e}")
-            return None
+        return await self._request("GET", endpoint, headers, idempotent=True, hedge=hedge, params=params)
     
     async def post(
         self,
         endpoint: str,
         data: Optional[Dict] = None,
-        headers: Optional[Dict] = None
+        headers: Optional[Dict] = None,
+        hedge: bool = False
     ) -> Optional[Dict]:
-        """Faz requisição POST"""
+        """
+        Faz requisição POST
+        hedge=True declara a chamada idempotente (ex.: consultas): habilita o
+        hedge e novas tentativas em qualquer falha transitória
+        """
+        return await self._request("POST", endpoint, headers, idempotent=hedge, hedge=hedge, json=data)
+    
+    async def stream(
+        self,
+        endpoint: str,
+        data: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        lines: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Faz requisição POST e itera a resposta conforme ela chega
+        Com lines=True itera linha a linha (NDJSON); levanta exceção em caso de falha
+        (CircuitOpenError se o circuito estiver aberto). Sem novas tentativas:
+        parte da resposta já pode ter sido consumida
+        """
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.service_url}{endpoint}",
+            timeout = deadline_timeout(self.timeout)
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuito aberto para {self.service_url}")
+            try:
+                async with self.client.stream(
+                    "POST",
+                    endpoint,
                     json=data,
-                    headers=headers
-                )
-                response.raise_for_status()
-                return response.json()
+                    headers=trace_headers(deadline_headers(headers)),
+                    timeout=timeout
+                ) as response:
+                    self._record(response)
+                    response.raise_for_status()
+                    chunks = response.aiter_lines() if lines else response.aiter_text()
+                    async for chunk in chunks:
+                        if chunk:
+                            yield chunk
+            except httpx.TransportError:
+                self.breaker.record(False)
+                raise
+            finally:
+                self.breaker.release()
         except Exception as e:
-            self.logger.error(f"Erro em POST {endpoint}: {e}")
+            self.logger.error(f"Erro em STREAM {endpoint}: {e}")
+            raise
+    
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        headers: Optional[Dict],
+        idempotent: bool,
+        hedge: bool = False,
+        **kwargs
+    ) -> Optional[Dict]:
+        """Chamada com breaker e novas tentativas; None em caso de falha"""
+        attempt = 0
+        self.retry_budget.record_request()
+        if hedge:
+            self.hedge_budget.record_request()
+        while True:
+            try:
+                timeout = deadline_timeout(self.timeout)
+            except DeadlineExceededError as e:
+                self.logger.warning(f"⏰ {method} {endpoint} não realizado: {e}")
+                return None
+            if not self.breaker.allow():
+                self.logger.warning(f"🔌 {method} {endpoint} recusado: circuito aberto para {self.service_url}")
+                return None
+            
+            retry_after = None
+            try:
+                request_headers = deadline_headers(headers)
+                if hedge and self.breaker.state == CircuitBreaker.CLOSED:
+                    response = await self._send_hedged(method, endpoint, request_headers, timeout, **kwargs)
+                else:
+                    response = await self._send(method, endpoint, request_headers, timeout, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record(False)
+                error, retryable = e, idempotent or isinstance(e, self.UNSENT_ERRORS)
+            except Exception as e:
+                # Erro fora do transporte (decodificação, redirecionamentos, URL
+                # inválida): não diz nada sobre a saúde do serviço nem melhora
+                # com nova tentativa
+                self.breaker.release()
+                self.logger.error(f"Erro em {method} {endpoint}: {e}")
+                return None
+            except BaseException:
+                # Cancelamento: libera a vaga do breaker e propaga
+                self.breaker.release()
+                raise
+            else:
+                retry_after = self._record(response)
+                if not self._is_failure(response):
+                    try:
+                        response.raise_for_status()
+                        return response.json()
+                    except Exception as e:
+                        self.logger.error(f"Erro em {method} {endpoint}: {e}")
+                        return None
+                error = f"HTTP {response.status_code}"
+                retryable = idempotent or response.status_code in (429, 503)
+            
+            wait = self._retry_delay(attempt, retry_after) if retryable and attempt < self.max_retries else None
+            if wait is None:
+                self.logger.error(f"Erro em {method} {endpoint}: {error}")
+                return None
+            if not self.retry_budget.try_withdraw():
+                HTTP_CLIENT_RETRIES.labels(self.service_url, "budget_exhausted").inc()
+                self.logger.error(f"Erro em {method} {endpoint}: {error} (orçamento de retry esgotado)")
+                return None
+            HTTP_CLIENT_RETRIES.labels(self.service_url, "retried").inc()
+            attempt += 1
+            self.logger.warning(
+                f"🔁 {method} {endpoint} falhou ({error}); tentativa {attempt + 1} em {wait:.2f}s"
+            )
+            await asyncio.sleep(wait)
+    
+    async def _send(
+        self,
+        method: str,
+        endpoint: str,
+        headers: Optional[Dict],
+        timeout: Optional[float],
+        url: Optional[str] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """Uma tentativa (um span); registra a latência das respostas bem-sucedidas"""
+        start = time.monotonic()
+        with span(f"{method} {endpoint}", kind="client", peer=url or self.service_url) as client_span:
+            response = await self.client.request(
+                method, url or endpoint, headers=trace_headers(headers), timeout=timeout, **kwargs
+            )
+            if client_span is not None:
+                client_span.set(status=response.status_code)
+        if not self._is_failure(response):
+            self.latency.observe(endpoint, time.monotonic() - start)
+        return response
+    
+    async def _send_hedged(
+        self,
+        method: str,
+        endpoint: str,
+        headers: Optional[Dict],
+        timeout: Optional[float],
+        **kwargs
+    ) -> httpx.Response:
+        """Primeira tentativa e, se ela passar do percentil de latência, um hedge"""
+        primary = asyncio.create_task(self._send(method, endpoint, headers, timeout, **kwargs))
+        delay = self.latency.quantile(endpoint) or HEDGE_DEFAULT_DELAY_SECONDS
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.hedge_budget.try_withdraw():
+                return await primary
+            
+            self.hedges += 1
+            HTTP_CLIENT_HEDGES.labels(self.service_url, "sent").inc()
+            hedged = asyncio.create_task(
+                self._send(method, endpoint, headers, timeout, url=self._hedge_url(endpoint), **kwargs)
+            )
+            try:
+                pending = {primary, hedged}
+                fallback = None
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    # Vale a primeira resposta bem-sucedida; falhas aguardam a outra tentativa
+                    for task in (primary, hedged):
+                        if task not in done:
+                            continue
+                        if task.exception() is None and not self._is_failure(task.result()):
+                            if task is hedged:
+                                self.hedge_wins += 1
+                                HTTP_CLIENT_HEDGES.labels(self.service_url, "won").inc()
+                            return task.result()
+                        fallback = fallback or task
+                return fallback.result()
+            finally:
+                hedged.cancel()
+                await asyncio.gather(hedged, return_exceptions=True)
+        finally:
+            primary.cancel()
+            await asyncio.gather(primary, return_exceptions=True)
+    
+    def _hedge_url(self, endpoint: str) -> Optional[str]:
+        """Endereço do hedge: próxima réplica (None: o próprio serviço)"""
+        if not self.replica_urls:
+            return None
+        url = self.replica_urls[self._next_replica % len(self.replica_urls)]
+        self._next_replica += 1
+        return f"{url}{endpoint}"
+    
+    def stats(self) -> Dict:
+        """Taxas de hedge (hedges / requisições) e de vitória (vitórias / hedges)"""
+        budget = self.hedge_budget.stats()
+        requests = budget["requests_in_window"]
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate_in_window": round(budget["retries_in_window"] / requests, 4) if requests else 0.0,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+        }
+    
+    @staticmethod
+    def _is_failure(response: httpx.Response) -> bool:
+        return response.status_code >= 500 or response.status_code == 429
+    
+    def _record(self, response: httpx.Response) -> Optional[float]:
+        """Registra a resposta no breaker; devolve o Retry-After (s), se houver"""
+        if not self._is_failure(response):
+            self.breaker.record(True)
             return None
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            retry_after = min(retry_after, self.RETRY_AFTER_MAX_SECONDS)
+        self.breaker.record(False, retry_after)
+        return retry_after
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Espera antes da próxima tentativa, ou None se não houver nova tentativa"""
+        if retry_after is None and self.breaker.state == CircuitBreaker.OPEN:
+            return None  # a falha abriu o circuito: a tentativa seria recusada
+        if retry_after is not None:
+            wait = retry_after
+        else:
+            # Full jitter: espalha as tentativas dos clientes que falharam juntos
+            wait = random.uniform(0, min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** attempt))
+        remaining = remaining_seconds()
+        if remaining is not None and wait >= remaining - DEADLINE_MARGIN_SECONDS:
+            return None
+        return wait
 
 
 # ==================== RETRY LOGIC ====================
+def backoff_delay(attempt: int, delay_seconds: float, backoff: float) -> float:
+    """Backoff exponencial com jitter completo (evita tentativas sincronizadas)"""
+    return random.uniform(0, delay_seconds * (backoff ** attempt))
+
+
 async def retry_async(
     func,
     max_retries: int = 3,
     delay_seconds: int = 2,
-    backoff: float = 2.0
+    backoff: float = 2.0,
+    budget: Optional[RetryBudget] = None
 ):
-    """Executa função assíncrona com retry exponencial"""
+    """
+    Executa função assíncrona com retry exponencial (com jitter)
+    Com `budget`, cada nova tentativa consome o orçamento do destino
+    """
     logger = get_logger(__name__)
+    if budget is not None:
+        budget.record_request()
     
     for attempt in range(max_retries):
         try:
@@ -162,14 +2455,15 @@ async def retry_async(
         except Exception as e:
             if attempt == max_retries - 1:
                 raise
+            if budget is not None and not budget.try_withdraw():
+                raise
             
-            wait_time = delay_seconds * (backoff ** attempt)
+            wait_time = backoff_delay(attempt, delay_seconds, backoff)
             logger.warning(
                 f"Tentativa {attempt + 1}/{max_retries} falhou, "
-                f"aguardando {wait_time}s: {e}"
+                f"aguardando {wait_time:.1f}s: {e}"
             )
             
-            import asyncio
             await asyncio.sleep(wait_time)
 
 
@@ -179,7 +2473,7 @@ def retry_sync(
     delay_seconds: int = 2,
     backoff: float = 2.0
 ):
-    """Executa função síncrona com retry exponencial"""
+    """Executa função síncrona com retry exponencial (com jitter)"""
     logger = get_logger(__name__)
     
     for attempt in range(max_retries):
@@ -189,16 +2483,18 @@ def retry_sync(
             if attempt == max_retries - 1:
                 raise
             
-            wait_time = delay_seconds * (backoff ** attempt)
+            wait_time = backoff_delay(attempt, delay_seconds, backoff)
             logger.warning(
                 f"Tentativa {attempt + 1}/{max_retries} falhou, "
-                f"aguardando {wait_time}s: {e}"
+                f"aguardando {wait_time:.1f}s: {e}"
             )
             
-            import time
             time.sleep(wait_time)
 
 
 # ==================== INICIALIZAÇÃO ====================
-cache = CacheManager()
+# Cache dos serviços (assíncrono); scripts síncronos podem instanciar CacheManager
+cache = AsyncCacheManager()
+# Spans do processo (exportados para o Redis e, se configurado, arquivo/coletor)
+tracer = Tracer()
 logger = get_logger("jarvis")
@@ -121,6 +121,7 @@ show_status() {
     echo "  Script Service:    http://localhost:8003/health"
     echo "  TTS Service:       http://localhost:8004/health"
     echo "  Memory Service:    http://localhost:8005/health"
+    echo "  Cron Service:      http://localhost:8006/health"
     echo ""
     info "🔍 Admin Consoles:"
     echo "  Grafana:           http://localhost:3000 (admin/admin)"